@@ -1,8 +1,47 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django import forms
+from django.core.paginator import Paginator
+from django.db import connections
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
 from django.utils import timezone
-import cloudinary.uploader
-from .models import User, House, Reservation, Transaction
+from django.utils.functional import cached_property
+from .importer import claimable, import_uploaded_file, upload_pending_media
+from .media import upload_deduplicated
+from .model_uploads import ModelUploadError, gltf_metadata, model_extension, store_model
+from .rollups import DASHBOARD_WINDOWS, dashboard
+from .webhooks import process_event
+from .models import User, House, Reservation, Transaction, PendingMediaUpload, ImportCheckpoint, WebhookEvent, MediaAsset, ModelUpload, HistoryArchive, DailyRevenue, DailyOccupancy
+
+class EstimatedCountPaginator(Paginator):
+    # Unfiltered changelists of big PostgreSQL tables page through the
+    # planner's row estimate instead of running a full COUNT(*).
+    estimate_threshold = 100000
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where:
+            estimate = self.estimated_count()
+            if estimate is not None and estimate >= self.estimate_threshold:
+                return estimate
+        return super().count
+
+    def estimated_count(self):
+        connection = connections[self.object_list.db]
+        if connection.vendor != 'postgresql':
+            return None
+        table = connection.ops.quote_name(self.object_list.model._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT COALESCE(SUM(GREATEST(c.reltuples, 0)), 0)::bigint FROM pg_class c "
+                "WHERE c.oid = %s::regclass "
+                "OR c.oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = %s::regclass)",
+                [table, table],
+            )
+            row = cursor.fetchone()
+        return row[0] if row else None
 
 class HouseAdminForm(forms.ModelForm):
     image_1 = forms.FileField(
@@ -98,9 +137,21 @@ class HouseAdminForm(forms.ModelForm):
             raise forms.ValidationError("Maximum of 6 images allowed per house.")
         if model_3d and model_count >= 1:
             raise forms.ValidationError("Only one 3D model allowed per house.")
+        if model_3d:
+            try:
+                cleaned_data['model_3d_metadata'] = gltf_metadata(model_3d, model_3d.size, model_extension(model_3d.name))
+            except ModelUploadError as e:
+                raise forms.ValidationError(str(e))
 
         return cleaned_data
 
+class HouseImportForm(forms.Form):
+    file = forms.FileField(
+        widget=forms.ClearableFileInput(attrs={'accept': '.csv,.jsonl,.ndjson'}),
+        label='CSV or JSON-lines file'
+    )
+    batch_size = forms.IntegerField(min_value=1, max_value=5000, initial=500)
+
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
     list_display = ['username', 'email', 'phone_number']
@@ -113,6 +164,33 @@ class HouseAdmin(admin.ModelAdmin):
     list_editable = ['remove']
     search_fields = ['house_name']
     list_filter = ['room_type', 'availability', 'is_reserved', 'remove']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    change_list_template = 'admin/StudHomeApi/house/change_list.html'
+
+    def get_urls(self):
+        urls = [
+            path('import/', self.admin_site.admin_view(self.import_view), name='StudHomeApi_house_import'),
+        ]
+        return urls + super().get_urls()
+
+    def import_view(self, request):
+        if not self.has_add_permission(request):
+            return redirect('admin:StudHomeApi_house_changelist')
+        form = HouseImportForm(request.POST or None, request.FILES or None)
+        report = None
+        if request.method == 'POST' and form.is_valid():
+            report = import_uploaded_file(form.cleaned_data['file'], batch_size=form.cleaned_data['batch_size'])
+            level = messages.WARNING if report.errors else messages.SUCCESS
+            self.message_user(request, report.summary(), level)
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Import houses',
+            'form': form,
+            'report': report,
+        }
+        return TemplateResponse(request, 'admin/StudHomeApi/house/import.html', context)
 
     def save_model(self, request, obj, form, change):
         super().save_model(request, obj, form, change)
@@ -130,24 +208,16 @@ class HouseAdmin(admin.ModelAdmin):
             ext = image.name.split('.')[-1].lower()
             if ext not in ['jpg', 'jpeg', 'png']:
                 continue  
-            upload_result = cloudinary.uploader.upload(image, resource_type='image')
+            file_url, _ = upload_deduplicated(image, resource_type='image')
             media_list.append({
                 'media_type': 'image',
-                'file_url': upload_result['secure_url'],
+                'file_url': file_url,
                 'caption': captions[idx] if idx < len(captions) and captions[idx] else '',
                 'uploaded_at': timezone.now().isoformat()
             })
 
         if model_3d:
-            ext = model_3d.name.split('.')[-1].lower()
-            if ext in ['glb', 'gltf']:
-                upload_result = cloudinary.uploader.upload(model_3d, resource_type='raw')
-                media_list.append({
-                    'media_type': '3d_model',
-                    'file_url': upload_result['secure_url'],
-                    'caption': model_caption,
-                    'uploaded_at': timezone.now().isoformat()
-                })
+            media_list.append(store_model(model_3d, model_caption, form.cleaned_data.get('model_3d_metadata')))
 
         obj.media = media_list
         obj.save()
@@ -162,9 +232,134 @@ class ReservationAdmin(admin.ModelAdmin):
     list_display = ['reservation_id', 'user', 'house', 'reservation_date', 'is_active']
     search_fields = ['user__username', 'house__house_name']
     list_filter = ['is_active']
+    list_select_related = ['user', 'house']
+    autocomplete_fields = ['user', 'house']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 @admin.register(Transaction)
 class TransactionAdmin(admin.ModelAdmin):
-    list_display = ['transaction_id', 'user', 'house', 'amount_paid', 'transaction_type']
-    search_fields = ['user__username', 'house__house_name']
-    list_filter = ['transaction_type']
\ No newline at end of file
+    list_display = ['transaction_id', 'user', 'house', 'amount_paid', 'transaction_type', 'payment_status', 'needs_refund']
+    search_fields = ['user__username', 'house__house_name', 'payment_reference']
+    list_filter = ['transaction_type', 'payment_status', 'needs_refund']
+    list_select_related = ['user', 'house']
+    autocomplete_fields = ['user', 'house']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+@admin.register(PendingMediaUpload)
+class PendingMediaUploadAdmin(admin.ModelAdmin):
+    list_display = ['upload_id', 'house', 'media_type', 'status', 'attempts', 'created_at']
+    list_filter = ['status', 'media_type']
+    search_fields = ['house__house_name', 'source']
+    list_select_related = ['house']
+    autocomplete_fields = ['house']
+    actions = ['upload_now']
+
+    @admin.action(description='Upload selected media now')
+    def upload_now(self, request, queryset):
+        uploaded, failed = upload_pending_media(queryset.filter(claimable()).values_list('upload_id', flat=True))
+        self.message_user(request, f'Uploaded {uploaded} media files, {failed} failed.')
+
+@admin.register(ImportCheckpoint)
+class ImportCheckpointAdmin(admin.ModelAdmin):
+    # Deleting a checkpoint makes the next --resume start from the top.
+    list_display = ['name', 'line', 'saved_at']
+    search_fields = ['name']
+    readonly_fields = ['name', 'line', 'saved_at']
+
+    def has_add_permission(self, request):
+        return False
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    list_display = ['event_id', 'reference', 'status', 'state', 'attempts', 'received_at', 'processed_at']
+    list_filter = ['state', 'status']
+    search_fields = ['=reference']
+    readonly_fields = ['reference', 'status', 'payload', 'received_at', 'processed_at']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ['retry_now']
+
+    @admin.action(description='Retry selected events now')
+    def retry_now(self, request, queryset):
+        processed = 0
+        for event in queryset.exclude(state='PROCESSED').order_by('event_id'):
+            event.state = 'PENDING'
+            process_event(event)
+            if event.state == 'PROCESSED':
+                processed += 1
+        self.message_user(request, f'Processed {processed} webhook events.')
+
+@admin.register(MediaAsset)
+class MediaAssetAdmin(admin.ModelAdmin):
+    list_display = ['sha256', 'resource_type', 'url', 'size', 'hit_count', 'last_used_at']
+    list_filter = ['resource_type']
+    search_fields = ['=sha256', 'url']
+    readonly_fields = ['sha256', 'resource_type', 'url', 'size', 'hit_count', 'created_at', 'last_used_at']
+    ordering = ['-hit_count']
+
+@admin.register(ModelUpload)
+class ModelUploadAdmin(admin.ModelAdmin):
+    list_display = ['filename', 'house', 'state', 'offset', 'size', 'updated_at']
+    list_filter = ['state']
+    search_fields = ['filename', 'house__house_name']
+    list_select_related = ['house']
+    readonly_fields = ['house', 'user', 'filename', 'caption', 'size', 'offset', 'state', 'error', 'file_url', 'metadata', 'created_at', 'updated_at']
+
+@admin.register(HistoryArchive)
+class HistoryArchiveAdmin(admin.ModelAdmin):
+    list_display = ['kind', 'period_start', 'rows', 'size', 'path', 'created_at']
+    list_filter = ['kind']
+    readonly_fields = ['kind', 'period_start', 'period_end', 'path', 'rows', 'size', 'sha256', 'created_at']
+
+    def has_add_permission(self, request):
+        return False
+
+@admin.register(DailyRevenue)
+class DailyRevenueAdmin(admin.ModelAdmin):
+    list_display = ['day', 'transaction_type', 'amount', 'payments']
+    list_filter = ['transaction_type']
+    date_hierarchy = 'day'
+    readonly_fields = ['day', 'transaction_type', 'amount', 'payments']
+    ordering = ['-day']
+    change_list_template = 'admin/StudHomeApi/dailyrevenue/change_list.html'
+
+    def has_add_permission(self, request):
+        return False
+
+    def get_urls(self):
+        urls = [
+            path('analytics/', self.admin_site.admin_view(self.analytics_view), name='StudHomeApi_analytics'),
+        ]
+        return urls + super().get_urls()
+
+    def analytics_view(self, request):
+        if not self.has_view_permission(request):
+            return redirect('admin:index')
+        try:
+            days = int(request.GET.get('days', 30))
+        except ValueError:
+            days = 30
+        if days not in DASHBOARD_WINDOWS:
+            days = 30
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Analytics',
+            'windows': DASHBOARD_WINDOWS,
+            'window': days,
+            'stats': dashboard(days),
+        }
+        return TemplateResponse(request, 'admin/StudHomeApi/analytics.html', context)
+
+@admin.register(DailyOccupancy)
+class DailyOccupancyAdmin(admin.ModelAdmin):
+    list_display = ['day', 'room_type', 'started', 'expired', 'active', 'listed']
+    list_filter = ['room_type']
+    date_hierarchy = 'day'
+    readonly_fields = ['day', 'room_type', 'started', 'expired', 'active', 'listed']
+    ordering = ['-day']
+
+    def has_add_permission(self, request):
+        return False
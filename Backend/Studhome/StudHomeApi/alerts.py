@@ -0,0 +1,181 @@
+import itertools
+import math
+from collections import defaultdict
+from datetime import timedelta
+from functools import reduce
+from operator import or_
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .clusters import cell_for
+from .models import SavedSearch, SavedSearchIndex, SearchAlert
+
+# Saved-search matching. Each search is expanded into index keys
+# (room type, log2 price bucket, geo cell) with '*' / -1 for "any", and a
+# new house looks up the 8 keys it could match instead of scanning every
+# search. Candidates are then checked exactly.
+
+ANY_ROOM = '*'
+ANY_PRICE = -1
+ANY_CELL = '*'
+MAX_PRICE_BUCKET = 26  # House.price has 8 integer digits
+KM_PER_DEGREE = 111.32
+KEYS_PER_QUERY = 300
+
+
+def price_bucket(price):
+    return min(max(int(math.floor(math.log2(price))), 0), MAX_PRICE_BUCKET) if price >= 1 else 0
+
+
+def geo_cell(lat, lng):
+    x, y = cell_for(lat, lng, settings.SAVED_SEARCH_GEO_ZOOM)
+    return f'{x}:{y}'
+
+
+def distance_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * 6371.0088 * math.asin(math.sqrt(a))
+
+
+def search_cells(search):
+    if search.radius_km is None:
+        return [ANY_CELL]
+    dlat = search.radius_km / KM_PER_DEGREE
+    dlng = search.radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(search.lat)), 0.01))
+    west_x, north_y = cell_for(min(search.lat + dlat, 90), max(search.lng - dlng, -180), settings.SAVED_SEARCH_GEO_ZOOM)
+    east_x, south_y = cell_for(max(search.lat - dlat, -90), min(search.lng + dlng, 180), settings.SAVED_SEARCH_GEO_ZOOM)
+    return [f'{x}:{y}' for x in range(west_x, east_x + 1) for y in range(north_y, south_y + 1)]
+
+
+def search_buckets(search):
+    if search.min_price is None and search.max_price is None:
+        return [ANY_PRICE]
+    low = price_bucket(search.min_price) if search.min_price is not None else 0
+    high = price_bucket(search.max_price) if search.max_price is not None else MAX_PRICE_BUCKET
+    return list(range(low, high + 1))
+
+
+def index_search(search):
+    rooms = [search.room_type or ANY_ROOM]
+    with transaction.atomic():
+        SavedSearchIndex.objects.filter(search=search).delete()
+        SavedSearchIndex.objects.bulk_create([
+            SavedSearchIndex(search=search, room_type=room, price_bucket=bucket, geo_cell=cell)
+            for room, bucket, cell in itertools.product(rooms, search_buckets(search), search_cells(search))
+        ])
+
+
+def house_keys(house):
+    return itertools.product(
+        (house.room_type, ANY_ROOM),
+        (price_bucket(house.price), ANY_PRICE),
+        (geo_cell(house.lat, house.lng), ANY_CELL),
+    )
+
+
+def search_matches(search, house):
+    if search.room_type and search.room_type != house.room_type:
+        return False
+    if search.min_price is not None and house.price < search.min_price:
+        return False
+    if search.max_price is not None and house.price > search.max_price:
+        return False
+    if search.radius_km is not None and distance_km(search.lat, search.lng, house.lat, house.lng) > search.radius_km:
+        return False
+    return True
+
+
+def match_houses(houses):
+    # Queues a SearchAlert for every (saved search, house) match. Returns
+    # the number of alerts queued; matches already queued are not counted.
+    houses = [house for house in houses if not house.remove]
+    houses_by_key = defaultdict(list)
+    for house in houses:
+        for key in house_keys(house):
+            houses_by_key[key].append(house)
+    if not houses_by_key:
+        return 0
+
+    candidates = defaultdict(set)
+    keys = list(houses_by_key)
+    for start in range(0, len(keys), KEYS_PER_QUERY):
+        lookup = reduce(or_, (
+            Q(room_type=room, price_bucket=bucket, geo_cell=cell) for room, bucket, cell in keys[start:start + KEYS_PER_QUERY]
+        ))
+        for search_id, room, bucket, cell in SavedSearchIndex.objects.filter(lookup).values_list('search_id', 'room_type', 'price_bucket', 'geo_cell'):
+            for house in houses_by_key[(room, bucket, cell)]:
+                candidates[search_id].add(house)
+
+    searches = SavedSearch.objects.in_bulk(list(candidates))
+    alerts = []
+    for search_id, matched in candidates.items():
+        search = searches.get(search_id)
+        if search is None:
+            continue
+        alerts.extend(SearchAlert(search=search, house=house) for house in matched if search_matches(search, house))
+    if not alerts:
+        return 0
+    SearchAlert.objects.bulk_create(alerts, ignore_conflicts=True)
+    # The primary keys are generated here, so only rows that were inserted
+    # exist under them.
+    return SearchAlert.objects.filter(alert_id__in=[alert.alert_id for alert in alerts]).count()
+
+
+def alert_message(user, alerts):
+    lines = [f"Dear {user.username},\n\nNew houses match your saved searches on StudHome:\n"]
+    for alert in alerts:
+        house = alert.house
+        label = alert.search.name or 'your search'
+        lines.append(f"- {house.house_name} ({house.get_room_type_display()}, {house.price} XAF) for {label}")
+    lines.append("\nOpen the app to see them.\n\nBest regards,\nStudHome Team")
+    return EmailMessage(
+        subject="New houses match your saved searches",
+        body='\n'.join(lines),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[user.email],
+    )
+
+
+def claimable():
+    # Unsent alerts, plus claimed ones whose sender stopped before marking
+    # them sent or releasing them.
+    stale = timezone.now() - timedelta(minutes=settings.SEARCH_ALERT_CLAIM_MINUTES)
+    return Q(sent_at__isnull=True) & (Q(claimed_at__isnull=True) | Q(claimed_at__lt=stale))
+
+
+def send_pending_alerts(batch_size=None):
+    # Sends one email per user for up to batch_size queued alerts over a
+    # single mail connection. Returns (alerts, emails). The alerts are
+    # claimed in a short transaction and the mail is sent outside it, so no
+    # row stays locked while the SMTP server is slow. If sending fails the
+    # claim is released and the alerts stay queued.
+    batch_size = batch_size or settings.SEARCH_ALERT_BATCH_SIZE
+    claimed_at = timezone.now()
+    with transaction.atomic():
+        alert_ids = list(
+            SearchAlert.objects.select_for_update(skip_locked=True)
+            .filter(claimable())
+            .order_by('created_at')
+            .values_list('alert_id', flat=True)[:batch_size]
+        )
+        if not alert_ids:
+            return 0, 0
+        SearchAlert.objects.filter(alert_id__in=alert_ids).update(claimed_at=claimed_at)
+    ours = SearchAlert.objects.filter(alert_id__in=alert_ids, claimed_at=claimed_at, sent_at__isnull=True)
+    try:
+        alerts = list(ours.select_related('search__user', 'house'))
+        by_user = defaultdict(list)
+        for alert in alerts:
+            if not alert.house.remove:
+                by_user[alert.search.user].append(alert)
+        messages = [alert_message(user, user_alerts) for user, user_alerts in by_user.items()]
+        if messages:
+            get_connection().send_messages(messages)
+    except Exception:
+        ours.update(claimed_at=None)
+        raise
+    ours.update(sent_at=timezone.now())
+    return len(alerts), len(messages)
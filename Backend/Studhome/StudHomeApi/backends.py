@@ -0,0 +1,225 @@
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.mail.backends.locmem import EmailBackend as LocMemEmailBackend
+
+logger = logging.getLogger(__name__)
+
+# Payment gateways and media stores used by the views. Select them with
+# PAYMENT_GATEWAY and MEDIA_STORE and get them from clients.py. The Fake*
+# classes run in process so payment and upload paths can be exercised and
+# load tested without credentials or network access.
+
+
+class BackendError(Exception):
+    pass
+
+
+class FaultInjector:
+    # Shared latency/error behaviour of the fakes. latency is in seconds and
+    # jittered by +-50%, error_rate is the probability a call raises.
+    def __init__(self, latency=None, error_rate=None):
+        self.latency = settings.FAKE_BACKEND_LATENCY if latency is None else latency
+        self.error_rate = settings.FAKE_BACKEND_ERROR_RATE if error_rate is None else error_rate
+
+    def call(self, operation):
+        if self.latency:
+            time.sleep(self.latency * random.uniform(0.5, 1.5))
+        if self.error_rate and random.random() < self.error_rate:
+            raise BackendError(f'Injected failure in {operation}')
+
+
+class BasePaymentGateway(ABC):
+    @abstractmethod
+    def init_collect(self, amount, phone_number, description, external_reference, currency='XAF'):
+        # Returns a dict with at least 'reference'.
+        pass
+
+    @abstractmethod
+    def get_transaction_status(self, reference):
+        # Returns a dict with at least 'status'.
+        pass
+
+
+class CamPayGateway(BasePaymentGateway):
+    def __init__(self):
+        if not settings.CAMPAY_USERNAME or not settings.CAMPAY_PASSWORD:
+            raise ImproperlyConfigured('CAMPAY_USERNAME and CAMPAY_PASSWORD must be set to use CamPayGateway')
+        from campay.sdk import Client as CamPayClient
+        self.client = CamPayClient({
+            "app_username": settings.CAMPAY_USERNAME,
+            "app_password": settings.CAMPAY_PASSWORD,
+            "environment": settings.CAMPAY_ENVIRONMENT,
+        })
+
+    def init_collect(self, amount, phone_number, description, external_reference, currency='XAF'):
+        return self.client.initCollect({
+            "amount": str(amount),
+            "currency": currency,
+            "from": phone_number,
+            "description": description,
+            "external_reference": external_reference,
+        })
+
+    def get_transaction_status(self, reference):
+        return self.client.get_transaction_status({"reference": reference})
+
+
+class FakePaymentGateway(BasePaymentGateway):
+    # Collections settle to `outcome` after `settle_after` seconds. When
+    # `webhook_delay` is not None a webhook is delivered that many seconds
+    # after initiation: POSTed to webhook_url if set, otherwise dispatched in
+    # process through the test client.
+    def __init__(self, latency=None, error_rate=None, outcome=None, settle_after=None, webhook_delay=None, webhook_url=None):
+        self.faults = FaultInjector(latency, error_rate)
+        self.outcome = outcome or settings.FAKE_PAYMENT_OUTCOME
+        self.settle_after = settings.FAKE_PAYMENT_SETTLE_AFTER if settle_after is None else settle_after
+        self.webhook_delay = settings.FAKE_PAYMENT_WEBHOOK_DELAY if webhook_delay is None else webhook_delay
+        self.webhook_url = settings.FAKE_PAYMENT_WEBHOOK_URL if webhook_url is None else webhook_url
+        self.collections = {}
+        self.webhooks_sent = 0
+        self._mutex = threading.Lock()
+
+    def init_collect(self, amount, phone_number, description, external_reference, currency='XAF'):
+        self.faults.call('init_collect')
+        reference = str(uuid.uuid4())
+        with self._mutex:
+            self.collections[reference] = {
+                'amount': str(amount),
+                'currency': currency,
+                'phone_number': phone_number,
+                'external_reference': external_reference,
+                'outcome': self.outcome,
+                'created': time.monotonic(),
+            }
+        if self.webhook_delay is not None and self.webhook_delay >= 0:
+            timer = threading.Timer(self.webhook_delay, self.send_webhook, args=(reference,))
+            timer.daemon = True
+            timer.start()
+        return {'reference': reference, 'status': 'PENDING', 'operator': 'FAKE'}
+
+    def get_transaction_status(self, reference):
+        self.faults.call('get_transaction_status')
+        with self._mutex:
+            collection = self.collections.get(reference)
+        if collection is None:
+            raise BackendError(f'Unknown reference {reference}')
+        return {'reference': reference, 'status': self.status_of(collection), 'amount': collection['amount']}
+
+    def status_of(self, collection):
+        if time.monotonic() - collection['created'] >= self.settle_after:
+            return collection['outcome']
+        return 'PENDING'
+
+    def webhook_payload(self, reference):
+        from .webhooks import sign_webhook_payload
+        collection = self.collections[reference]
+        return sign_webhook_payload({
+            'reference': reference,
+            'status': collection['outcome'],
+            'amount': collection['amount'],
+            'currency': collection['currency'],
+            'external_reference': collection['external_reference'],
+        })
+
+    def send_webhook(self, reference):
+        payload = self.webhook_payload(reference)
+        try:
+            if self.webhook_url:
+                import urllib.request
+                request = urllib.request.Request(
+                    self.webhook_url, data=json.dumps(payload).encode(),
+                    headers={'Content-Type': 'application/json'}, method='POST',
+                )
+                urllib.request.urlopen(request, timeout=10).close()
+            else:
+                from django.db import close_old_connections
+                from django.test import Client
+                from django.urls import reverse
+                try:
+                    Client().post(reverse('payment_webhook'), payload, content_type='application/json', SERVER_NAME='localhost')
+                finally:
+                    close_old_connections()
+            with self._mutex:
+                self.webhooks_sent += 1
+        except Exception as e:
+            logger.warning(f"Fake webhook for {reference} failed: {e}")
+
+
+class BaseMediaStore(ABC):
+    @abstractmethod
+    def upload(self, file, resource_type='image'):
+        # file is an uploaded file, a path or a URL. Returns a dict with at
+        # least 'secure_url', like Cloudinary's upload result.
+        pass
+
+    def upload_large(self, file, resource_type='image'):
+        # Like upload, for files too big to send in one request.
+        return self.upload(file, resource_type=resource_type)
+
+
+class CloudinaryMediaStore(BaseMediaStore):
+    def __init__(self):
+        import cloudinary
+        import cloudinary.uploader
+        storage = settings.CLOUDINARY_STORAGE
+        if storage.get('CLOUD_NAME'):
+            cloudinary.config(
+                cloud_name=storage['CLOUD_NAME'],
+                api_key=storage.get('API_KEY'),
+                api_secret=storage.get('API_SECRET'),
+            )
+        self.uploader = cloudinary.uploader
+
+    def upload(self, file, resource_type='image'):
+        return self.uploader.upload(file, resource_type=resource_type)
+
+    def upload_large(self, file, resource_type='image'):
+        # Sent in MEDIA_UPLOAD_CHUNK_SIZE requests, read from the file as it
+        # goes.
+        return self.uploader.upload_large(file, resource_type=resource_type, chunk_size=settings.MEDIA_UPLOAD_CHUNK_SIZE)
+
+
+class FakeMediaStore(BaseMediaStore):
+    # Reads uploaded files to measure them but keeps only metadata.
+    def __init__(self, latency=None, error_rate=None, base_url=None):
+        self.faults = FaultInjector(latency, error_rate)
+        self.base_url = (base_url or settings.FAKE_MEDIA_BASE_URL).rstrip('/')
+        self.uploads = {}
+        self._mutex = threading.Lock()
+
+    def upload(self, file, resource_type='image'):
+        self.faults.call('upload')
+        if isinstance(file, str):
+            name, size = file.rsplit('/', 1)[-1], None
+        else:
+            name = getattr(file, 'name', '') or 'upload'
+            size = 0
+            for chunk in (file.chunks() if hasattr(file, 'chunks') else iter(lambda: file.read(64 * 1024), b'')):
+                size += len(chunk)
+        extension = name.rsplit('.', 1)[-1].lower() if '.' in name else ''
+        public_id = uuid.uuid4().hex
+        url = f"{self.base_url}/{resource_type}/upload/{public_id}{'.' + extension if extension else ''}"
+        result = {'public_id': public_id, 'secure_url': url, 'resource_type': resource_type, 'bytes': size, 'original_filename': name}
+        with self._mutex:
+            self.uploads[public_id] = result
+        return result
+
+
+class FakeEmailBackend(LocMemEmailBackend):
+    # django.core.mail.outbox plus injected latency and failures.
+    def send_messages(self, messages):
+        faults = FaultInjector()
+        try:
+            faults.call('send_messages')
+        except BackendError:
+            if self.fail_silently:
+                return 0
+            raise
+        return super().send_messages(messages)
@@ -0,0 +1,17 @@
+from functools import lru_cache
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# Backends are built on first use so importing views, running management
+# commands or booting a worker doesn't pay for campay/cloudinary/requests.
+# One instance is shared per process; fakes keep their state on it.
+
+
+@lru_cache(maxsize=None)
+def get_payment_gateway():
+    return import_string(settings.PAYMENT_GATEWAY)()
+
+
+@lru_cache(maxsize=None)
+def get_media_store():
+    return import_string(settings.MEDIA_STORE)()
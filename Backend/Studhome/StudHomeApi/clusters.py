@@ -0,0 +1,228 @@
+import math
+from collections import defaultdict
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from .models import HouseCard, MapCluster, MapClusterChange
+
+# Map marker clustering on a Web Mercator grid: at zoom z the world is
+# 2**z tiles across and each tile is split into 2**MAP_CLUSTER_CELL_BITS
+# cells per side. Zooms up to MAP_CLUSTER_MAX_PRECOMPUTED_ZOOM are served
+# from MapCluster; finer zooms are aggregated from HouseCard on request.
+# House writes only queue their point changes in MapClusterChange; the
+# fold_map_clusters command folds them into the cells in batches, so the
+# coarse cells that every write touches aren't locked by requests.
+
+MAX_LAT = 85.05112878
+
+
+class ViewportError(ValueError):
+    pass
+
+
+def grid_size(zoom):
+    return 1 << (zoom + settings.MAP_CLUSTER_CELL_BITS)
+
+
+def precomputed_zooms():
+    return range(settings.MAP_CLUSTER_MAX_PRECOMPUTED_ZOOM + 1)
+
+
+def project(lat, lng):
+    lat = max(-MAX_LAT, min(MAX_LAT, lat))
+    x = (lng + 180.0) / 360.0
+    sin_lat = math.sin(math.radians(lat))
+    y = 0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)
+    return x, y
+
+
+def cell_for(lat, lng, zoom):
+    n = grid_size(zoom)
+    x, y = project(lat, lng)
+    return min(int(x * n), n - 1), min(int(y * n), n - 1)
+
+
+def cell_bounds(cell_x, cell_y, zoom):
+    # (min_lat, min_lng, max_lat, max_lng) of a cell.
+    n = grid_size(zoom)
+
+    def lat_at(y):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+
+    return lat_at(cell_y + 1), cell_x / n * 360.0 - 180.0, lat_at(cell_y), (cell_x + 1) / n * 360.0 - 180.0
+
+
+def card_point(lat, lng, price, remove):
+    # The clustering input for a house, or None when it isn't on the map.
+    return None if remove or lat is None or lng is None else (lat, lng, price)
+
+
+def _cheapest(cluster):
+    # Lowest current price in a cell, or None if HouseCard has no house left
+    # in it. Reading the live value is safe with changes still queued: a
+    # queued add can't lower it further and a queued removal recomputes it.
+    min_lat, min_lng, max_lat, max_lng = cell_bounds(cluster.cell_x, cluster.cell_y, cluster.zoom)
+    pad = 1e-9
+    rows = HouseCard.objects.filter(
+        remove=False,
+        lat__gte=min_lat - pad, lat__lte=max_lat + pad,
+        lng__gte=min_lng - pad, lng__lte=max_lng + pad,
+    ).values_list('lat', 'lng', 'price')
+    cell = (cluster.cell_x, cluster.cell_y)
+    return min((price for lat, lng, price in rows if cell_for(lat, lng, cluster.zoom) == cell), default=None)
+
+
+def queue_changes(removed=(), added=()):
+    # Records points leaving and entering the map, in the caller's
+    # transaction, for fold_changes to apply.
+    changes = [
+        MapClusterChange(lat=point[0], lng=point[1], price=point[2], sign=sign)
+        for sign, points in ((-1, removed), (1, added))
+        for point in points
+        if point is not None
+    ]
+    if changes:
+        MapClusterChange.objects.bulk_create(changes)
+
+
+def fold_changes(batch_size=1000):
+    # Applies the oldest queued changes to the precomputed cells and returns
+    # how many were applied. Counts and sums are arithmetic on the stored
+    # values; removing the cheapest house of a cell re-reads its minimum
+    # price from HouseCard. Concurrent folds wait for each other so changes
+    # are applied in order.
+    with transaction.atomic():
+        changes = list(MapClusterChange.objects.select_for_update().order_by('change_id')[:batch_size])
+        if not changes:
+            return 0
+        for zoom in precomputed_zooms():
+            deltas = defaultdict(lambda: {'count': 0, 'lat': 0.0, 'lng': 0.0, 'min_added': None, 'removed_prices': []})
+            for change in changes:
+                delta = deltas[cell_for(change.lat, change.lng, zoom)]
+                delta['count'] += change.sign
+                delta['lat'] += change.sign * change.lat
+                delta['lng'] += change.sign * change.lng
+                if change.sign > 0:
+                    delta['min_added'] = change.price if delta['min_added'] is None else min(delta['min_added'], change.price)
+                else:
+                    delta['removed_prices'].append(change.price)
+            existing = {
+                (cluster.cell_x, cluster.cell_y): cluster
+                for cluster in MapCluster.objects.select_for_update().filter(
+                    zoom=zoom,
+                    cell_x__in={cell[0] for cell in deltas},
+                    cell_y__in={cell[1] for cell in deltas},
+                )
+                if (cluster.cell_x, cluster.cell_y) in deltas
+            }
+            upserts, empty = [], []
+            for (cell_x, cell_y), delta in deltas.items():
+                cluster = existing.get((cell_x, cell_y)) or MapCluster(zoom=zoom, cell_x=cell_x, cell_y=cell_y, count=0, lat_sum=0.0, lng_sum=0.0, min_price=None)
+                cluster.count += delta['count']
+                cluster.lat_sum += delta['lat']
+                cluster.lng_sum += delta['lng']
+                if cluster.min_price is not None and any(price <= cluster.min_price for price in delta['removed_prices']):
+                    # Keeps the old minimum while removals of the last
+                    # houses are still queued.
+                    cheapest = _cheapest(cluster)
+                    if cheapest is not None:
+                        cluster.min_price = cheapest
+                if delta['min_added'] is not None:
+                    cluster.min_price = delta['min_added'] if cluster.min_price is None else min(cluster.min_price, delta['min_added'])
+                if cluster.count <= 0 or cluster.min_price is None:
+                    if cluster.pk:
+                        empty.append(cluster.pk)
+                else:
+                    upserts.append(cluster)
+            if upserts:
+                MapCluster.objects.bulk_create(
+                    upserts, update_conflicts=True,
+                    unique_fields=['zoom', 'cell_x', 'cell_y'],
+                    update_fields=['count', 'lat_sum', 'lng_sum', 'min_price'],
+                )
+            if empty:
+                MapCluster.objects.filter(pk__in=empty).delete()
+        MapClusterChange.objects.filter(pk__in=[change.pk for change in changes]).delete()
+    return len(changes)
+
+
+def rebuild(zooms=None, batch_size=5000):
+    # Folds the queue first so the rebuilt cells don't get those changes a
+    # second time. Houses written while it runs can still be counted twice;
+    # run it when writes are quiet.
+    zooms = list(precomputed_zooms() if zooms is None else zooms)
+    while fold_changes():
+        pass
+    points = list(HouseCard.objects.filter(remove=False).values_list('lat', 'lng', 'price').iterator(chunk_size=batch_size))
+    created = 0
+    with transaction.atomic():
+        MapCluster.objects.filter(zoom__in=zooms).delete()
+        for zoom in zooms:
+            cells = {}
+            for lat, lng, price in points:
+                cell = cell_for(lat, lng, zoom)
+                cluster = cells.get(cell)
+                if cluster is None:
+                    cells[cell] = MapCluster(zoom=zoom, cell_x=cell[0], cell_y=cell[1], count=1, lat_sum=lat, lng_sum=lng, min_price=price)
+                else:
+                    cluster.count += 1
+                    cluster.lat_sum += lat
+                    cluster.lng_sum += lng
+                    cluster.min_price = min(cluster.min_price, price)
+            MapCluster.objects.bulk_create(cells.values(), batch_size=batch_size)
+            created += len(cells)
+    return created
+
+
+def parse_bbox(value):
+    # "min_lng,min_lat,max_lng,max_lat"; min_lng > max_lng crosses the
+    # antimeridian.
+    try:
+        min_lng, min_lat, max_lng, max_lat = (float(part) for part in value.split(','))
+    except (AttributeError, ValueError):
+        raise ViewportError('bbox must be min_lng,min_lat,max_lng,max_lat')
+    if not (-90 <= min_lat <= max_lat <= 90) or not (-180 <= min_lng <= 180 and -180 <= max_lng <= 180):
+        raise ViewportError('bbox is out of range')
+    return min_lng, min_lat, max_lng, max_lat
+
+
+def _lng_spans(min_lng, max_lng):
+    return [(min_lng, max_lng)] if min_lng <= max_lng else [(min_lng, 180.0), (-180.0, max_lng)]
+
+
+def clusters_in_view(bbox, zoom):
+    min_lng, min_lat, max_lng, max_lat = bbox
+    if zoom <= settings.MAP_CLUSTER_MAX_PRECOMPUTED_ZOOM:
+        _, y_top = cell_for(max_lat, 0, zoom)
+        _, y_bottom = cell_for(min_lat, 0, zoom)
+        x_filter = Q()
+        for west, east in _lng_spans(min_lng, max_lng):
+            x_filter |= Q(cell_x__gte=cell_for(0, west, zoom)[0], cell_x__lte=cell_for(0, east, zoom)[0])
+        rows = MapCluster.objects.filter(x_filter, zoom=zoom, cell_y__gte=y_top, cell_y__lte=y_bottom).values_list(
+            'count', 'lat_sum', 'lng_sum', 'min_price',
+        )
+        return [
+            {'lat': lat_sum / count, 'lng': lng_sum / count, 'count': count, 'min_price': str(min_price)}
+            for count, lat_sum, lng_sum, min_price in rows
+        ]
+
+    lng_filter = Q()
+    for west, east in _lng_spans(min_lng, max_lng):
+        lng_filter |= Q(lng__gte=west, lng__lte=east)
+    rows = HouseCard.objects.filter(lng_filter, remove=False, lat__gte=min_lat, lat__lte=max_lat).values_list(
+        'house_id', 'lat', 'lng', 'price',
+    )
+    cells = {}
+    for house_id, lat, lng, price in rows:
+        cell = cells.setdefault(cell_for(lat, lng, zoom), {'count': 0, 'lat': 0.0, 'lng': 0.0, 'min_price': price, 'house_id': house_id})
+        cell['count'] += 1
+        cell['lat'] += lat
+        cell['lng'] += lng
+        cell['min_price'] = min(cell['min_price'], price)
+    clusters = []
+    for cell in cells.values():
+        cluster = {'lat': cell['lat'] / cell['count'], 'lng': cell['lng'] / cell['count'], 'count': cell['count'], 'min_price': str(cell['min_price'])}
+        if cell['count'] == 1:
+            cluster['house_id'] = cell['house_id']
+        clusters.append(cluster)
+    return clusters
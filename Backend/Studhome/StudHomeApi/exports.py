@@ -0,0 +1,105 @@
+import csv
+import datetime
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from .models import Transaction
+from .renderers import orjson
+
+EXPORT_CHUNK_SIZE = 2000
+
+TRANSACTION_EXPORT_FIELDS = (
+    ('transaction_id', 'transaction_id'),
+    ('payment_date', 'payment_date'),
+    ('payment_status', 'payment_status'),
+    ('payment_reference', 'payment_reference'),
+    ('transaction_type', 'transaction_type'),
+    ('amount_paid', 'amount_paid'),
+    ('user_id', 'user__user_id'),
+    ('username', 'user__username'),
+    ('email', 'user__email'),
+    ('phone_number', 'user__phone_number'),
+    ('house_id', 'house__house_id'),
+    ('house_name', 'house__house_name'),
+    ('room_type', 'house__room_type'),
+)
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+class ExportFilterError(ValueError):
+    pass
+
+
+def parse_export_bound(value, end=False):
+    if not value:
+        return None
+    # Plain dates are tried first: parse_datetime also accepts them, as
+    # midnight, which would make an end date exclusive. Both return None
+    # for malformed values but raise ValueError for impossible ones like
+    # 2024-13-01.
+    try:
+        day = parse_date(value)
+        moment = parse_datetime(value) if day is None else None
+    except ValueError:
+        day = moment = None
+    if day is not None:
+        if end:
+            day += datetime.timedelta(days=1)
+        moment = datetime.datetime.combine(day, datetime.time.min)
+    elif moment is None:
+        raise ExportFilterError(f"Invalid date '{value}', expected YYYY-MM-DD or an ISO 8601 datetime")
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment, datetime.timezone.utc)
+    return moment
+
+
+def transaction_export_queryset(start=None, end=None, statuses=None):
+    transactions = Transaction.objects.all()
+    if start:
+        transactions = transactions.filter(payment_date__gte=start)
+    if end:
+        transactions = transactions.filter(payment_date__lt=end)
+    if statuses:
+        transactions = transactions.filter(payment_status__in=statuses)
+    return transactions.order_by('payment_date', 'transaction_id').values_list(
+        *(lookup for _, lookup in TRANSACTION_EXPORT_FIELDS)
+    )
+
+
+def ndjson_line(row):
+    if orjson is not None:
+        return orjson.dumps(row, default=str, option=orjson.OPT_UTC_Z) + b'\n'
+    return (json.dumps(row, cls=DjangoJSONEncoder) + '\n').encode()
+
+
+def iter_ndjson(rows):
+    names = [name for name, _ in TRANSACTION_EXPORT_FIELDS]
+    for row in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield ndjson_line(dict(zip(names, row)))
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow([name for name, _ in TRANSACTION_EXPORT_FIELDS]).encode()
+    for row in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield writer.writerow([
+            value.isoformat() if isinstance(value, datetime.datetime) else value
+            for value in row
+        ]).encode()
+
+
+def stream_transactions(file_format, start=None, end=None, statuses=None):
+    rows = transaction_export_queryset(start, end, statuses)
+    if file_format == 'csv':
+        return iter_csv(rows)
+    return iter_ndjson(rows)
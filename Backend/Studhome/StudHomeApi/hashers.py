@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher, ScryptPasswordHasher
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    # Same 'argon2' algorithm name as Django's hasher, so existing hashes
+    # verify. Hashes made with other parameters are upgraded on login.
+    time_cost = settings.ARGON2_TIME_COST
+    memory_cost = settings.ARGON2_MEMORY_COST
+    parallelism = settings.ARGON2_PARALLELISM
+
+
+class TunedScryptPasswordHasher(ScryptPasswordHasher):
+    work_factor = settings.SCRYPT_WORK_FACTOR
+    block_size = settings.SCRYPT_BLOCK_SIZE
+    parallelism = settings.SCRYPT_PARALLELISM
+    # N * r * 128 bytes, with headroom over OpenSSL's 32 MiB default limit.
+    maxmem = 2 * 128 * settings.SCRYPT_WORK_FACTOR * settings.SCRYPT_BLOCK_SIZE
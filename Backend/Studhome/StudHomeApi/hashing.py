@@ -0,0 +1,69 @@
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_process_pool = None
+_rehash_pool = None
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+def get_process_pool():
+    # Worker processes for bulk hashing (hash_passwords), started on first
+    # use. PASSWORD_HASHING_WORKERS = 0 hashes inline.
+    global _process_pool
+    if not settings.PASSWORD_HASHING_WORKERS:
+        return None
+    with _lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(
+                max_workers=settings.PASSWORD_HASHING_WORKERS,
+                mp_context=multiprocessing.get_context(settings.PASSWORD_HASHING_START_METHOD),
+                initializer=_init_worker,
+            )
+    return _process_pool
+
+
+def hash_password(raw_password):
+    # Hashed on the calling thread: waiting on a worker process would block
+    # the request just the same.
+    return make_password(raw_password)
+
+
+def hash_passwords(raw_passwords):
+    raw_passwords = list(raw_passwords)
+    pool = get_process_pool()
+    if pool is None:
+        return [make_password(raw_password) for raw_password in raw_passwords]
+    chunksize = max(1, len(raw_passwords) // (settings.PASSWORD_HASHING_WORKERS * 4))
+    return list(pool.map(make_password, raw_passwords, chunksize=chunksize))
+
+
+def _rehash(user_model, user_pk, old_hash, raw_password):
+    try:
+        new_hash = hash_password(raw_password)
+        # Conditional on the old hash so a concurrent password change wins.
+        user_model._default_manager.filter(pk=user_pk, password=old_hash).update(password=new_hash)
+    except Exception:
+        logger.exception(f"Background password rehash failed for user {user_pk}")
+    finally:
+        close_old_connections()
+
+
+def schedule_rehash(user, raw_password):
+    global _rehash_pool
+    with _lock:
+        if _rehash_pool is None:
+            _rehash_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='password-rehash')
+    return _rehash_pool.submit(_rehash, type(user), user.pk, user.password, raw_password)
+
@@ -0,0 +1,301 @@
+import datetime
+import gzip
+import hashlib
+import json
+import os
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from .exports import ndjson_line
+from .ids import uuid7
+from .models import HistoryArchive, Reservation, Transaction
+
+# Partition maintenance for the transaction table and archival of old
+# history. Partitioning is opt-in (partition_transactions) since it rebuilds
+# the table. Months are UTC calendar months.
+
+ARCHIVE_CHUNK_SIZE = 2000
+
+ARCHIVE_KINDS = {
+    # kind: (model, date field, rows that can no longer change)
+    'transaction': (Transaction, 'payment_date', ~Q(payment_status='PENDING')),
+    'reservation': (Reservation, 'reservation_date', Q(is_active=False)),
+}
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def month_start(moment):
+    moment = moment.astimezone(datetime.timezone.utc)
+    return datetime.datetime(moment.year, moment.month, 1, tzinfo=datetime.timezone.utc)
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return datetime.datetime(index // 12, index % 12 + 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def transaction_table():
+    return Transaction._meta.db_table
+
+
+def partition_name(month):
+    return f'{transaction_table()}_p{month:%Y%m}'
+
+
+def is_partitioned():
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)', [connection.ops.quote_name(transaction_table())])
+        row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def add_table_constraints(schema_editor, pk_columns):
+    # Recreates the primary key, foreign keys and indexes Django made on the
+    # original table.
+    qn = schema_editor.quote_name
+    table = transaction_table()
+    schema_editor.execute(
+        f'ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(table + "_pkey")} '
+        f'PRIMARY KEY ({", ".join(qn(column) for column in pk_columns)})'
+    )
+    for name in ('user', 'house'):
+        field = Transaction._meta.get_field(name)
+        target = field.remote_field.model._meta
+        schema_editor.execute(
+            f'ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(f"{table}_{field.column}_fk")} FOREIGN KEY ({qn(field.column)}) '
+            f'REFERENCES {qn(target.db_table)} ({qn(target.pk.column)}) DEFERRABLE INITIALLY DEFERRED'
+        )
+        schema_editor.execute(f'CREATE INDEX {qn(f"{table}_{field.column}_idx")} ON {qn(table)} ({qn(field.column)})')
+    for index in Transaction._meta.indexes:
+        schema_editor.add_index(Transaction, index)
+
+
+def partition_transaction_table(months_ahead=None):
+    # Rebuilds the transaction table as a partitioned table with a partition
+    # per month from the oldest row to months_ahead months out, plus a
+    # default partition so inserts never fail. Every row is copied under an
+    # exclusive lock, so run it in a maintenance window.
+    #
+    # PostgreSQL requires the partition key in every unique index, so the
+    # primary key becomes (transaction_id, payment_date) and transaction_id
+    # alone is no longer enforced unique. Ids come from uuid7() and are never
+    # reused, and the primary key index still leads with transaction_id, so
+    # lookups by id stay index scans.
+    months_ahead = settings.TRANSACTION_PARTITIONS_AHEAD if months_ahead is None else months_ahead
+    qn = connection.ops.quote_name
+    table = transaction_table()
+    staging = f'{table}_partitioned'
+    with connection.schema_editor() as schema_editor:
+        schema_editor.execute(f'LOCK TABLE {qn(table)} IN ACCESS EXCLUSIVE MODE')
+        schema_editor.execute(
+            f'CREATE TABLE {qn(staging)} (LIKE {qn(table)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            f'PARTITION BY RANGE ("payment_date")'
+        )
+        schema_editor.execute(f'CREATE TABLE {qn(table + "_default")} PARTITION OF {qn(staging)} DEFAULT')
+        now = timezone.now()
+        oldest = Transaction.objects.order_by('payment_date').values_list('payment_date', flat=True).first()
+        month = month_start(min(oldest, now) if oldest else now)
+        last = add_months(month_start(now), months_ahead)
+        while month <= last:
+            end = add_months(month, 1)
+            schema_editor.execute(
+                f'CREATE TABLE {qn(partition_name(month))} PARTITION OF {qn(staging)} '
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{end.isoformat()}')"
+            )
+            month = end
+        schema_editor.execute(f'INSERT INTO {qn(staging)} SELECT * FROM {qn(table)}')
+        schema_editor.execute(f'DROP TABLE {qn(table)}')
+        schema_editor.execute(f'ALTER TABLE {qn(staging)} RENAME TO {qn(table)}')
+        add_table_constraints(schema_editor, ['transaction_id', 'payment_date'])
+
+
+def unpartition_transaction_table():
+    # Copies the rows back into a plain table with transaction_id as the
+    # primary key.
+    qn = connection.ops.quote_name
+    table = transaction_table()
+    staging = f'{table}_plain'
+    with connection.schema_editor() as schema_editor:
+        schema_editor.execute(f'LOCK TABLE {qn(table)} IN ACCESS EXCLUSIVE MODE')
+        schema_editor.execute(f'CREATE TABLE {qn(staging)} (LIKE {qn(table)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+        schema_editor.execute(f'INSERT INTO {qn(staging)} SELECT * FROM {qn(table)}')
+        schema_editor.execute(f'DROP TABLE {qn(table)}')
+        schema_editor.execute(f'ALTER TABLE {qn(staging)} RENAME TO {qn(table)}')
+        add_table_constraints(schema_editor, ['transaction_id'])
+
+
+def transaction_partitions():
+    # {month: partition name} of the monthly partitions.
+    prefix = f'{transaction_table()}_p'
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = to_regclass(%s)',
+            [connection.ops.quote_name(transaction_table())],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    partitions = {}
+    for name in names:
+        suffix = name[len(prefix):]
+        if name.startswith(prefix) and len(suffix) == 6 and suffix.isdigit():
+            partitions[datetime.datetime(int(suffix[:4]), int(suffix[4:]), 1, tzinfo=datetime.timezone.utc)] = name
+    return partitions
+
+
+def create_partition(month):
+    # Returns False if the partition exists. Rows for the month that already
+    # landed in the default partition are moved into the new one, otherwise
+    # PostgreSQL refuses to attach it.
+    qn = connection.ops.quote_name
+    table = transaction_table()
+    name = partition_name(month)
+    end = add_months(month, 1)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute('SELECT to_regclass(%s)', [qn(name)])
+        if cursor.fetchone()[0] is not None:
+            return False
+        cursor.execute(f'CREATE TABLE {qn(name)} (LIKE {qn(table)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {qn(table + "_default")} WHERE payment_date >= %s AND payment_date < %s RETURNING *) '
+            f'INSERT INTO {qn(name)} SELECT * FROM moved',
+            [month, end],
+        )
+        cursor.execute(
+            f'ALTER TABLE {qn(table)} ATTACH PARTITION {qn(name)} '
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{end.isoformat()}')"
+        )
+    return True
+
+
+def ensure_partitions(months_ahead=None):
+    # Creates the partitions for this month and the next months_ahead.
+    # Returns the names created.
+    months_ahead = settings.TRANSACTION_PARTITIONS_AHEAD if months_ahead is None else months_ahead
+    current = month_start(timezone.now())
+    created = []
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        if create_partition(month):
+            created.append(partition_name(month))
+    return created
+
+
+def drop_empty_partitions(before):
+    # Detaches and drops monthly partitions that end before `before` and
+    # hold no rows any more. Returns the names dropped.
+    qn = connection.ops.quote_name
+    table = transaction_table()
+    dropped = []
+    for month, name in sorted(transaction_partitions().items()):
+        if add_months(month, 1) > before:
+            continue
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'SELECT EXISTS (SELECT 1 FROM {qn(name)})')
+            if cursor.fetchone()[0]:
+                continue
+            cursor.execute(f'ALTER TABLE {qn(table)} DETACH PARTITION {qn(name)}')
+            cursor.execute(f'DROP TABLE {qn(name)}')
+        dropped.append(name)
+    return dropped
+
+
+def archivable_rows(kind, start, end):
+    model, date_field, finished = ARCHIVE_KINDS[kind]
+    return model.objects.filter(finished, **{f'{date_field}__gte': start, f'{date_field}__lt': end})
+
+
+def archive_cutoff(hot_months=None):
+    hot_months = settings.HISTORY_HOT_MONTHS if hot_months is None else hot_months
+    return add_months(month_start(timezone.now()), -hot_months)
+
+
+def archivable_months(kind, before):
+    model, date_field, finished = ARCHIVE_KINDS[kind]
+    oldest = model.objects.filter(finished, **{f'{date_field}__lt': before}).order_by(date_field).values_list(date_field, flat=True).first()
+    if oldest is None:
+        return []
+    months = []
+    month = month_start(oldest)
+    while month < before:
+        months.append(month)
+        month = add_months(month, 1)
+    return months
+
+
+def archive_month(kind, month, directory=None):
+    # Writes the month's finished rows to a gzip NDJSON file, then deletes
+    # them and records a HistoryArchive in one transaction. The file is
+    # removed again if that fails. Returns None when there was nothing to
+    # archive.
+    model, date_field, _ = ARCHIVE_KINDS[kind]
+    end = add_months(month, 1)
+    rows = archivable_rows(kind, month, end)
+    pk_name = model._meta.pk.attname
+    directory = directory or settings.HISTORY_ARCHIVE_DIR
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{kind}-{month:%Y-%m}-{uuid7().hex[-8:]}.ndjson.gz')
+    partial = path + '.partial'
+
+    ids = []
+    with gzip.open(partial, 'wb') as output:
+        for row in rows.order_by(date_field, pk_name).values().iterator(chunk_size=ARCHIVE_CHUNK_SIZE):
+            output.write(ndjson_line(row))
+            ids.append(row[pk_name])
+    if not ids:
+        os.remove(partial)
+        return None
+    digest = hashlib.sha256()
+    with open(partial, 'rb') as archived:
+        for chunk in iter(lambda: archived.read(1024 * 1024), b''):
+            digest.update(chunk)
+        os.fsync(archived.fileno())
+    os.replace(partial, path)
+
+    try:
+        with transaction.atomic():
+            deleted = 0
+            for start in range(0, len(ids), ARCHIVE_CHUNK_SIZE):
+                # _raw_delete skips per-row signals: archived reservations are
+                # inactive and don't affect house cards.
+                deleted += rows.filter(pk__in=ids[start:start + ARCHIVE_CHUNK_SIZE])._raw_delete(rows.db)
+            if deleted != len(ids):
+                raise ArchiveError(f'{kind} {month:%Y-%m}: archived {len(ids)} rows but {deleted} were still deletable')
+            return HistoryArchive.objects.create(
+                kind=kind,
+                period_start=month,
+                period_end=end,
+                path=path,
+                rows=len(ids),
+                size=os.path.getsize(path),
+                sha256=digest.hexdigest(),
+            )
+    except Exception:
+        os.remove(path)
+        raise
+
+
+def archive_history(before=None, kinds=None, directory=None):
+    # Archives every month before `before` (default: HISTORY_HOT_MONTHS ago)
+    # and drops transaction partitions left empty. Returns (archives,
+    # dropped partition names).
+    before = before or archive_cutoff()
+    archives = []
+    for kind in kinds or ARCHIVE_KINDS:
+        for month in archivable_months(kind, before):
+            archive = archive_month(kind, month, directory)
+            if archive is not None:
+                archives.append(archive)
+    dropped = drop_empty_partitions(before) if is_partitioned() else []
+    return archives, dropped
+
+
+def read_archive(archive):
+    # Yields the archived rows as dicts, e.g. to restore or audit them.
+    with gzip.open(archive.path, 'rb') as archived:
+        for line in archived:
+            yield json.loads(line)
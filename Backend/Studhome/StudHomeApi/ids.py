@@ -0,0 +1,39 @@
+import secrets
+import threading
+import time
+import uuid
+
+# Time-ordered primary keys. Random uuid4 keys land all over the primary key
+# B-tree, so every insert dirties a different page; uuid7 keys start with
+# the creation time and append to its right edge like a sequence would.
+
+_lock = threading.Lock()
+_last_ms = 0
+_counter = 0
+
+
+def uuid7():
+    # RFC 9562 UUIDv7: 48-bit Unix timestamp in milliseconds, a 12-bit
+    # counter (rand_a, method 1) and 62 random bits. The counter starts at a
+    # random point each millisecond and keeps ids from this process strictly
+    # increasing; if it runs out or the clock goes back, the timestamp is
+    # carried forward from the last id.
+    global _last_ms, _counter
+    with _lock:
+        now_ms = time.time_ns() // 1_000_000
+        if now_ms > _last_ms:
+            _last_ms = now_ms
+            _counter = secrets.randbits(11)
+        else:
+            _counter += 1
+            if _counter > 0xFFF:
+                _last_ms += 1
+                _counter = 0
+        timestamp, counter = _last_ms, _counter
+    value = (timestamp & 0xFFFFFFFFFFFF) << 80
+    value |= 0x7 << 76
+    value |= counter << 64
+    value |= 0b10 << 62
+    value |= secrets.randbits(62)
+    return uuid.UUID(int=value)
+
@@ -0,0 +1,238 @@
+import csv
+import io
+import json
+import logging
+import os
+import time
+from datetime import timedelta
+from urllib.parse import urlsplit
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from .media import upload_deduplicated
+from .model_uploads import MODEL_EXTENSIONS, ModelUploadError, store_model
+from .models import House, ImportCheckpoint, PendingMediaUpload
+from .signals import sync_bulk_created_houses
+
+logger = logging.getLogger(__name__)
+
+IMPORT_FIELDS = ('house_name', 'room_type', 'price', 'lat', 'lng', 'description', 'availability')
+IMAGE_EXTENSIONS = ('jpg', 'jpeg', 'png')
+MAX_UPLOAD_ATTEMPTS = 5
+
+
+class ImportReport:
+    def __init__(self):
+        self.created = 0
+        self.skipped = 0
+        self.queued_media = 0
+        self.errors = []
+        self.last_line = 0
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.created / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        return (
+            f"Imported {self.created} houses ({self.rows_per_second:,.0f} rows/s), "
+            f"queued {self.queued_media} media uploads, {len(self.errors)} rows failed"
+        )
+
+
+def detect_format(name):
+    return 'jsonl' if name.lower().endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+def read_rows(stream, file_format):
+    if file_format == 'jsonl':
+        for line_no, line in enumerate(stream, start=1):
+            if line.strip():
+                try:
+                    yield line_no, json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_no, ValueError(f'Invalid JSON: {e}')
+    else:
+        # Line numbers count the header as line 1, matching what a spreadsheet shows.
+        for line_no, row in enumerate(csv.DictReader(stream), start=2):
+            yield line_no, row
+
+
+def resolve_source(source):
+    # Media comes from http(s) URLs or files under MEDIA_IMPORT_DIR, never
+    # from anywhere else on the server. Returns the URL or the file's path.
+    url = urlsplit(source)
+    if url.scheme in ('http', 'https') and url.netloc:
+        return source
+    if settings.MEDIA_IMPORT_DIR:
+        root = os.path.realpath(settings.MEDIA_IMPORT_DIR)
+        path = os.path.realpath(os.path.join(root, source))
+        if path != root and os.path.commonpath([root, path]) == root:
+            return path
+    raise ValidationError(f"Media source '{source}' must be an http(s) URL or a file in the import directory")
+
+
+def parse_media(value):
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = [item.strip() for item in value.split('|') if item.strip()]
+    if not isinstance(value, list):
+        raise ValidationError('media must be a list or a |-separated string.')
+    media = []
+    for item in value:
+        if isinstance(item, str):
+            item = {'source': item}
+        if not isinstance(item, dict) or not isinstance(item.get('source'), str):
+            raise ValidationError('Each media item must be a source string or an object with a source.')
+        source = item['source']
+        resolve_source(source)
+        ext = source.rsplit('.', 1)[-1].lower()
+        if ext in IMAGE_EXTENSIONS:
+            media_type = 'image'
+        elif ext in MODEL_EXTENSIONS:
+            media_type = '3d_model'
+        else:
+            raise ValidationError(f"Unsupported media file '{source}'")
+        media.append({'source': source, 'media_type': media_type, 'caption': item.get('caption') or ''})
+    if sum(1 for item in media if item['media_type'] == 'image') > 6:
+        raise ValidationError('Maximum of 6 images allowed per house.')
+    if sum(1 for item in media if item['media_type'] == '3d_model') > 1:
+        raise ValidationError('Only one 3D model allowed per house.')
+    return media
+
+
+def build_house(row):
+    if not isinstance(row, dict):
+        raise ValidationError('Each row must be a JSON object.')
+    values = {field: row[field] for field in IMPORT_FIELDS if row.get(field) not in (None, '')}
+    if isinstance(values.get('availability'), str):
+        values['availability'] = values['availability'].strip().lower() in ('1', 'true', 'yes')
+    house = House(**values)
+    house.full_clean(exclude=['media'], validate_unique=False)
+    return house, parse_media(row.get('media'))
+
+
+def load_checkpoint(name):
+    if not name:
+        return 0
+    return ImportCheckpoint.objects.filter(name=name).values_list('line', flat=True).first() or 0
+
+
+def save_checkpoint(name, line):
+    # Called inside the batch's transaction, so the checkpoint commits (or
+    # rolls back) together with the rows it covers.
+    if name:
+        ImportCheckpoint.objects.update_or_create(name=name, defaults={'line': line})
+
+
+def _flush(batch, report, checkpoint):
+    with transaction.atomic():
+        houses = House.objects.bulk_create([house for _, house, _ in batch])
+        sync_bulk_created_houses(houses)
+        uploads = [
+            PendingMediaUpload(house=house, **item)
+            for (_, _, media), house in zip(batch, houses)
+            for item in media
+        ]
+        PendingMediaUpload.objects.bulk_create(uploads)
+        save_checkpoint(checkpoint, report.last_line)
+    report.created += len(houses)
+    report.queued_media += len(uploads)
+
+
+def import_houses(stream, file_format='csv', batch_size=500, checkpoint=None, resume=False):
+    report = ImportReport()
+    start_after = load_checkpoint(checkpoint) if resume else 0
+    batch = []
+    for line_no, row in read_rows(stream, file_format):
+        if line_no <= start_after:
+            report.skipped += 1
+            continue
+        try:
+            if isinstance(row, Exception):
+                raise row
+            house, media = build_house(row)
+        except (ValidationError, ValueError, TypeError) as e:
+            messages = e.message_dict if hasattr(e, 'error_dict') else getattr(e, 'messages', [str(e)])
+            report.errors.append((line_no, messages))
+        else:
+            batch.append((line_no, house, media))
+        report.last_line = line_no
+        if len(batch) >= batch_size:
+            _flush(batch, report, checkpoint)
+            batch = []
+    if batch:
+        _flush(batch, report, checkpoint)
+    elif report.last_line:
+        save_checkpoint(checkpoint, report.last_line)
+    report.elapsed = time.perf_counter() - report.started
+    return report
+
+
+def import_uploaded_file(uploaded_file, batch_size=500):
+    stream = io.TextIOWrapper(uploaded_file.file, encoding='utf-8-sig', newline='')
+    return import_houses(stream, detect_format(uploaded_file.name), batch_size=batch_size)
+
+
+def claimable():
+    # Pending uploads, plus claimed ones whose worker stopped before
+    # recording a result.
+    stale = timezone.now() - timedelta(minutes=settings.MEDIA_UPLOAD_CLAIM_MINUTES)
+    return Q(status='PENDING') | Q(status='UPLOADING', claimed_at__lt=stale)
+
+
+def upload_media(pending):
+    source = resolve_source(pending.source)
+    if os.path.isabs(source):
+        with open(source, 'rb') as file:
+            if pending.media_type == '3d_model':
+                return store_model(file, pending.caption)
+            file_url, _ = upload_deduplicated(file, resource_type='image')
+    else:
+        resource_type = 'raw' if pending.media_type == '3d_model' else 'image'
+        file_url, _ = upload_deduplicated(source, resource_type=resource_type)
+    return {
+        'media_type': pending.media_type,
+        'file_url': file_url,
+        'caption': pending.caption,
+        'uploaded_at': timezone.now().isoformat()
+    }
+
+
+def upload_pending_media(upload_ids):
+    # Each upload is claimed with a single UPDATE, uploaded with no
+    # transaction or row lock held, and its result recorded in a short
+    # transaction afterwards, as long as the claim is still ours.
+    uploaded = failed = 0
+    for upload_id in upload_ids:
+        claimed_at = timezone.now()
+        if not PendingMediaUpload.objects.filter(claimable(), upload_id=upload_id).update(
+            status='UPLOADING', attempts=F('attempts') + 1, claimed_at=claimed_at,
+        ):
+            continue
+        pending = PendingMediaUpload.objects.get(upload_id=upload_id)
+        ours = PendingMediaUpload.objects.filter(upload_id=upload_id, status='UPLOADING', claimed_at=claimed_at)
+        try:
+            entry = upload_media(pending)
+        except Exception as e:
+            error = ' '.join(e.messages) if isinstance(e, ValidationError) else str(e)
+            logger.warning(f"Media upload {pending.upload_id} failed: {error}")
+            # Invalid sources and models won't get better on retry.
+            retry = pending.attempts < MAX_UPLOAD_ATTEMPTS and not isinstance(e, (ModelUploadError, ValidationError))
+            ours.update(status='PENDING' if retry else 'FAILED', error=error)
+            failed += 1
+            continue
+        with transaction.atomic():
+            if not ours.select_for_update().exists():
+                continue
+            house = House.objects.select_for_update().get(house_id=pending.house_id)
+            house.media = (house.media or []) + [entry]
+            house.save()
+            ours.update(status='UPLOADED', error='', uploaded_at=timezone.now())
+        uploaded += 1
+    return uploaded, failed
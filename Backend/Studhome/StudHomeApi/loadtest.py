@@ -0,0 +1,211 @@
+import json
+import math
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from decimal import Decimal
+from django.db import close_old_connections
+from .models import House, User
+from .signals import sync_bulk_created_houses
+from .webhooks import sign_webhook_payload
+
+# Replays the student booking funnel against the API. Used by the
+# loadtest_funnel command; run the target with OFFLINE_BACKENDS=True so
+# payments and emails go to the fakes in backends.py. Houses are seeded and
+# cleaned up through the ORM, so a remote target must use the same database.
+# Users and houses are named loadtest-<run tag>-<n>.
+
+FUNNEL_STEPS = ('register', 'token', 'list', 'detail', 'save', 'initiate', 'webhook', 'verify', 'reservations')
+DATASET_PREFIX = 'loadtest-'
+
+
+class InProcessClient:
+    def __init__(self):
+        from django.test import Client
+        self.client = Client(SERVER_NAME='localhost', raise_request_exception=False)
+
+    def request(self, method, path, data=None, token=None):
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'} if token else {}
+        if method == 'GET':
+            response = self.client.get(path, **headers)
+        else:
+            response = getattr(self.client, method.lower())(path, data or {}, content_type='application/json', **headers)
+        try:
+            body = json.loads(response.content or b'null')
+        except ValueError:
+            body = None
+        return response.status_code, body
+
+    def close(self):
+        close_old_connections()
+
+
+class HttpClient:
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def request(self, method, path, data=None, token=None):
+        headers = {'Content-Type': 'application/json', 'Accept': 'application/json'}
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        body = json.dumps(data).encode() if data is not None else None
+        request = urllib.request.Request(self.base_url + path, data=body, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                status, content = response.status, response.read()
+        except urllib.error.HTTPError as e:
+            status, content = e.code, e.read()
+        try:
+            return status, json.loads(content or b'null')
+        except ValueError:
+            return status, None
+
+    def close(self):
+        pass
+
+
+class StepStats:
+    def __init__(self):
+        self.latencies = []
+        self.statuses = {}
+        self.errors = 0
+        self._mutex = threading.Lock()
+
+    def record(self, elapsed, status, ok):
+        with self._mutex:
+            self.latencies.append(elapsed)
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            if not ok:
+                self.errors += 1
+
+    def percentile(self, p):
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+class StepFailed(Exception):
+    pass
+
+
+class Funnel:
+    def __init__(self, client_factory, house_ids, reserve_ratio=0.2, webhook_key=None, think_time=0.0, run_tag=None):
+        self.client_factory = client_factory
+        self.house_ids = house_ids
+        self.reserve_ratio = reserve_ratio
+        self.webhook_key = webhook_key
+        self.think_time = think_time
+        self.stats = {step: StepStats() for step in FUNNEL_STEPS}
+        self.completed = 0
+        self.run_tag = run_tag or new_run_tag()
+        self._mutex = threading.Lock()
+
+    def step(self, client, name, method, path, data=None, token=None, expect=(200, 201)):
+        start = time.perf_counter()
+        try:
+            status, body = client.request(method, path, data, token)
+        except Exception:
+            status, body = 'exception', None
+        ok = status in expect
+        self.stats[name].record(time.perf_counter() - start, status, ok)
+        if not ok:
+            raise StepFailed(name)
+        if self.think_time:
+            time.sleep(random.uniform(0, self.think_time))
+        return body
+
+    def run_user(self, index):
+        client = self.client_factory()
+        username = f'{dataset_prefix(self.run_tag)}{index}'
+        password = 'Loadtest-pass-1'
+        try:
+            self.step(client, 'register', 'POST', '/api/user/register/', {
+                'username': username,
+                'email': f'{username}@loadtest.invalid',
+                'phone_number': f'+2376{random.randint(50000000, 99999999)}',
+                'password': password,
+            })
+            token = self.step(client, 'token', 'POST', '/api/token/', {'username': username, 'password': password})['access']
+            listing = self.step(client, 'list', 'GET', f'/api/houses/?limit=20&offset={random.randrange(0, max(1, len(self.house_ids) - 20))}', token=token)
+            candidates = [row['house_id'] for row in (listing or [])] or self.house_ids
+            house_id = random.choice(candidates)
+            self.step(client, 'detail', 'GET', f'/api/house/{house_id}/', token=token)
+            self.step(client, 'save', 'POST', f'/api/house/{house_id}/save/', token=token)
+            transaction_type = 'reserve' if random.random() < self.reserve_ratio else 'tour'
+            reference = self.step(client, 'initiate', 'POST', f'/api/house/{house_id}/initiate-payment/', {
+                'amount': 100,
+                'phone_number': '+237650000000',
+                'transaction_type': transaction_type,
+            }, token=token)['reference']
+            payload = sign_webhook_payload(
+                {'reference': reference, 'status': 'SUCCESSFUL', 'amount': '100', 'currency': 'XAF', 'external_reference': house_id},
+                key=self.webhook_key,
+            )
+            self.step(client, 'webhook', 'POST', '/api/payment/webhook/', payload)
+            self.step(client, 'verify', 'GET', f'/api/payment/verify/{reference}/', token=token)
+            self.step(client, 'reservations', 'GET', '/api/user/reservations/', token=token)
+            with self._mutex:
+                self.completed += 1
+        except StepFailed:
+            pass
+        finally:
+            client.close()
+
+    def run(self, users, concurrency):
+        counter = iter(range(users))
+        lock = threading.Lock()
+
+        def worker():
+            while True:
+                with lock:
+                    index = next(counter, None)
+                if index is None:
+                    return
+                self.run_user(index)
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - start
+
+
+def new_run_tag():
+    return uuid.uuid4().hex[:8]
+
+
+def dataset_prefix(run_tag):
+    return f'{DATASET_PREFIX}{run_tag}-'
+
+
+def seed_houses(count, tag, batch_size=1000):
+    houses = [
+        House(
+            house_name=f'{dataset_prefix(tag)}{i}',
+            room_type=random.choice(House.ROOM_TYPES)[0],
+            price=Decimal(random.randrange(20000, 200000, 500)),
+            lat=4.0 + random.random() * 0.2,
+            lng=9.6 + random.random() * 0.2,
+            media=[{'media_type': 'image', 'file_url': f'https://media.invalid/image/upload/{tag}-{i}.jpg', 'caption': ''}],
+        )
+        for i in range(count)
+    ]
+    for start in range(0, len(houses), batch_size):
+        batch = House.objects.bulk_create(houses[start:start + batch_size])
+        sync_bulk_created_houses(batch)
+    return [str(house.house_id) for house in houses]
+
+
+def delete_dataset(run_tag):
+    # Only this run's users and houses; other runs may still be going.
+    prefix = dataset_prefix(run_tag)
+    _, users = User.objects.filter(username__startswith=prefix).delete()
+    _, houses = House.objects.filter(house_name__startswith=prefix).delete()
+    return users.get(User._meta.label, 0), houses.get(House._meta.label, 0)
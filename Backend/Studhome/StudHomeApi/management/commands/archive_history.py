@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from StudHomeApi.history import ARCHIVE_KINDS, archivable_months, archivable_rows, add_months, archive_cutoff, archive_history
+
+
+class Command(BaseCommand):
+    help = (
+        'Move settled transactions and inactive reservations older than HISTORY_HOT_MONTHS to gzip NDJSON '
+        'files in HISTORY_ARCHIVE_DIR, one per kind and month, and drop emptied transaction partitions.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=settings.HISTORY_HOT_MONTHS, help='Months of history to keep in the database')
+        parser.add_argument('--kind', action='append', choices=list(ARCHIVE_KINDS), dest='kinds')
+        parser.add_argument('--directory', default=settings.HISTORY_ARCHIVE_DIR)
+        parser.add_argument('--dry-run', action='store_true', help='Only count the rows that would be archived')
+
+    def handle(self, *args, **options):
+        before = archive_cutoff(options['months'])
+        kinds = options['kinds'] or list(ARCHIVE_KINDS)
+        if options['dry_run']:
+            for kind in kinds:
+                for month in archivable_months(kind, before):
+                    count = archivable_rows(kind, month, add_months(month, 1)).count()
+                    if count:
+                        self.stdout.write(f'{kind} {month:%Y-%m}: {count} rows')
+            return
+
+        archives, dropped = archive_history(before, kinds, options['directory'])
+        for archive in archives:
+            self.stdout.write(f'{archive.kind} {archive.period_start:%Y-%m}: {archive.rows} rows, {archive.size} bytes -> {archive.path}')
+        for name in dropped:
+            self.stdout.write(f'Dropped empty partition {name}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {sum(archive.rows for archive in archives)} rows into {len(archives)} files before {before:%Y-%m-%d}.'
+        ))
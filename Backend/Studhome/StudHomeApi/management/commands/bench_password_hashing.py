@@ -0,0 +1,46 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher, make_password
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+
+def _hash_n(hasher_path, count):
+    hasher = import_string(hasher_path)()
+    for i in range(count):
+        hasher.encode(f'benchmark-password-{i}', hasher.salt())
+    return count
+
+
+class Command(BaseCommand):
+    help = 'Benchmark password hashes (registrations) per second per core for each configured hasher.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=20, help='Hashes per measurement.')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+
+    def handle(self, *args, **options):
+        count = options['count']
+        workers = options['workers']
+        self.stdout.write(f"preferred hasher: {get_hasher().algorithm} (PASSWORD_HASHER_POLICY={settings.PASSWORD_HASHER_POLICY})")
+        self.stdout.write(f"{'hasher':<55} {'1 core/s':>10} {f'{workers} procs/s':>12} {'per core/s':>11}")
+        for hasher_path in settings.PASSWORD_HASHERS:
+            try:
+                _hash_n(hasher_path, 1)
+            except (ValueError, ImportError) as e:
+                self.stdout.write(f'{hasher_path:<55} skipped: {e}')
+                continue
+            start = time.perf_counter()
+            _hash_n(hasher_path, count)
+            single = count / (time.perf_counter() - start)
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(_hash_n, [hasher_path] * workers, [1] * workers))
+                start = time.perf_counter()
+                total = sum(pool.map(_hash_n, [hasher_path] * workers, [count] * workers))
+                parallel = total / (time.perf_counter() - start)
+            self.stdout.write(f'{hasher_path:<55} {single:>10.1f} {parallel:>12.1f} {parallel / workers:>11.1f}')
+        start = time.perf_counter()
+        make_password('benchmark-password')
+        self.stdout.write(f'make_password() with the preferred hasher: {(time.perf_counter() - start) * 1000:.1f} ms')
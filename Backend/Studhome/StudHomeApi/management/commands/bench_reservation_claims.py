@@ -0,0 +1,67 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from StudHomeApi.models import House, Reservation, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Load test Reservation.objects.claim with many parallel payers racing for the same houses. '
+        'Creates its own users and houses and deletes them afterwards. Run it against PostgreSQL.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--payers', type=int, default=200)
+        parser.add_argument('--houses', type=int, default=10)
+        parser.add_argument('--workers', type=int, default=32)
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        users = User.objects.bulk_create([
+            User(username=f'claim-{tag}-{i}', email=f'claim-{tag}-{i}@bench.local', phone_number='+237650000000')
+            for i in range(options['payers'])
+        ])
+        houses = [
+            House.objects.create(house_name=f'Claim {tag} {i}', room_type='single', price=Decimal('100.00'), lat=4.0, lng=9.7)
+            for i in range(options['houses'])
+        ]
+        attempts = [(user, houses[i % len(houses)]) for i, user in enumerate(users)]
+        barrier = threading.Barrier(min(options['workers'], len(attempts)))
+        errors = []
+
+        def claim(attempt):
+            user, house = attempt
+            try:
+                try:
+                    barrier.wait(timeout=5)
+                except threading.BrokenBarrierError:
+                    pass
+                reservation, created = Reservation.objects.claim(user, House(house_id=house.house_id))
+                return house.house_id if created else None
+            except OperationalError as e:
+                errors.append(str(e))
+                return None
+            finally:
+                connection.close()
+
+        try:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+                winners = [house_id for house_id in pool.map(claim, attempts) if house_id]
+            elapsed = time.perf_counter() - start
+
+            house_ids = [house.house_id for house in houses]
+            active = Reservation.objects.filter(house_id__in=house_ids, is_active=True).count()
+            reserved = House.objects.filter(house_id__in=house_ids, is_reserved=True).count()
+            self.stdout.write(f'{len(attempts)} claims in {elapsed:.3f}s ({len(attempts) / elapsed:,.0f} claims/s)')
+            self.stdout.write(f'winners={len(winners)} active_reservations={active} reserved_houses={reserved} errors={len(errors)}')
+            if len(winners) != len(set(winners)) or active != len(houses) or reserved != len(houses):
+                raise CommandError('Claim invariant violated: expected exactly one active reservation per house.')
+            self.stdout.write(self.style.SUCCESS('OK: exactly one active reservation per house.'))
+        finally:
+            House.objects.filter(house_id__in=[house.house_id for house in houses]).delete()
+            User.objects.filter(user_id__in=[user.user_id for user in users]).delete()
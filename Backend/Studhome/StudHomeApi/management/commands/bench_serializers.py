@@ -0,0 +1,69 @@
+import time
+import uuid
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from StudHomeApi.models import House, HouseCard, Transaction, User
+from StudHomeApi.renderers import FastJSONRenderer, orjson
+from StudHomeApi.serializers import HouseSerializer, TransactionSerializer, house_card_rows, transaction_rows
+
+
+class Command(BaseCommand):
+    help = 'Benchmark rows per second of the serializer and .values() rendering paths. Runs in a rolled back transaction.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[1000, 10000, 50000])
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"orjson: {'installed' if orjson else 'not installed, using fallback'}")
+        self.stdout.write(f"{'rows':>8}  {'path':<44} {'rows/s':>12}")
+        for size in options['sizes']:
+            with transaction.atomic():
+                user = self.seed(size)
+                houses = House.objects.filter(remove=False)
+                cards = HouseCard.objects.filter(remove=False)
+                transactions = Transaction.objects.filter(user=user)
+                paths = [
+                    ('HouseSerializer + JSONRenderer', lambda: JSONRenderer().render(HouseSerializer(houses, many=True).data)),
+                    # full=True is what /api/houses/ serves by default,
+                    # full=False is the ?view=card listing.
+                    ('house_card_rows(full) + FastJSONRenderer', lambda: FastJSONRenderer().render(house_card_rows(cards, full=True))),
+                    ('house_card_rows(card) + FastJSONRenderer', lambda: FastJSONRenderer().render(house_card_rows(cards))),
+                    ('TransactionSerializer + JSONRenderer', lambda: JSONRenderer().render(TransactionSerializer(transactions, many=True).data)),
+                    ('transaction_rows + FastJSONRenderer', lambda: FastJSONRenderer().render(transaction_rows(transactions))),
+                ]
+                for name, render in paths:
+                    best = min(self.timed(render) for _ in range(options['repeat']))
+                    self.stdout.write(f'{size:>8}  {name:<44} {size / best:>12,.0f}')
+                transaction.set_rollback(True)
+
+    def timed(self, fn):
+        start = time.perf_counter()
+        fn()
+        return time.perf_counter() - start
+
+    def seed(self, size):
+        user = User.objects.create(username=f'bench-{uuid.uuid4().hex[:12]}', email=f'{uuid.uuid4().hex}@bench.local', phone_number='+237650000000')
+        houses = House.objects.bulk_create([
+            House(
+                house_name=f'Bench house {i}',
+                room_type=('single', 'double', 'apartment')[i % 3],
+                price=Decimal('25000.00') + i,
+                lat=4.0 + (i % 1000) / 10000,
+                lng=9.7 + (i % 1000) / 10000,
+                description='Benchmark listing',
+                media=[
+                    {'media_type': 'image', 'file_url': f'https://example.com/{i}/{n}.jpg', 'caption': '', 'uploaded_at': '2025-01-01T00:00:00+00:00'}
+                    for n in range(3)
+                ],
+            )
+            for i in range(size)
+        ], batch_size=1000)
+        HouseCard.objects.bulk_create([HouseCard.build_for_new(house) for house in houses], batch_size=1000)
+        Transaction.objects.bulk_create([
+            Transaction(user=user, house=house, amount_paid=Decimal('100.00'), transaction_type='tour', payment_reference=f'bench-{i}', payment_status='SUCCESSFUL')
+            for i, house in enumerate(houses)
+        ], batch_size=1000)
+        return user
@@ -0,0 +1,60 @@
+import os
+import statistics
+import subprocess
+import sys
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Measure cold boot time of Studhome.wsgi with python -X importtime and list the slowest imports.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--top', type=int, default=15)
+        parser.add_argument('--urls', action='store_true', help='Also load the URLconf (imports every view module).')
+
+    def handle(self, *args, **options):
+        code = 'import Studhome.wsgi'
+        if options['urls']:
+            code += '; from django.urls import get_resolver; get_resolver().url_patterns'
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'Studhome.settings'))
+        totals = []
+        modules = {}
+        for _ in range(options['runs']):
+            proc = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-c', code],
+                cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+            )
+            if proc.returncode != 0:
+                raise CommandError(proc.stderr.strip().splitlines()[-1])
+            total, per_module = self.parse(proc.stderr)
+            totals.append(total)
+            for name, (self_us, cumulative_us) in per_module.items():
+                modules.setdefault(name, []).append((self_us, cumulative_us))
+
+        self.stdout.write(
+            f"Cold boot over {options['runs']} runs: median {statistics.median(totals) / 1000:.1f} ms, "
+            f"min {min(totals) / 1000:.1f} ms, max {max(totals) / 1000:.1f} ms"
+        )
+        ranked = sorted(
+            ((name, statistics.median(s for s, _ in samples), statistics.median(c for _, c in samples)) for name, samples in modules.items()),
+            key=lambda row: row[1], reverse=True,
+        )
+        self.stdout.write(f"{'self ms':>9} {'cumul ms':>9}  module")
+        for name, self_us, cumulative_us in ranked[:options['top']]:
+            self.stdout.write(f'{self_us / 1000:>9.1f} {cumulative_us / 1000:>9.1f}  {name}')
+
+    def parse(self, output):
+        # Lines look like "import time:   self |  cumulative | module", nested
+        # modules are indented, so top level entries add up to the boot time.
+        total = 0
+        per_module = {}
+        for line in output.splitlines():
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+            self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+            if not name[1:].startswith(' '):
+                total += int(cumulative_us)
+            per_module[name.strip()] = (int(self_us), int(cumulative_us))
+        return total, per_module
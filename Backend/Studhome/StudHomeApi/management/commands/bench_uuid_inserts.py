@@ -0,0 +1,79 @@
+import statistics
+import time
+import uuid
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from StudHomeApi.ids import uuid7
+from StudHomeApi.models import House, Transaction, User
+
+GENERATORS = {'uuid4': uuid.uuid4, 'uuid7': uuid7}
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare Transaction insert throughput with uuid4 and uuid7 primary keys. Inserts --rows rows per run '
+        'in --batch-size transactions and deletes them afterwards. Run it against PostgreSQL with more rows '
+        'than fit in shared_buffers to see the index locality difference.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=200000)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--rounds', type=int, default=3)
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        user = User.objects.create(username=f'uuid-bench-{tag}', email=f'uuid-bench-{tag}@bench.local', phone_number='+237650000000')
+        house = House.objects.create(house_name=f'UUID bench {tag}', room_type='single', price=Decimal('100.00'), lat=4.0, lng=9.7)
+        results = {name: [] for name in GENERATORS}
+        index_growth = {name: [] for name in GENERATORS}
+        try:
+            for round_number in range(options['rounds']):
+                # Alternate the order so neither generator always runs on a
+                # warmer cache.
+                names = list(GENERATORS) if round_number % 2 == 0 else list(reversed(GENERATORS))
+                for name in names:
+                    before = self.pk_index_size()
+                    elapsed = self.insert(GENERATORS[name], user, house, options['rows'], options['batch_size'])
+                    after = self.pk_index_size()
+                    results[name].append(options['rows'] / elapsed)
+                    if before is not None:
+                        index_growth[name].append(after - before)
+                    self.stdout.write(f'round {round_number + 1} {name}: {options["rows"] / elapsed:,.0f} rows/s')
+                    Transaction.objects.filter(user=user).delete()
+        finally:
+            house.delete()
+            user.delete()
+
+        for name, rates in results.items():
+            line = f'{name}: median {statistics.median(rates):,.0f} rows/s over {len(rates)} runs'
+            if index_growth[name]:
+                line += f', primary key index grew {statistics.median(index_growth[name]) / (1024 * 1024):.1f} MB per run'
+            self.stdout.write(line)
+        speedup = statistics.median(results['uuid7']) / statistics.median(results['uuid4'])
+        self.stdout.write(self.style.SUCCESS(f'uuid7 / uuid4 throughput: {speedup:.2f}x'))
+
+    def insert(self, generator, user, house, rows, batch_size):
+        start = time.perf_counter()
+        for offset in range(0, rows, batch_size):
+            with transaction.atomic():
+                Transaction.objects.bulk_create([
+                    Transaction(
+                        transaction_id=generator(), user=user, house=house, amount_paid=Decimal('100.00'),
+                        transaction_type='tour', payment_status='SUCCESSFUL',
+                    )
+                    for _ in range(min(batch_size, rows - offset))
+                ])
+        return time.perf_counter() - start
+
+    def pk_index_size(self):
+        # Bytes in the transaction primary key index, PostgreSQL only.
+        if connection.vendor != 'postgresql':
+            return None
+        table = Transaction._meta.db_table
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, table)
+            name = next(name for name, info in constraints.items() if info['primary_key'])
+            cursor.execute('SELECT pg_relation_size(%s::regclass)', [connection.ops.quote_name(name)])
+            return cursor.fetchone()[0]
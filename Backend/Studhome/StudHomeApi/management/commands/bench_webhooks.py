@@ -0,0 +1,82 @@
+import threading
+import time
+import uuid
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from StudHomeApi.models import House, Transaction, User, WebhookEvent
+from StudHomeApi.webhooks import WebhookProcessor, sign_webhook_payload
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark webhook ingestion (signed POSTs to the webhook view, including duplicate deliveries) '
+        'and inbox processing. Creates its own data and deletes it afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=5000)
+        parser.add_argument('--senders', type=int, default=8, help='Concurrent webhook senders.')
+        parser.add_argument('--workers', type=int, default=4, help='Processing worker threads.')
+        parser.add_argument('--duplicates', type=float, default=0.2, help='Share of webhooks delivered twice.')
+        parser.add_argument('--key', default='bench-webhook-key', help='Signing key used for the run.')
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        user = User.objects.create_user(f'webhook-{tag}', f'webhook-{tag}@bench.local', None, phone_number='+237650000000')
+        house = House.objects.create(house_name=f'Webhook {tag}', room_type='single', price=Decimal('100.00'), lat=4.0, lng=9.7)
+        references = [f'bench-{tag}-{i}' for i in range(options['events'])]
+        Transaction.objects.bulk_create([
+            Transaction(user=user, house=house, amount_paid=Decimal('100.00'), transaction_type='tour', payment_reference=reference, payment_status='PENDING')
+            for reference in references
+        ], batch_size=1000)
+        deliveries = references + references[:int(len(references) * options['duplicates'])]
+
+        try:
+            with override_settings(CAMPAY_WEBHOOK_KEY=options['key'], EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', ALLOWED_HOSTS=['localhost']):
+                payloads = [sign_webhook_payload({'reference': reference, 'status': 'SUCCESSFUL'}) for reference in deliveries]
+                elapsed, failures = self.ingest(payloads, options['senders'])
+                stored = WebhookEvent.objects.filter(reference__in=references).count()
+                self.stdout.write(
+                    f'Ingest: {len(payloads)} webhooks in {elapsed:.2f}s ({len(payloads) / elapsed:,.0f}/s) '
+                    f'with {options["senders"]} senders, {failures} failed, {stored} stored after de-duplication'
+                )
+
+                processor = WebhookProcessor(workers=options['workers'])
+                start = time.perf_counter()
+                processor.run_once()
+                elapsed = time.perf_counter() - start
+                successful = Transaction.objects.filter(payment_reference__in=references, payment_status='SUCCESSFUL').count()
+                self.stdout.write(
+                    f'Process: {processor.processed} events in {elapsed:.2f}s ({processor.processed / elapsed:,.0f}/s) '
+                    f'with {options["workers"]} workers, {successful}/{len(references)} transactions settled'
+                )
+        finally:
+            WebhookEvent.objects.filter(reference__in=references).delete()
+            house.delete()
+            user.delete()
+
+    def ingest(self, payloads, senders):
+        url = reverse('payment_webhook')
+        failures = []
+        chunks = [payloads[i::senders] for i in range(senders)]
+
+        def send(chunk):
+            client = Client(SERVER_NAME='localhost', raise_request_exception=False)
+            try:
+                for payload in chunk:
+                    if client.post(url, payload, content_type='application/json').status_code != 200:
+                        failures.append(payload['reference'])
+            finally:
+                close_old_connections()
+
+        threads = [threading.Thread(target=send, args=(chunk,)) for chunk in chunks]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - start, len(failures)
@@ -0,0 +1,50 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from StudHomeApi.models import House, HouseCard, SavedHome, SimilarHouse
+from StudHomeApi.recommendations import build_neighbours
+
+
+class Command(BaseCommand):
+    help = 'Precompute the top-K similar houses for every listed house.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--k', type=int, default=10)
+        parser.add_argument('--block-size', type=int, default=512)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        try:
+            import numpy as np
+        except ImportError:
+            raise CommandError('build_similar_houses requires numpy (pip install numpy).')
+        houses = list(
+            HouseCard.objects.filter(remove=False).order_by('house_id')
+            .values_list('house_id', 'price', 'room_type', 'lat', 'lng')
+        )
+        saves = SavedHome.objects.filter(house__card__remove=False).values_list('user_id', 'house_id')
+        room_choices = [value for value, _ in House.ROOM_TYPES]
+        house_ids, neighbours, scores, elapsed = build_neighbours(
+            np, houses, saves.iterator(chunk_size=5000), room_choices, options['k'], options['block_size']
+        )
+        self.stdout.write(f'Computed neighbours for {len(house_ids)} houses in {elapsed:.2f}s')
+
+        started = time.perf_counter()
+        rows = (
+            SimilarHouse(house_id=house_ids[i], neighbour_id=house_ids[j], rank=rank, score=float(scores[i, rank]))
+            for i in range(len(house_ids))
+            for rank, j in enumerate(neighbours[i])
+            if j >= 0
+        )
+        with transaction.atomic():
+            SimilarHouse.objects.all().delete()
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= options['batch_size']:
+                    SimilarHouse.objects.bulk_create(batch)
+                    batch = []
+            SimilarHouse.objects.bulk_create(batch)
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored {int((neighbours >= 0).sum())} neighbour rows in {time.perf_counter() - started:.2f}s'
+        ))
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from StudHomeApi.history import ensure_partitions, is_partitioned
+
+
+class Command(BaseCommand):
+    help = 'Create monthly transaction partitions ahead of time (PostgreSQL). Run it daily or at least monthly.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int, default=settings.TRANSACTION_PARTITIONS_AHEAD)
+
+    def handle(self, *args, **options):
+        if not is_partitioned():
+            self.stdout.write('The transaction table is not partitioned on this database, nothing to do.')
+            return
+        created = ensure_partitions(options['months_ahead'])
+        for name in created:
+            self.stdout.write(f'Created {name}')
+        self.stdout.write(self.style.SUCCESS(f'Created {len(created)} partitions.'))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from StudHomeApi.models import Reservation
+
+
+class Command(BaseCommand):
+    help = 'Deactivate expired reservations and free their houses.'
+
+    def handle(self, *args, **options):
+        released = Reservation.objects.release_expired()
+        self.stdout.write(self.style.SUCCESS(f'Released {released} expired reservations.'))
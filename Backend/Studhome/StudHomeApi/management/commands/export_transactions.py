@@ -0,0 +1,28 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from StudHomeApi.exports import EXPORT_FORMATS, ExportFilterError, parse_export_bound, stream_transactions
+
+
+class Command(BaseCommand):
+    help = 'Stream transactions joined to their user and house as NDJSON or CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', dest='file_format', choices=sorted(EXPORT_FORMATS), default='ndjson')
+        parser.add_argument('--start', help='Earliest payment date (inclusive), YYYY-MM-DD or ISO 8601.')
+        parser.add_argument('--end', help='Latest payment date (inclusive for dates), YYYY-MM-DD or ISO 8601.')
+        parser.add_argument('--status', action='append', default=[], help='Payment status to include; repeat for several.')
+        parser.add_argument('--output', '-o', help='File to write to. Defaults to stdout.')
+
+    def handle(self, *args, **options):
+        try:
+            start = parse_export_bound(options['start'])
+            end = parse_export_bound(options['end'], end=True)
+        except ExportFilterError as e:
+            raise CommandError(str(e))
+        chunks = stream_transactions(options['file_format'], start, end, options['status'])
+        if options['output']:
+            with open(options['output'], 'wb') as output:
+                output.writelines(chunks)
+        else:
+            sys.stdout.buffer.writelines(chunks)
+            sys.stdout.flush()
@@ -0,0 +1,30 @@
+import time
+from django.core.management.base import BaseCommand
+from StudHomeApi.clusters import fold_changes
+
+
+class Command(BaseCommand):
+    help = (
+        'Apply the house changes queued for the precomputed map clusters. Run it with --loop alongside '
+        'the web workers, or every minute from cron; the coarse map zooms lag behind by that much.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new changes.')
+        parser.add_argument('--poll', type=float, default=1.0, help='Seconds to sleep when the queue is empty.')
+
+    def handle(self, *args, **options):
+        folded = 0
+        try:
+            while True:
+                batch = fold_changes(options['batch_size'])
+                folded += batch
+                if batch:
+                    continue
+                if not options['loop']:
+                    break
+                time.sleep(options['poll'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'Folded {folded} map cluster changes'))
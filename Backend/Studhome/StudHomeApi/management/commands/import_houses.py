@@ -0,0 +1,34 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+from StudHomeApi.importer import detect_format, import_houses
+
+
+class Command(BaseCommand):
+    help = 'Bulk import houses from a CSV or JSON-lines file. Media is queued for process_media_uploads.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', dest='file_format', choices=['csv', 'jsonl'])
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--checkpoint', help='Checkpoint name. Defaults to the absolute path of the file.')
+        parser.add_argument('--resume', action='store_true', help='Skip rows committed by a previous run.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        checkpoint = options['checkpoint'] or os.path.abspath(path)
+        try:
+            with open(path, encoding='utf-8-sig', newline='') as stream:
+                report = import_houses(
+                    stream,
+                    options['file_format'] or detect_format(path),
+                    batch_size=options['batch_size'],
+                    checkpoint=checkpoint,
+                    resume=options['resume'],
+                )
+        except OSError as e:
+            raise CommandError(str(e))
+        for line_no, messages in report.errors:
+            self.stderr.write(f'line {line_no}: {messages}')
+        if report.skipped:
+            self.stdout.write(f'Skipped {report.skipped} rows already imported according to checkpoint {checkpoint}.')
+        self.stdout.write(self.style.SUCCESS(report.summary()))
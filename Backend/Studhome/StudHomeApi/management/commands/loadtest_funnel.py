@@ -0,0 +1,97 @@
+import threading
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from StudHomeApi.clients import get_media_store, get_payment_gateway
+from StudHomeApi.loadtest import DATASET_PREFIX, FUNNEL_STEPS, Funnel, HttpClient, InProcessClient, delete_dataset, new_run_tag, seed_houses
+from StudHomeApi.models import House
+from StudHomeApi.webhooks import WebhookProcessor
+
+
+class Command(BaseCommand):
+    help = (
+        'Replay the booking funnel (register, token, list, detail, save, initiate payment, webhook, verify, '
+        'reservations) with concurrent virtual students and report throughput, latency percentiles and '
+        'error rates per step. Runs in process against the fake backends, or against a running server with '
+        '--base-url (start it with OFFLINE_BACKENDS=True FAKE_PAYMENT_WEBHOOK_DELAY=-1). Houses are seeded and '
+        'deleted through this process\'s database connection, so that server must use the same database. '
+        'Cleanup only removes the users and houses of this run.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200, help='Virtual students, each runs the funnel once.')
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--houses', type=int, default=1000, help='Houses to seed before the run.')
+        parser.add_argument('--reuse-data', action='store_true', help='Use houses seeded by an earlier run instead of seeding.')
+        parser.add_argument('--keep-data', action='store_true', help='Do not delete the load test users and houses afterwards.')
+        parser.add_argument('--reserve-ratio', type=float, default=0.2, help='Share of payments that reserve instead of booking a tour.')
+        parser.add_argument('--think-time', type=float, default=0.0, help='Random pause of up to this many seconds between steps.')
+        parser.add_argument('--latency', type=float, default=0.0, help='Fake gateway, media and mail latency in seconds (in process only).')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Fake backend error rate (in process only).')
+        parser.add_argument('--base-url', help='Target a running server sharing this database, e.g. http://127.0.0.1:8000.')
+        parser.add_argument('--webhook-key', help='Key to sign webhooks with. Defaults to CAMPAY_WEBHOOK_KEY.')
+        parser.add_argument('--webhook-workers', type=int, default=4, help='In process: webhook inbox worker threads running alongside the funnel.')
+
+    def handle(self, *args, **options):
+        run_tag = new_run_tag()
+        if options['reuse_data']:
+            house_ids = [str(pk) for pk in House.objects.filter(house_name__startswith=DATASET_PREFIX, remove=False).values_list('house_id', flat=True)]
+            if not house_ids:
+                raise CommandError('No load test houses to reuse, run without --reuse-data first')
+        else:
+            house_ids = seed_houses(options['houses'], run_tag)
+        self.stdout.write(f"Run {run_tag}: {len(house_ids)} houses, {options['users']} students, concurrency {options['concurrency']}")
+
+        if options['base_url']:
+            funnel = Funnel(lambda: HttpClient(options['base_url']), house_ids, options['reserve_ratio'], options['webhook_key'], options['think_time'], run_tag)
+            elapsed = funnel.run(options['users'], options['concurrency'])
+        else:
+            with override_settings(
+                PAYMENT_GATEWAY='StudHomeApi.backends.FakePaymentGateway',
+                MEDIA_STORE='StudHomeApi.backends.FakeMediaStore',
+                EMAIL_BACKEND='StudHomeApi.backends.FakeEmailBackend',
+                FAKE_PAYMENT_WEBHOOK_DELAY=-1,
+                FAKE_PAYMENT_SETTLE_AFTER=0,
+                FAKE_PAYMENT_OUTCOME='SUCCESSFUL',
+                FAKE_BACKEND_LATENCY=options['latency'],
+                FAKE_BACKEND_ERROR_RATE=options['error_rate'],
+                ALLOWED_HOSTS=['localhost'],
+            ):
+                get_payment_gateway.cache_clear()
+                get_media_store.cache_clear()
+                stop = threading.Event()
+                processor = WebhookProcessor(workers=options['webhook_workers'])
+                worker = threading.Thread(target=processor.run_forever, kwargs={'poll': 0.1, 'stop': stop}, daemon=True)
+                worker.start()
+                try:
+                    funnel = Funnel(InProcessClient, house_ids, options['reserve_ratio'], options['webhook_key'], options['think_time'], run_tag)
+                    elapsed = funnel.run(options['users'], options['concurrency'])
+                finally:
+                    stop.set()
+                    worker.join()
+                    get_payment_gateway.cache_clear()
+                    get_media_store.cache_clear()
+                self.stdout.write(f'Webhook inbox: {processor.processed} events applied, {processor.deferred} deferred')
+
+        self.report(funnel, elapsed, options['users'])
+        if not options['keep_data']:
+            users, houses = delete_dataset(run_tag)
+            self.stdout.write(f'Deleted {users} load test users and {houses} houses')
+
+    def report(self, funnel, elapsed, users):
+        self.stdout.write(
+            f'{funnel.completed}/{users} students completed the funnel in {elapsed:.2f}s '
+            f'({funnel.completed / elapsed:,.1f} funnels/s)'
+        )
+        self.stdout.write(f"{'step':<14}{'requests':>9}{'req/s':>9}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}{'errors':>8}  statuses")
+        for name in FUNNEL_STEPS:
+            stats = funnel.stats[name]
+            count = len(stats.latencies)
+            if not count:
+                self.stdout.write(f'{name:<14}{0:>9}')
+                continue
+            statuses = ', '.join(f'{status}: {n}' for status, n in sorted(stats.statuses.items(), key=lambda item: str(item[0])))
+            self.stdout.write(
+                f'{name:<14}{count:>9}{count / elapsed:>9.1f}'
+                f'{stats.percentile(50) * 1000:>9.1f}{stats.percentile(90) * 1000:>9.1f}{stats.percentile(99) * 1000:>9.1f}'
+                f'{max(stats.latencies) * 1000:>9.1f}{stats.errors / count:>8.1%}  {statuses}'
+            )
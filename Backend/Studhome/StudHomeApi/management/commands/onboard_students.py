@@ -0,0 +1,34 @@
+import csv
+from django.core.management.base import BaseCommand, CommandError
+from StudHomeApi.onboarding import onboard_users, read_roster_csv
+
+
+class Command(BaseCommand):
+    help = 'Create user accounts in bulk from a CSV roster (username, email, phone_number, password).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--results', help='Write per-row results to this CSV file.')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as stream:
+                rows = read_roster_csv(stream)
+        except OSError as e:
+            raise CommandError(str(e))
+        report = onboard_users(rows, batch_size=options['batch_size'])
+        if options['results']:
+            with open(options['results'], 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['row', 'username', 'status', 'user_id', 'errors'])
+                for result in report['results']:
+                    writer.writerow([result['row'], result['username'], result['status'], result.get('user_id', ''), result.get('errors', '')])
+        else:
+            for result in report['results']:
+                if result['status'] == 'error':
+                    self.stderr.write(f"row {result['row']} ({result['username']}): {result['errors']}")
+        rate = report['created'] / report['elapsed_seconds'] if report['elapsed_seconds'] else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {report['created']} users, {report['failed']} failed in {report['elapsed_seconds']}s ({rate:,.0f} users/s)"
+        ))
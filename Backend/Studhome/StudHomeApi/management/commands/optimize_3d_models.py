@@ -0,0 +1,43 @@
+import subprocess
+from django.core.management.base import BaseCommand, CommandError
+from StudHomeApi.model_lods import OptimizerUnavailable, find_tool, models_needing_lods, optimize_model
+
+
+class Command(BaseCommand):
+    help = 'Generate simplified, compressed LOD variants of house 3D models with gltf-transform or gltfpack.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--house', action='append', dest='houses', help='Only this house id (repeatable)')
+        parser.add_argument('--tool', choices=['auto', 'gltf-transform', 'gltfpack'], help='Defaults to MODEL_OPTIMIZER_TOOL')
+        parser.add_argument('--force', action='store_true', help='Rebuild variants that already exist')
+        parser.add_argument('--limit', type=int, default=None)
+
+    def handle(self, *args, **options):
+        try:
+            tool, executable = find_tool(options['tool'])
+        except OptimizerUnavailable as e:
+            raise CommandError(str(e))
+        self.stdout.write(f'Using {tool} ({executable})')
+
+        optimized = failed = 0
+        for house_id, item in models_needing_lods(options['force'], options['houses']):
+            if options['limit'] is not None and optimized + failed >= options['limit']:
+                break
+            try:
+                variants = optimize_model(house_id, item, tool, executable)
+            except subprocess.CalledProcessError as e:
+                failed += 1
+                detail = (e.stderr or b'').decode(errors='replace').strip().splitlines()[-1:] or [f'exit status {e.returncode}']
+                self.stderr.write(f'{house_id}: {tool} failed: {detail[0]}')
+                continue
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f'{house_id}: {e}')
+                continue
+            if variants is None:
+                continue
+            optimized += 1
+            summary = ', '.join(f"{v['lod']} {v['metadata']['triangles']} tris / {v['metadata']['size']} B" for v in variants) or 'no smaller variant'
+            self.stdout.write(f'{house_id}: {summary}')
+
+        self.stdout.write(self.style.SUCCESS(f'Optimized {optimized} models, {failed} failed.'))
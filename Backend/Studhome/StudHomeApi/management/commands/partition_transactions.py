@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from StudHomeApi.history import is_partitioned, partition_transaction_table, transaction_partitions, unpartition_transaction_table
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the transaction table as a monthly range-partitioned table (PostgreSQL), or back into a plain '
+        'table with --undo. Every row is copied under an exclusive lock, so run it in a maintenance window. '
+        'Partitioning changes the primary key to (transaction_id, payment_date): PostgreSQL can no longer '
+        'enforce transaction_id unique on its own.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int, default=settings.TRANSACTION_PARTITIONS_AHEAD)
+        parser.add_argument('--undo', action='store_true', help='Turn the partitioned table back into a plain one')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Transaction partitioning needs PostgreSQL.')
+        if options['undo']:
+            if not is_partitioned():
+                raise CommandError('The transaction table is not partitioned.')
+            unpartition_transaction_table()
+            self.stdout.write(self.style.SUCCESS('The transaction table is a plain table again.'))
+            return
+        if is_partitioned():
+            raise CommandError('The transaction table is already partitioned, use create_partitions to add months.')
+        partition_transaction_table(options['months_ahead'])
+        self.stdout.write(self.style.SUCCESS(f'Partitioned the transaction table into {len(transaction_partitions())} monthly partitions.'))
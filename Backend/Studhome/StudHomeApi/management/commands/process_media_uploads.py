@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from StudHomeApi.models import PendingMediaUpload
+from StudHomeApi.importer import claimable, upload_pending_media
+
+
+class Command(BaseCommand):
+    help = 'Upload media queued by the bulk house import.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=200)
+
+    def handle(self, *args, **options):
+        upload_ids = list(
+            PendingMediaUpload.objects.filter(claimable()).values_list('upload_id', flat=True)[:options['limit']]
+        )
+        uploaded, failed = upload_pending_media(upload_ids)
+        self.stdout.write(self.style.SUCCESS(f'Uploaded {uploaded} media files, {failed} failed.'))
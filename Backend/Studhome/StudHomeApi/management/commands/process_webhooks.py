@@ -0,0 +1,31 @@
+import logging
+from django.core.management.base import BaseCommand
+from StudHomeApi.webhooks import WebhookProcessor
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        'Apply stored payment webhooks. Events are spread over worker threads by reference so each '
+        'reference is processed in arrival order. Run one instance per database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, help='Defaults to WEBHOOK_WORKERS.')
+        parser.add_argument('--batch-size', type=int, help='Defaults to WEBHOOK_BATCH_SIZE.')
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new events.')
+        parser.add_argument('--poll', type=float, default=1.0, help='Seconds to sleep when the inbox is empty.')
+
+    def handle(self, *args, **options):
+        processor = WebhookProcessor(workers=options['workers'], batch_size=options['batch_size'])
+        if options['loop']:
+            try:
+                processor.run_forever(poll=options['poll'])
+            except KeyboardInterrupt:
+                pass
+        else:
+            processor.run_once()
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {processor.processed} webhook events, {processor.deferred} deferred for retry'
+        ))
@@ -0,0 +1,14 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from StudHomeApi.models import HouseTombstone
+
+
+class Command(BaseCommand):
+    help = 'Delete house tombstones older than HOUSE_TOMBSTONE_RETENTION_DAYS. Sync tokens that old are rejected anyway.'
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=settings.HOUSE_TOMBSTONE_RETENTION_DAYS)
+        deleted, _ = HouseTombstone.objects.filter(deleted_at__lt=cutoff).delete()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} house tombstones'))
@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from StudHomeApi.model_uploads import prune_stale_uploads
+
+
+class Command(BaseCommand):
+    help = 'Delete unfinished 3D model uploads and their staged files after MODEL_UPLOAD_EXPIRY_HOURS without activity.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=float, default=settings.MODEL_UPLOAD_EXPIRY_HOURS)
+
+    def handle(self, *args, **options):
+        pruned = prune_stale_uploads(options['hours'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {pruned} stale model uploads'))
@@ -0,0 +1,19 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from StudHomeApi.models import House, HouseCard
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the denormalized HouseCard rows used by the house list.'
+
+    def handle(self, *args, **options):
+        count = 0
+        with transaction.atomic():
+            for house in House.objects.iterator(chunk_size=500):
+                HouseCard.refresh(house)
+                count += 1
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} house cards.'))
+        # Saved counts go through the sharded counters, otherwise the next
+        # save's fold would put the drifted shard total back.
+        call_command('reconcile_save_counts', full=True, stdout=self.stdout)
@@ -0,0 +1,15 @@
+import time
+from django.core.management.base import BaseCommand
+from StudHomeApi.clusters import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recompute the precomputed map clusters from HouseCard. Run after migrating and to repair drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--zoom', type=int, action='append', help='Only rebuild these zoom levels.')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        created = rebuild(options['zoom'])
+        self.stdout.write(self.style.SUCCESS(f'Built {created} map clusters in {time.perf_counter() - start:.2f}s'))
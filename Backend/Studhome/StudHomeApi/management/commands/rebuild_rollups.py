@@ -0,0 +1,43 @@
+import datetime
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from StudHomeApi.models import Reservation, Transaction
+from StudHomeApi.rollups import rebuild_floor, rebuild_occupancy, rebuild_revenue
+
+KINDS = {
+    # kind: (archive kind, source model, date field, rebuild function)
+    'revenue': ('transaction', Transaction, 'payment_date', rebuild_revenue),
+    'occupancy': ('reservation', Reservation, 'reservation_date', rebuild_occupancy),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Recount the daily revenue and occupancy rollups from transactions and reservations, e.g. after a '
+        'deploy or data fix. Days whose rows were moved out by archive_history are left as they are. '
+        'Payments settling while it runs can be missed for their day, so run it off-peak.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=datetime.date.fromisoformat, help='First day (YYYY-MM-DD), default the oldest row')
+        parser.add_argument('--until', type=datetime.date.fromisoformat, help='Last day (YYYY-MM-DD), default today')
+        parser.add_argument('--kind', action='append', choices=list(KINDS), dest='kinds')
+
+    def handle(self, *args, **options):
+        until = options['until'] or timezone.localdate()
+        for kind in options['kinds'] or list(KINDS):
+            archive_kind, model, date_field, rebuild = KINDS[kind]
+            since = options['since']
+            if since is None:
+                oldest = model.objects.order_by(date_field).values_list(date_field, flat=True).first()
+                since = timezone.localdate(oldest) if oldest else until
+            floor = rebuild_floor(archive_kind)
+            if floor is not None and since < floor:
+                self.stdout.write(self.style.WARNING(f'{kind}: rows before {floor} are archived, keeping the rollups before it'))
+                since = floor
+            if since > until:
+                if options['since']:
+                    raise CommandError(f'{kind}: nothing to rebuild between {since} and {until}')
+                continue
+            rows = rebuild(since, until)
+            self.stdout.write(self.style.SUCCESS(f'{kind}: rebuilt {since} to {until}, {rows} rollup rows.'))
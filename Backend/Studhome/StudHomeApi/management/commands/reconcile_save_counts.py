@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from StudHomeApi.models import HouseCard, HouseSaveCounter, SavedHome
+
+
+class Command(BaseCommand):
+    help = (
+        'Fold sharded saved-home counters into HouseCard.saved_count. Saves fold their own house as they '
+        'commit, so this is a repair tool. With --full, recount from SavedHome first and repair drifted shards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true')
+
+    def handle(self, *args, **options):
+        totals = HouseSaveCounter.totals()
+        repaired = 0
+        if options['full']:
+            actual = dict(
+                SavedHome.objects.values('house_id').annotate(total=Count('pk')).values_list('house_id', 'total')
+            )
+            for house_id in set(actual) | set(totals):
+                expected = actual.get(house_id, 0)
+                if totals.get(house_id, 0) != expected:
+                    with transaction.atomic():
+                        HouseSaveCounter.objects.filter(house_id=house_id).delete()
+                        if expected:
+                            HouseSaveCounter.objects.create(house_id=house_id, shard=0, count=expected)
+                    repaired += 1
+            totals = actual
+        updated = 0
+        cards = HouseCard.objects.values_list('house_id', 'saved_count')
+        for house_id, saved_count in cards.iterator(chunk_size=2000):
+            total = max(totals.get(house_id, 0), 0)
+            if saved_count != total:
+                HouseCard.objects.filter(house_id=house_id).update(saved_count=total)
+                updated += 1
+        self.stdout.write(self.style.SUCCESS(f'Updated {updated} house cards, repaired {repaired} counters.'))
@@ -0,0 +1,27 @@
+import time
+from django.core.management.base import BaseCommand
+from StudHomeApi.alerts import send_pending_alerts
+
+
+class Command(BaseCommand):
+    help = 'Email queued saved-search matches, one message per student per batch.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Defaults to SEARCH_ALERT_BATCH_SIZE.')
+        parser.add_argument('--loop', action='store_true', help='Keep polling the queue.')
+        parser.add_argument('--poll', type=float, default=60.0)
+
+    def handle(self, *args, **options):
+        total_alerts = total_emails = 0
+        try:
+            while True:
+                alerts, emails = send_pending_alerts(options['batch_size'])
+                total_alerts += alerts
+                total_emails += emails
+                if not alerts:
+                    if not options['loop']:
+                        break
+                    time.sleep(options['poll'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'Sent {total_emails} emails covering {total_alerts} alerts'))
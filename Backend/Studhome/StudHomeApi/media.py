@@ -0,0 +1,70 @@
+import hashlib
+from urllib.parse import urlsplit
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+from .clients import get_media_store
+from .models import MediaAsset
+
+# Content-addressed uploads: files are hashed chunk by chunk and uploaded
+# only if the same bytes (for the same resource type) haven't been before.
+
+
+def hash_file(file):
+    # Returns (sha256 hex digest, size) and rewinds the file for upload.
+    digest = hashlib.sha256()
+    size = 0
+    if hasattr(file, 'seek'):
+        file.seek(0)
+    chunks = file.chunks() if hasattr(file, 'chunks') else iter(lambda: file.read(64 * 1024), b'')
+    for chunk in chunks:
+        digest.update(chunk)
+        size += len(chunk)
+    if hasattr(file, 'seek'):
+        file.seek(0)
+    return digest.hexdigest(), size
+
+
+def upload_deduplicated(file, resource_type='image', large=False):
+    # file is an UploadedFile/file object or a URL; local paths aren't
+    # accepted, callers open the files they trust. Returns (url, reused).
+    # Remote URLs can't be hashed without downloading them and are always
+    # passed through. large sends the file in chunks.
+    store = get_media_store()
+    upload = store.upload_large if large else store.upload
+    if isinstance(file, str):
+        if urlsplit(file).scheme not in ('http', 'https'):
+            raise ValueError(f"'{file}' is not an http(s) URL")
+        return upload(file, resource_type=resource_type)['secure_url'], False
+
+    sha256, size = hash_file(file)
+    if MediaAsset.objects.filter(sha256=sha256, resource_type=resource_type).update(
+        hit_count=F('hit_count') + 1, last_used_at=timezone.now(),
+    ):
+        return MediaAsset.objects.values_list('url', flat=True).get(sha256=sha256, resource_type=resource_type), True
+
+    url = upload(file, resource_type=resource_type)['secure_url']
+    # A concurrent upload of the same bytes may have won; keep its URL.
+    MediaAsset.objects.bulk_create(
+        [MediaAsset(sha256=sha256, resource_type=resource_type, url=url, size=size)],
+        ignore_conflicts=True,
+    )
+    return url, False
+
+
+def media_stats():
+    totals = MediaAsset.objects.aggregate(
+        assets=Count('asset_id'),
+        hits=Sum('hit_count'),
+        stored_bytes=Sum('size'),
+        saved_bytes=Sum(F('hit_count') * F('size')),
+    )
+    hits = totals['hits'] or 0
+    uploads = totals['assets']
+    return {
+        'assets': uploads,
+        'hits': hits,
+        'misses': uploads,
+        'hit_rate': round(hits / (hits + uploads), 4) if hits + uploads else 0.0,
+        'stored_bytes': totals['stored_bytes'] or 0,
+        'saved_bytes': totals['saved_bytes'] or 0,
+    }
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_house_cards(apps, schema_editor):
+    House = apps.get_model('StudHomeApi', 'House')
+    HouseCard = apps.get_model('StudHomeApi', 'HouseCard')
+    Reservation = apps.get_model('StudHomeApi', 'Reservation')
+    SavedHome = apps.get_model('StudHomeApi', 'SavedHome')
+    reserved = set(Reservation.objects.filter(is_active=True).values_list('house_id', flat=True))
+    saved_counts = dict(
+        SavedHome.objects.values('house_id').annotate(total=models.Count('pk')).values_list('house_id', 'total')
+    )
+    cards = []
+    for house in House.objects.iterator(chunk_size=500):
+        cover_url = next(
+            (item['file_url'] for item in house.media or [] if item.get('media_type') == 'image' and item.get('file_url')),
+            '',
+        )
+        cards.append(HouseCard(
+            house_id=house.house_id,
+            house_name=house.house_name,
+            room_type=house.room_type,
+            price=house.price,
+            lat=house.lat,
+            lng=house.lng,
+            cover_url=cover_url,
+            is_reserved=house.is_reserved or house.house_id in reserved,
+            saved_count=saved_counts.get(house.house_id, 0),
+            remove=house.remove,
+            date_added=house.date_added,
+        ))
+    HouseCard.objects.bulk_create(cards, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('StudHomeApi', '0004_house_remove_transaction_payment_reference_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HouseCard',
+            fields=[
+                ('house', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='card', serialize=False, to='StudHomeApi.house')),
+                ('house_name', models.CharField(max_length=50)),
+                ('room_type', models.CharField(choices=[('single', 'Single Room'), ('double', 'Double Room'), ('apartment', 'Apartment')], max_length=20)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('lat', models.FloatField()),
+                ('lng', models.FloatField()),
+                ('cover_url', models.URLField(blank=True, default='', max_length=500)),
+                ('is_reserved', models.BooleanField(default=False)),
+                ('saved_count', models.PositiveIntegerField(default=0)),
+                ('remove', models.BooleanField(default=False)),
+                ('date_added', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['date_added'],
+                'indexes': [models.Index(fields=['remove', 'room_type', 'date_added'], name='StudHomeApi_remove_84ef3d_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_house_cards, migrations.RunPython.noop),
+    ]
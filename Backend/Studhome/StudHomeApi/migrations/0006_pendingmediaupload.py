@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:26
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('StudHomeApi', '0005_housecard'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingMediaUpload',
+            fields=[
+                ('upload_id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('source', models.CharField(max_length=500)),
+                ('media_type', models.CharField(choices=[('image', 'Image'), ('3d_model', '3D Model')], max_length=20)),
+                ('caption', models.CharField(blank=True, default='', max_length=255)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('UPLOADED', 'Uploaded'), ('FAILED', 'Failed')], default='PENDING', max_length=20)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('uploaded_at', models.DateTimeField(blank=True, null=True)),
+                ('house', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pending_media', to='StudHomeApi.house')),
+            ],
+            options={
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='StudHomeApi_status_9bc23f_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('StudHomeApi', '0006_pendingmediaupload'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='house',
+            index=models.Index(fields=['room_type', 'date_added'], name='StudHomeApi_room_ty_7f20f9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['is_active', 'reservation_date'], name='StudHomeApi_is_acti_256bc4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['transaction_type', 'payment_date'], name='StudHomeApi_transac_be7ae5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['payment_status', 'payment_date'], name='StudHomeApi_payment_24f488_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:28
+
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef
+
+
+def deactivate_duplicate_reservations(apps, schema_editor):
+    # Keep only the most recent active reservation per house so the
+    # constraint can be created on existing data.
+    Reservation = apps.get_model('StudHomeApi', 'Reservation')
+    seen = set()
+    stale = []
+    active = Reservation.objects.filter(is_active=True).order_by('house_id', '-reservation_date')
+    for reservation_id, house_id in active.values_list('reservation_id', 'house_id').iterator():
+        if house_id in seen:
+            stale.append(reservation_id)
+        seen.add(house_id)
+    for start in range(0, len(stale), 500):
+        Reservation.objects.filter(reservation_id__in=stale[start:start + 500]).update(is_active=False)
+
+
+def sync_reserved_flags(apps, schema_editor):
+    # House.is_reserved (and the card copy) follows the active reservations;
+    # older data can have the flag set with nothing holding the house.
+    House = apps.get_model('StudHomeApi', 'House')
+    HouseCard = apps.get_model('StudHomeApi', 'HouseCard')
+    Reservation = apps.get_model('StudHomeApi', 'Reservation')
+    active = Reservation.objects.filter(house_id=OuterRef('house_id'), is_active=True)
+    House.objects.update(is_reserved=Exists(active))
+    HouseCard.objects.update(is_reserved=Exists(active))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('StudHomeApi', '0007_admin_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(deactivate_duplicate_reservations, migrations.RunPython.noop),
+        migrations.RunPython(sync_reserved_flags, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='reservation',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_active', True)), fields=('house',), name='unique_active_reservation_per_house'),
+        ),
+    ]
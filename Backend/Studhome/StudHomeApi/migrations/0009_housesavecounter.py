@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def seed_save_counters(apps, schema_editor):
+    SavedHome = apps.get_model('StudHomeApi', 'SavedHome')
+    HouseSaveCounter = apps.get_model('StudHomeApi', 'HouseSaveCounter')
+    totals = SavedHome.objects.values('house_id').annotate(total=models.Count('pk')).values_list('house_id', 'total')
+    HouseSaveCounter.objects.bulk_create(
+        [HouseSaveCounter(house_id=house_id, shard=0, count=total) for house_id, total in totals],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('StudHomeApi', '0008_unique_active_reservation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HouseSaveCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='housecard',
+            index=models.Index(fields=['remove', '-saved_count', 'date_added'], name='StudHomeApi_remove_e382f0_idx'),
+        ),
+        migrations.AddField(
+            model_name='housesavecounter',
+            name='house',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='save_counters', to='StudHomeApi.house'),
+        ),
+        migrations.AddConstraint(
+            model_name='housesavecounter',
+            constraint=models.UniqueConstraint(fields=('house', 'shard'), name='unique_save_counter_shard'),
+        ),
+        migrations.RunPython(seed_save_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('StudHomeApi', '0009_housesavecounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarHouse',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+                ('house', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_houses', to='StudHomeApi.house')),
+                ('neighbour', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbour_of', to='StudHomeApi.house')),
+            ],
+            options={
+                'ordering': ['house', 'rank'],
+                'constraints': [models.UniqueConstraint(fields=('house', 'rank'), name='unique_similar_house_rank')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:45
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('StudHomeApi', '0010_similarhouse'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebhookEvent',
+            fields=[
+                ('event_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('reference', models.CharField(max_length=100)),
+                ('status', models.CharField(max_length=20)),
+                ('payload', models.JSONField(default=dict)),
+                ('state', models.CharField(choices=[('PENDING', 'Pending'), ('PROCESSED', 'Processed'), ('FAILED', 'Failed')], default='PENDING', max_length=20)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('error', models.TextField(blank=True, default='')),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['event_id'],
+                'indexes': [models.Index(fields=['state', 'event_id'], name='StudHomeApi_state_9beee7_idx')],
+                'constraints': [models.UniqueConstraint(fields=('reference', 'status'), name='unique_webhook_reference_status')],
+            },
+        ),
+    ]
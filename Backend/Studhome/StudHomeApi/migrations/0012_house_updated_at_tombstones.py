@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:46
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_updated_at(apps, schema_editor):
+    House = apps.get_model('StudHomeApi', 'House')
+    House.objects.update(updated_at=F('date_added'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('StudHomeApi', '0011_webhookevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HouseTombstone',
+            fields=[
+                ('house_id', models.UUIDField(primary_key=True, serialize=False)),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['deleted_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='house',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='house',
+            index=models.Index(fields=['updated_at', 'house_id'], name='StudHomeApi_updated_eec532_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='housetombstone',
+            index=models.Index(fields=['deleted_at', 'house_id'], name='StudHomeApi_deleted_f4b586_idx'),
+        ),
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('StudHomeApi', '0012_house_updated_at_tombstones'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MapCluster',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('zoom', models.PositiveSmallIntegerField()),
+                ('cell_x', models.IntegerField()),
+                ('cell_y', models.IntegerField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('lat_sum', models.FloatField(default=0)),
+                ('lng_sum', models.FloatField(default=0)),
+                ('min_price', models.DecimalField(decimal_places=2, max_digits=10)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='housecard',
+            index=models.Index(fields=['lat', 'lng'], name='StudHomeApi_lat_8b5c4d_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='mapcluster',
+            constraint=models.UniqueConstraint(fields=('zoom', 'cell_x', 'cell_y'), name='unique_map_cluster_cell'),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:49
+
+import django.core.validators
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('StudHomeApi', '0013_mapcluster'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SavedSearch',
+            fields=[
+                ('search_id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('name', models.CharField(blank=True, default='', max_length=100)),
+                ('room_type', models.CharField(blank=True, choices=[('single', 'Single Room'), ('double', 'Double Room'), ('apartment', 'Apartment')], max_length=20, null=True)),
+                ('min_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('max_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('lat', models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-90), django.core.validators.MaxValueValidator(90)])),
+                ('lng', models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-180), django.core.validators.MaxValueValidator(180)])),
+                ('radius_km', models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(0.1)])),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saved_searches', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SavedSearchIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('room_type', models.CharField(max_length=20)),
+                ('price_bucket', models.SmallIntegerField()),
+                ('geo_cell', models.CharField(max_length=20)),
+                ('search', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='index_entries', to='StudHomeApi.savedsearch')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['room_type', 'price_bucket', 'geo_cell'], name='StudHomeApi_room_ty_330d2a_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SearchAlert',
+            fields=[
+                ('alert_id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('house', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_alerts', to='StudHomeApi.house')),
+                ('search', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alerts', to='StudHomeApi.savedsearch')),
+            ],
+            options={
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['sent_at', 'created_at'], name='StudHomeApi_sent_at_a9df62_idx')],
+                'constraints': [models.UniqueConstraint(fields=('search', 'house'), name='unique_search_alert')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:50
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('StudHomeApi', '0014_saved_search_alerts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaAsset',
+            fields=[
+                ('asset_id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('sha256', models.CharField(max_length=64)),
+                ('resource_type', models.CharField(max_length=20)),
+                ('url', models.URLField(max_length=500)),
+                ('size', models.PositiveBigIntegerField(default=0)),
+                ('hit_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('sha256', 'resource_type'), name='unique_media_asset_content')],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:55
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('StudHomeApi', '0015_mediaasset'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ModelUpload',
+            fields=[
+                ('upload_id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('filename', models.CharField(max_length=255)),
+                ('caption', models.CharField(blank=True, default='', max_length=255)),
+                ('size', models.PositiveBigIntegerField()),
+                ('offset', models.PositiveBigIntegerField(default=0)),
+                ('state', models.CharField(choices=[('UPLOADING', 'Uploading'), ('PROCESSING', 'Processing'), ('COMPLETE', 'Complete'), ('FAILED', 'Failed')], default='UPLOADING', max_length=20)),
+                ('error', models.TextField(blank=True, default='')),
+                ('file_url', models.URLField(blank=True, default='', max_length=500)),
+                ('metadata', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('house', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='model_uploads', to='StudHomeApi.house')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='model_uploads', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['state', 'updated_at'], name='StudHomeApi_state_209648_idx')],
+            },
+        ),
+    ]
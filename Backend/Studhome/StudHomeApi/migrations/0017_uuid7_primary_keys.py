@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:59
+
+import StudHomeApi.ids
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('StudHomeApi', '0016_modelupload'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='house',
+            name='house_id',
+            field=models.UUIDField(default=StudHomeApi.ids.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='mediaasset',
+            name='asset_id',
+            field=models.UUIDField(default=StudHomeApi.ids.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='modelupload',
+            name='upload_id',
+            field=models.UUIDField(default=StudHomeApi.ids.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='pendingmediaupload',
+            name='upload_id',
+            field=models.UUIDField(default=StudHomeApi.ids.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='reservation',
+            name='reservation_id',
+            field=models.UUIDField(default=StudHomeApi.ids.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='savedhome',
+            name='saved_home_id',
+            field=models.UUIDField(default=StudHomeApi.ids.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='savedsearch',
+            name='search_id',
+            field=models.UUIDField(default=StudHomeApi.ids.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='searchalert',
+            name='alert_id',
+            field=models.UUIDField(default=StudHomeApi.ids.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='transaction_id',
+            field=models.UUIDField(default=StudHomeApi.ids.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='user_id',
+            field=models.UUIDField(default=StudHomeApi.ids.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:01
+
+import StudHomeApi.ids
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('StudHomeApi', '0017_uuid7_primary_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HistoryArchive',
+            fields=[
+                ('archive_id', models.UUIDField(default=StudHomeApi.ids.uuid7, editable=False, primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('transaction', 'Transactions'), ('reservation', 'Reservations')], max_length=20)),
+                ('period_start', models.DateTimeField()),
+                ('period_end', models.DateTimeField()),
+                ('path', models.CharField(max_length=500)),
+                ('rows', models.PositiveIntegerField()),
+                ('size', models.PositiveBigIntegerField()),
+                ('sha256', models.CharField(max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['period_start'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', '-payment_date'], name='StudHomeApi_user_id_3c1aed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='historyarchive',
+            index=models.Index(fields=['kind', 'period_start'], name='StudHomeApi_kind_6ae955_idx'),
+        ),
+    ]
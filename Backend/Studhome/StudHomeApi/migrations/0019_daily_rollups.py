@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:06
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count
+from django.utils import timezone
+
+
+def seed_occupancy(apps, schema_editor):
+    # The occupancy gauges are maintained incrementally from here on, so
+    # start them from today's listed houses and active reservations.
+    # rebuild_rollups backfills earlier days.
+    House = apps.get_model('StudHomeApi', 'House')
+    Reservation = apps.get_model('StudHomeApi', 'Reservation')
+    DailyOccupancy = apps.get_model('StudHomeApi', 'DailyOccupancy')
+    listed = dict(House.objects.filter(remove=False).values('room_type').annotate(total=Count('pk')).values_list('room_type', 'total'))
+    active = dict(
+        Reservation.objects.filter(is_active=True).values('house__room_type').annotate(total=Count('pk')).values_list('house__room_type', 'total')
+    )
+    today = timezone.localdate()
+    DailyOccupancy.objects.bulk_create([
+        DailyOccupancy(day=today, room_type=room_type, active=active.get(room_type, 0), listed=listed.get(room_type, 0))
+        for room_type in set(listed) | set(active)
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('StudHomeApi', '0018_historyarchive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('room_type', models.CharField(choices=[('single', 'Single Room'), ('double', 'Double Room'), ('apartment', 'Apartment')], max_length=20)),
+                ('started', models.IntegerField(default=0)),
+                ('expired', models.IntegerField(default=0)),
+                ('active', models.IntegerField(default=0)),
+                ('listed', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['day', 'room_type'],
+                'constraints': [models.UniqueConstraint(fields=('room_type', 'day'), name='unique_daily_occupancy')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyRevenue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('transaction_type', models.CharField(choices=[('reserve', 'Reserve a house'), ('tour', 'Book a tour')], max_length=25)),
+                ('amount', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=16)),
+                ('payments', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['day', 'transaction_type'],
+                'constraints': [models.UniqueConstraint(fields=('transaction_type', 'day'), name='unique_daily_revenue')],
+            },
+        ),
+        migrations.RunPython(seed_occupancy, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('StudHomeApi', '0019_daily_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pendingmediaupload',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='pendingmediaupload',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('UPLOADING', 'Uploading'), ('UPLOADED', 'Uploaded'), ('FAILED', 'Failed')], default='PENDING', max_length=20),
+        ),
+    ]
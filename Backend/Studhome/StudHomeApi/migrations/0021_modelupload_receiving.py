@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('StudHomeApi', '0020_pendingmediaupload_claim'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='modelupload',
+            name='state',
+            field=models.CharField(choices=[('UPLOADING', 'Uploading'), ('RECEIVING', 'Receiving a chunk'), ('PROCESSING', 'Processing'), ('COMPLETE', 'Complete'), ('FAILED', 'Failed')], default='UPLOADING', max_length=20),
+        ),
+    ]
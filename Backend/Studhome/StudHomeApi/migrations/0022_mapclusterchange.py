@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:24
+
+import StudHomeApi.ids
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('StudHomeApi', '0021_modelupload_receiving'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MapClusterChange',
+            fields=[
+                ('change_id', models.UUIDField(default=StudHomeApi.ids.uuid7, editable=False, primary_key=True, serialize=False)),
+                ('lat', models.FloatField()),
+                ('lng', models.FloatField()),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('sign', models.SmallIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
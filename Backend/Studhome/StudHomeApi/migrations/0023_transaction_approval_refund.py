@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:26
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def mark_sent(apps, schema_editor):
+    # Payments that already succeeded had their approval email sent by the
+    # old code; don't send it again on a repeated webhook.
+    Transaction = apps.get_model('StudHomeApi', 'Transaction')
+    Transaction.objects.filter(payment_status='SUCCESSFUL').update(approval_sent_at=F('payment_date'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('StudHomeApi', '0022_mapclusterchange'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='approval_sent_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='needs_refund',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(mark_sent, migrations.RunPython.noop),
+    ]
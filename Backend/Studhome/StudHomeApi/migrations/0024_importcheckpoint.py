@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('StudHomeApi', '0023_transaction_approval_refund'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportCheckpoint',
+            fields=[
+                ('name', models.CharField(max_length=500, primary_key=True, serialize=False)),
+                ('line', models.PositiveIntegerField(default=0)),
+                ('saved_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
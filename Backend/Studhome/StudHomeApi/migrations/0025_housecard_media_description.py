@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:37
+
+from django.db import migrations, models
+
+DESCRIPTION_EXCERPT_LENGTH = 300
+
+
+def backfill_cards(apps, schema_editor):
+    # Same values as HouseCard.values_for.
+    HouseCard = apps.get_model('StudHomeApi', 'HouseCard')
+    cards = []
+    for card in HouseCard.objects.select_related('house').iterator(chunk_size=500):
+        description = card.house.description
+        if description is not None and len(description) > DESCRIPTION_EXCERPT_LENGTH:
+            description = description[:DESCRIPTION_EXCERPT_LENGTH - 1].rstrip() + '\u2026'
+        card.media = card.house.media or []
+        card.description = description
+        cards.append(card)
+        if len(cards) >= 500:
+            HouseCard.objects.bulk_update(cards, ['media', 'description'])
+            cards = []
+    HouseCard.objects.bulk_update(cards, ['media', 'description'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('StudHomeApi', '0024_importcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='housecard',
+            name='description',
+            field=models.CharField(blank=True, max_length=300, null=True),
+        ),
+        migrations.AddField(
+            model_name='housecard',
+            name='media',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.RunPython(backfill_cards, migrations.RunPython.noop),
+    ]
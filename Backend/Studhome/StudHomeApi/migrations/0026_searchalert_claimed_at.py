@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('StudHomeApi', '0025_housecard_media_description'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='searchalert',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,143 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import urllib.request
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .media import upload_deduplicated
+from .model_uploads import COPY_CHUNK_SIZE, GLB_MAGIC, ModelUploadError, gltf_metadata
+from .models import House
+
+# Offline LOD generation for 3D tour models. Each model is run through an
+# external glTF optimizer once per MODEL_LODS level (simplified, quantized,
+# meshopt-compressed, textures downscaled) and the results are recorded as
+# `variants` on the house's media entry, coarsest first, so clients can show
+# a low-poly model while the full one loads.
+
+TOOLS = ('gltf-transform', 'gltfpack')
+
+
+class OptimizerUnavailable(Exception):
+    pass
+
+
+def find_tool(preferred=None):
+    # Returns (tool name, executable path). gltf-transform is preferred since
+    # gltfpack can't resize textures.
+    preferred = preferred or settings.MODEL_OPTIMIZER_TOOL
+    candidates = TOOLS if preferred == 'auto' else (preferred,)
+    binaries = {'gltf-transform': settings.GLTF_TRANSFORM_BIN, 'gltfpack': settings.GLTFPACK_BIN}
+    for tool in candidates:
+        if tool not in binaries:
+            raise OptimizerUnavailable(f'Unknown optimizer {tool}, use one of {", ".join(TOOLS)}')
+        path = shutil.which(binaries[tool])
+        if path:
+            return tool, path
+    raise OptimizerUnavailable(
+        'No glTF optimizer found. Install gltf-transform (npm install -g @gltf-transform/cli) '
+        'or gltfpack (npm install -g gltfpack), or set GLTF_TRANSFORM_BIN / GLTFPACK_BIN.'
+    )
+
+
+def optimizer_command(tool, executable, source, target, ratio, texture_size):
+    if tool == 'gltf-transform':
+        command = [executable, 'optimize', source, target, '--compress', 'meshopt', '--texture-compress', 'webp', '--texture-size', str(texture_size)]
+        if ratio < 1:
+            command += ['--simplify-ratio', str(ratio), '--simplify-error', '0.01']
+        else:
+            command += ['--simplify', 'false']
+        return command
+    # gltfpack quantizes by default; -cc adds meshopt compression.
+    command = [executable, '-i', source, '-o', target, '-cc']
+    if ratio < 1:
+        command += ['-si', str(ratio)]
+    return command
+
+
+def models_needing_lods(force=False, house_ids=None):
+    houses = House.objects.only('house_id', 'media')
+    if house_ids:
+        houses = houses.filter(house_id__in=house_ids)
+    for house in houses.iterator(chunk_size=500):
+        for item in house.media or []:
+            if item.get('media_type') == '3d_model' and item.get('file_url') and (force or 'variants' not in item):
+                yield house.house_id, item
+
+
+def fetch_model(url, target):
+    # Streams a remote model to disk, refusing anything over
+    # MODEL_UPLOAD_MAX_SIZE.
+    size = 0
+    with urllib.request.urlopen(url, timeout=60) as response, open(target, 'wb') as output:
+        while True:
+            chunk = response.read(COPY_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > settings.MODEL_UPLOAD_MAX_SIZE:
+                raise ModelUploadError(f'{url} is larger than MODEL_UPLOAD_MAX_SIZE')
+            output.write(chunk)
+    return size
+
+
+def build_variants(tool, executable, source, workdir, original, lods=None):
+    # Runs the optimizer for every LOD and uploads the results. Variants
+    # that aren't smaller than the original are dropped.
+    variants = []
+    for name, ratio, texture_size in lods or settings.MODEL_LODS:
+        target = os.path.join(workdir, f'{name}.glb')
+        subprocess.run(
+            optimizer_command(tool, executable, source, target, ratio, texture_size),
+            check=True, capture_output=True, timeout=settings.MODEL_OPTIMIZER_TIMEOUT,
+        )
+        size = os.path.getsize(target)
+        with open(target, 'rb') as output:
+            metadata = gltf_metadata(output, size, 'glb')
+            if size >= original['size'] and metadata['triangles'] >= original['triangles']:
+                continue
+            file_url, _ = upload_deduplicated(output, resource_type='raw', large=True)
+        variants.append({
+            'lod': name,
+            'file_url': file_url,
+            'simplify_ratio': ratio,
+            'texture_size': texture_size,
+            'metadata': metadata,
+        })
+    variants.sort(key=lambda variant: (variant['metadata']['triangles'], variant['metadata']['size']))
+    return variants
+
+
+def optimize_model(house_id, item, tool, executable, lods=None):
+    # Returns the variants recorded for the model, or None if the model was
+    # removed from the house while it was being processed.
+    file_url = item['file_url']
+    with tempfile.TemporaryDirectory(prefix='studhome-lods-') as workdir:
+        download = os.path.join(workdir, 'download')
+        size = fetch_model(file_url, download)
+        # Raw media URLs don't always keep the extension; GLB starts with
+        # its magic.
+        with open(download, 'rb') as model:
+            extension = 'glb' if model.read(4) == GLB_MAGIC else 'gltf'
+        source = os.path.join(workdir, f'source.{extension}')
+        os.rename(download, source)
+        with open(source, 'rb') as model:
+            original = gltf_metadata(model, size, extension)
+        variants = build_variants(tool, executable, source, workdir, original, lods)
+
+    with transaction.atomic():
+        house = House.objects.select_for_update().get(house_id=house_id)
+        media = house.media or []
+        for entry in media:
+            if entry.get('media_type') == '3d_model' and entry.get('file_url') == file_url:
+                entry.setdefault('metadata', original)
+                entry['variants'] = variants
+                entry['optimized_with'] = tool
+                entry['optimized_at'] = timezone.now().isoformat()
+                break
+        else:
+            return None
+        house.media = media
+        house.save()
+    return variants
@@ -0,0 +1,370 @@
+import itertools
+import json
+import logging
+import os
+import struct
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from .media import upload_deduplicated
+from .models import House, ModelUpload
+
+logger = logging.getLogger(__name__)
+
+# 3D model uploads. Large models are sent as a resumable upload: the client
+# declares the size, PATCHes chunks at the current offset (Upload-Offset,
+# like tus) and the chunks are written straight to a staging file, so a
+# worker never holds more than COPY_CHUNK_SIZE of the model in memory. The
+# finished file is validated, described (triangles, bounding box, size) and
+# sent to the media store in chunks.
+
+MODEL_EXTENSIONS = ('glb', 'gltf')
+GLB_MAGIC = b'glTF'
+GLB_JSON_CHUNK = 0x4E4F534A
+GLB_BIN_CHUNK = 0x004E4942
+# The JSON part of a model is parsed in memory; .gltf files carry their
+# buffers inline as base64 and are therefore capped as a whole.
+MAX_GLTF_JSON_BYTES = 32 * 1024 * 1024
+COPY_CHUNK_SIZE = 64 * 1024
+
+
+class ModelUploadError(ValueError):
+    pass
+
+
+class UploadOffsetMismatch(ModelUploadError):
+    def __init__(self, offset):
+        super().__init__(f'Upload-Offset must be {offset}')
+        self.offset = offset
+
+
+class UploadBusy(ModelUploadError):
+    pass
+
+
+def model_extension(name):
+    extension = name.rsplit('.', 1)[-1].lower() if '.' in name else ''
+    if extension not in MODEL_EXTENSIONS:
+        raise ModelUploadError('3D models must be .glb or .gltf files.')
+    return extension
+
+
+def read_gltf_json(file, size, extension):
+    if extension == 'glb':
+        header = file.read(20)
+        if len(header) < 20:
+            raise ModelUploadError('File is too short to be a GLB model.')
+        magic, version, length, json_length, json_type = struct.unpack('<4sIIII', header)
+        if magic != GLB_MAGIC:
+            raise ModelUploadError('File is not a GLB model.')
+        if version != 2:
+            raise ModelUploadError(f'Unsupported GLB version {version}.')
+        if length != size:
+            raise ModelUploadError('GLB header length does not match the file size.')
+        if json_type != GLB_JSON_CHUNK or 20 + json_length > size:
+            raise ModelUploadError('GLB model has no valid JSON chunk.')
+        if json_length > MAX_GLTF_JSON_BYTES:
+            raise ModelUploadError('GLB JSON chunk is too large.')
+        data = file.read(json_length)
+        chunk = file.read(8)
+        has_bin_chunk = len(chunk) == 8 and struct.unpack('<II', chunk)[1] == GLB_BIN_CHUNK
+    else:
+        if size > MAX_GLTF_JSON_BYTES:
+            raise ModelUploadError(f'.gltf files over {MAX_GLTF_JSON_BYTES // (1024 * 1024)} MB are not supported, upload a .glb instead.')
+        data = file.read()
+        has_bin_chunk = False
+    try:
+        gltf = json.loads(data)
+    except ValueError:
+        raise ModelUploadError('Model JSON is not valid.')
+    if not isinstance(gltf, dict) or not str((gltf.get('asset') or {}).get('version', '')).startswith('2.'):
+        raise ModelUploadError('Only glTF 2.0 models are supported.')
+    for index, buffer in enumerate(gltf.get('buffers', [])):
+        uri = buffer.get('uri')
+        # Meshopt-compressed models (see model_lods.py) carry an empty
+        # fallback buffer.
+        fallback = (buffer.get('extensions') or {}).get('EXT_meshopt_compression', {}).get('fallback')
+        if uri is None and not fallback and not (index == 0 and has_bin_chunk):
+            raise ModelUploadError(f'Buffer {index} has no data.')
+        if uri is not None and not uri.startswith('data:'):
+            # Only the model file is uploaded, external .bin files would be
+            # missing.
+            raise ModelUploadError('Models with external buffers are not supported, upload a .glb instead.')
+    return gltf
+
+
+def primitive_triangles(accessors, primitive):
+    index = primitive.get('indices', primitive['attributes'].get('POSITION'))
+    if index is None:
+        return 0
+    count = accessors[index]['count']
+    mode = primitive.get('mode', 4)
+    if mode == 4:
+        return count // 3
+    if mode in (5, 6):
+        return max(count - 2, 0)
+    # Points and lines
+    return 0
+
+
+def node_matrix(node):
+    import numpy as np
+    if 'matrix' in node:
+        return np.array(node['matrix'], dtype=np.float64).reshape(4, 4).T
+    x, y, z, w = node.get('rotation', (0.0, 0.0, 0.0, 1.0))
+    rotation = np.array([
+        [1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)],
+        [2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)],
+        [2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)],
+    ])
+    matrix = np.identity(4)
+    matrix[:3, :3] = rotation * np.array(node.get('scale', (1.0, 1.0, 1.0)), dtype=np.float64)
+    matrix[:3, 3] = node.get('translation', (0.0, 0.0, 0.0))
+    return matrix
+
+
+def mesh_instances(gltf):
+    # (mesh index, world matrix) for every mesh placed in the default scene,
+    # or every mesh once when the model has no scenes. numpy is imported
+    # here rather than at module level to keep it off the boot path.
+    import numpy as np
+    scenes = gltf.get('scenes', [])
+    if not scenes:
+        return [(index, np.identity(4)) for index in range(len(gltf.get('meshes', [])))]
+    nodes = gltf.get('nodes', [])
+    stack = [(index, np.identity(4)) for index in scenes[gltf.get('scene', 0)].get('nodes', [])]
+    visited = set()
+    instances = []
+    while stack:
+        index, parent = stack.pop()
+        if index in visited:
+            raise ModelUploadError('Model node hierarchy is not a tree.')
+        visited.add(index)
+        node = nodes[index]
+        world = parent @ node_matrix(node)
+        if 'mesh' in node:
+            instances.append((node['mesh'], world))
+        stack.extend((child, world) for child in node.get('children', []))
+    return instances
+
+
+def gltf_metadata(file, size, extension):
+    # Triangle and vertex counts and the world-space bounding box of the
+    # default scene, from the JSON alone: positions' min/max are required by
+    # the spec, so buffers are never read.
+    import numpy as np
+    file.seek(0)
+    try:
+        gltf = read_gltf_json(file, size, extension)
+        accessors = gltf.get('accessors', [])
+        meshes = gltf.get('meshes', [])
+        triangles = vertices = 0
+        low = np.full(3, np.inf)
+        high = np.full(3, -np.inf)
+        for mesh_index, world in mesh_instances(gltf):
+            for primitive in meshes[mesh_index]['primitives']:
+                triangles += primitive_triangles(accessors, primitive)
+                position = primitive['attributes'].get('POSITION')
+                if position is None:
+                    continue
+                accessor = accessors[position]
+                vertices += accessor['count']
+                if 'min' in accessor and 'max' in accessor:
+                    corners = np.array(list(itertools.product(*zip(accessor['min'][:3], accessor['max'][:3]))), dtype=np.float64)
+                    points = corners @ world[:3, :3].T + world[:3, 3]
+                    low = np.minimum(low, points.min(axis=0))
+                    high = np.maximum(high, points.max(axis=0))
+    except ModelUploadError:
+        raise
+    except (IndexError, KeyError, TypeError, ValueError) as e:
+        raise ModelUploadError(f'Model is malformed: {e!r}')
+    finally:
+        file.seek(0)
+    bbox = None
+    if np.all(np.isfinite(low)):
+        bbox = {'min': [round(float(value), 6) for value in low], 'max': [round(float(value), 6) for value in high]}
+    return {
+        'format': extension,
+        'size': size,
+        'triangles': triangles,
+        'vertices': vertices,
+        'meshes': len(meshes),
+        'bbox': bbox,
+    }
+
+
+def model_media_entry(file_url, caption, metadata):
+    return {
+        'media_type': '3d_model',
+        'file_url': file_url,
+        'caption': caption,
+        'uploaded_at': timezone.now().isoformat(),
+        'metadata': metadata,
+    }
+
+
+def file_size(file):
+    size = getattr(file, 'size', None)
+    return size if size is not None else os.fstat(file.fileno()).st_size
+
+
+def store_model(file, caption='', metadata=None):
+    # For models sent in a single request (admin form, house media endpoint,
+    # importer): validated and described like resumable uploads. Returns the
+    # media entry.
+    if metadata is None:
+        metadata = gltf_metadata(file, file_size(file), model_extension(file.name))
+    file_url, _ = upload_deduplicated(file, resource_type='raw', large=True)
+    return model_media_entry(file_url, caption, metadata)
+
+
+def check_model_slot(house):
+    if any(item.get('media_type') == '3d_model' for item in house.media or []):
+        raise ModelUploadError('Only one 3D model allowed per house.')
+
+
+def staging_path(upload):
+    # Keeps the extension so the media store sees the right file type.
+    return os.path.join(settings.MODEL_UPLOAD_DIR, f'{upload.upload_id}.{model_extension(upload.filename)}')
+
+
+def start_upload(house, user, filename, size, caption=''):
+    model_extension(filename)
+    if not 0 < size <= settings.MODEL_UPLOAD_MAX_SIZE:
+        raise ModelUploadError(f'Model size must be between 1 and {settings.MODEL_UPLOAD_MAX_SIZE} bytes.')
+    check_model_slot(house)
+    upload = ModelUpload.objects.create(house=house, user=user, filename=filename, size=size, caption=caption)
+    os.makedirs(settings.MODEL_UPLOAD_DIR, exist_ok=True)
+    open(staging_path(upload), 'wb').close()
+    return upload
+
+
+def fail_upload(upload, error):
+    upload.state = 'FAILED'
+    upload.error = error
+    upload.save(update_fields=['state', 'error', 'updated_at'])
+    discard_staged(upload)
+
+
+def discard_staged(upload):
+    try:
+        os.remove(staging_path(upload))
+    except FileNotFoundError:
+        pass
+
+
+def write_chunk(upload_id, offset, stream, length):
+    # Writes up to `length` bytes from stream at offset. A client that drops
+    # mid-chunk keeps what arrived and resumes from the returned upload's
+    # offset. The upload is claimed for the chunk with a conditional update
+    # (RECEIVING) and the body is copied with no transaction or row lock
+    # held. Raises ModelUpload.DoesNotExist, UploadOffsetMismatch, UploadBusy
+    # or ModelUploadError.
+    claimed_at = timezone.now()
+    abandoned = claimed_at - timedelta(seconds=settings.MODEL_UPLOAD_CHUNK_TIMEOUT)
+    claimed = ModelUpload.objects.filter(
+        Q(state='UPLOADING') | Q(state='RECEIVING', updated_at__lt=abandoned),
+        upload_id=upload_id, offset=offset, size__gte=offset + length,
+    ).update(state='RECEIVING', updated_at=claimed_at)
+    upload = ModelUpload.objects.get(upload_id=upload_id)
+    if not claimed:
+        if upload.state == 'RECEIVING':
+            raise UploadBusy('Another chunk of this upload is still being received.')
+        if upload.state != 'UPLOADING':
+            raise ModelUploadError(f'Upload is {upload.get_state_display().lower()}.')
+        if offset != upload.offset:
+            raise UploadOffsetMismatch(upload.offset)
+        raise ModelUploadError('Chunk goes past the declared upload size.')
+
+    path = staging_path(upload)
+    if not os.path.exists(path):
+        fail_upload(upload, 'Staged data was lost, start a new upload.')
+        raise ModelUploadError(upload.error)
+    written = 0
+    try:
+        with open(path, 'r+b') as staged:
+            staged.seek(offset)
+            while written < length:
+                try:
+                    chunk = stream.read(min(COPY_CHUNK_SIZE, length - written))
+                except OSError:
+                    break
+                if not chunk:
+                    break
+                staged.write(chunk)
+                written += len(chunk)
+            staged.truncate()
+    finally:
+        # Only if the claim is still ours: the upload may have been
+        # cancelled, or taken over after MODEL_UPLOAD_CHUNK_TIMEOUT.
+        released = ModelUpload.objects.filter(upload_id=upload_id, state='RECEIVING', updated_at=claimed_at).update(
+            state='UPLOADING', offset=offset + written, updated_at=timezone.now(),
+        )
+    upload = ModelUpload.objects.get(upload_id=upload_id)
+    if not released:
+        raise ModelUploadError('The upload changed while this chunk was received, check its offset.')
+    return upload
+
+
+def finish_upload(upload_id):
+    # Publishes a fully received upload. Claimed with a conditional update so
+    # only one request does it; if the media store fails the upload goes
+    # back to UPLOADING and an empty PATCH at the final offset retries.
+    claimed = ModelUpload.objects.filter(upload_id=upload_id, state='UPLOADING', offset=F('size')).update(
+        state='PROCESSING', updated_at=timezone.now(),
+    )
+    upload = ModelUpload.objects.get(upload_id=upload_id)
+    if not claimed:
+        return upload
+    path = staging_path(upload)
+    try:
+        with open(path, 'rb') as staged:
+            metadata = gltf_metadata(staged, upload.size, model_extension(upload.filename))
+    except ModelUploadError as e:
+        fail_upload(upload, str(e))
+        raise
+
+    try:
+        with open(path, 'rb') as staged:
+            file_url, _ = upload_deduplicated(staged, resource_type='raw', large=True)
+    except Exception as e:
+        logger.warning(f"Model upload {upload.upload_id} could not be stored: {e}")
+        upload.state = 'UPLOADING'
+        upload.error = str(e)
+        upload.save(update_fields=['state', 'error', 'updated_at'])
+        raise
+
+    try:
+        with transaction.atomic():
+            house = House.objects.select_for_update().get(house_id=upload.house_id)
+            check_model_slot(house)
+            house.media = (house.media or []) + [model_media_entry(file_url, upload.caption, metadata)]
+            house.save()
+    except ModelUploadError as e:
+        fail_upload(upload, str(e))
+        raise
+    upload.state = 'COMPLETE'
+    upload.error = ''
+    upload.file_url = file_url
+    upload.metadata = metadata
+    upload.save(update_fields=['state', 'error', 'file_url', 'metadata', 'updated_at'])
+    discard_staged(upload)
+    return upload
+
+
+def cancel_upload(upload):
+    discard_staged(upload)
+    upload.delete()
+
+
+def prune_stale_uploads(hours=None):
+    # Removes unfinished uploads (and their staged files) not touched for
+    # MODEL_UPLOAD_EXPIRY_HOURS. Returns the number removed.
+    hours = settings.MODEL_UPLOAD_EXPIRY_HOURS if hours is None else hours
+    cutoff = timezone.now() - timedelta(hours=hours)
+    stale = list(ModelUpload.objects.filter(updated_at__lt=cutoff).exclude(state='COMPLETE'))
+    for upload in stale:
+        cancel_upload(upload)
+    return len(stale)
@@ -1,17 +1,22 @@
-from datetime import timedelta, timezone
+from datetime import timedelta
 import datetime
-import uuid
+import random
+from collections import Counter
 from django.conf import settings
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+from django.contrib.auth.hashers import check_password
 from django.contrib.auth.models import AbstractUser
 from phonenumber_field.modelfields import PhoneNumberField
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db.models import JSONField 
 from decimal import Decimal
+from .ids import uuid7
 
 class User(AbstractUser):
     username = models.CharField(max_length=150, unique=True)
-    user_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user_id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     phone_number = PhoneNumberField()
     email = models.EmailField(unique=True)
 
@@ -21,12 +26,22 @@ class User(AbstractUser):
     def __str__(self):
         return self.username
 
+    def check_password(self, raw_password):
+        # Like AbstractBaseUser.check_password, but hashes that need upgrading
+        # are rehashed off the request path.
+        from .hashing import schedule_rehash
+
+        def setter(raw_password):
+            schedule_rehash(self, raw_password)
+
+        return check_password(raw_password, self.password, setter)
+
     class Meta:
         indexes = [models.Index(fields=['username', 'email'])]
         ordering = ['username']
 
 class House(models.Model):
-    house_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    house_id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     house_name = models.CharField(max_length=50)
     ROOM_TYPES = (
         ('single', 'Single Room'),
@@ -42,17 +57,24 @@ class House(models.Model):
     lat = models.FloatField(validators=[MinValueValidator(-90), MaxValueValidator(90)])
     lng = models.FloatField(validators=[MinValueValidator(-180), MaxValueValidator(180)])
     date_added = models.DateTimeField(auto_now_add=True)
+    # Queryset .update() calls that touch House must set updated_at too, the
+    # delta sync feed relies on it.
+    updated_at = models.DateTimeField(auto_now=True)
     media = JSONField(default=list, blank=True) 
 
     def __str__(self):
         return self.house_name
 
     class Meta:
-        indexes = [models.Index(fields=['house_name', 'room_type'])]
+        indexes = [
+            models.Index(fields=['house_name', 'room_type']),
+            models.Index(fields=['room_type', 'date_added']),
+            models.Index(fields=['updated_at', 'house_id']),
+        ]
         ordering = ['date_added']
 
 class Transaction(models.Model):
-    transaction_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    transaction_id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     user = models.ForeignKey('User', on_delete=models.CASCADE, related_name='transactions')
     house = models.ForeignKey('House', on_delete=models.CASCADE, related_name='transactions')
     amount_paid = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(Decimal('0.01'))])
@@ -64,22 +86,93 @@ class Transaction(models.Model):
     payment_date = models.DateTimeField(auto_now_add=True)
     payment_reference = models.CharField(max_length=100, null=True, blank=True)
     payment_status = models.CharField(max_length=20, default='PENDING')
+    # When the approval email went out; a repeated status update sends it
+    # if an earlier attempt failed.
+    approval_sent_at = models.DateTimeField(null=True, blank=True)
+    # A successful reserve payment whose house went to another user. It has
+    # to be refunded by hand.
+    needs_refund = models.BooleanField(default=False)
 
     def __str__(self):
         return f"{self.user.username} - {self.house.house_name} - {self.amount_paid}"
 
     class Meta:
-        indexes = [models.Index(fields=['payment_date'])]
+        # On PostgreSQL the table can be range partitioned by month on
+        # payment_date (partition_transactions, create_partitions). Its
+        # primary key is then (transaction_id, payment_date), so the
+        # database no longer enforces transaction_id unique by itself.
+        indexes = [
+            models.Index(fields=['payment_date']),
+            models.Index(fields=['transaction_type', 'payment_date']),
+            models.Index(fields=['payment_status', 'payment_date']),
+            models.Index(fields=['user', '-payment_date']),
+        ]
         ordering = ['-payment_date']
 
+class ReservationManager(models.Manager):
+    def release_expired(self, house_id=None):
+        # The expired rows are locked first so concurrent callers don't count
+        # the same reservation twice in the occupancy rollup.
+        expired = self.filter(is_active=True, expiry_date__lte=timezone.now())
+        if house_id is not None:
+            expired = expired.filter(house_id=house_id)
+        with transaction.atomic():
+            rows = list(expired.select_for_update(of=('self',)).values_list('reservation_id', 'house_id', 'house__room_type'))
+            if not rows:
+                return 0
+            released = self.filter(reservation_id__in=[row[0] for row in rows], is_active=True).update(is_active=False)
+            self.free_houses({row[1] for row in rows})
+            for room_type, count in sorted(Counter(row[2] for row in rows).items()):
+                DailyOccupancy.record(room_type, expired=count)
+        return released
+
+    def free_houses(self, house_ids):
+        # Clears is_reserved on the houses that have no active reservation
+        # left.
+        free_house_ids = set(house_ids) - set(
+            self.filter(house_id__in=house_ids, is_active=True).values_list('house_id', flat=True)
+        )
+        if free_house_ids:
+            House.objects.filter(house_id__in=free_house_ids, is_reserved=True).update(is_reserved=False, updated_at=timezone.now())
+            HouseCard.objects.filter(house_id__in=free_house_ids, is_reserved=True).update(is_reserved=False)
+
+    def claim(self, user, house, days=7):
+        # Returns (reservation, created). reservation is None when the house
+        # is held by someone else or doesn't exist. Claimers of a house queue
+        # on its row lock, and whoever gets it decides from the active
+        # reservations, not from House.is_reserved, so a flag left set by an
+        # admin edit can't block the house forever. The partial unique
+        # constraint on active reservations backs it up.
+        try:
+            with transaction.atomic():
+                self.release_expired(house_id=house.pk)
+                if not House.objects.select_for_update().filter(house_id=house.pk).exists():
+                    return None, False
+                current = self.filter(house_id=house.pk, is_active=True).first()
+                if current is not None:
+                    return (current, False) if current.user_id == user.pk else (None, False)
+                House.objects.filter(house_id=house.pk).update(is_reserved=True, updated_at=timezone.now())
+                reservation = self.create(
+                    user=user,
+                    house=house,
+                    is_active=True,
+                    expiry_date=timezone.now() + timedelta(days=days)
+                )
+        except IntegrityError:
+            return None, False
+        house.is_reserved = True
+        return reservation, True
+
 class Reservation(models.Model):
-    reservation_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    reservation_id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     user = models.ForeignKey('User', on_delete=models.CASCADE, related_name='reservations')
     house = models.ForeignKey('House', on_delete=models.CASCADE, related_name='reservations')
     reservation_date = models.DateTimeField(auto_now_add=True)
     expiry_date = models.DateTimeField()
     is_active = models.BooleanField(default=True)
 
+    objects = ReservationManager()
+
     def save(self, *args, **kwargs):
         if not self.expiry_date:
             self.expiry_date = timezone.now() + datetime.timedelta(days=7)
@@ -89,11 +182,17 @@ class Reservation(models.Model):
         return f"Reservation for {self.house.house_name} by {self.user.username}"
 
     class Meta:
-        indexes = [models.Index(fields=['reservation_date', 'expiry_date'])]
+        indexes = [
+            models.Index(fields=['reservation_date', 'expiry_date']),
+            models.Index(fields=['is_active', 'reservation_date']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['house'], condition=Q(is_active=True), name='unique_active_reservation_per_house'),
+        ]
         ordering = ['-reservation_date']
 
 class SavedHome(models.Model):
-    saved_home_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    saved_home_id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     user = models.ForeignKey('User', on_delete=models.CASCADE, related_name='saved_homes')
     house = models.ForeignKey('House', on_delete=models.CASCADE, related_name='saved_by')
     saved_at = models.DateTimeField(auto_now_add=True)
@@ -104,4 +203,488 @@ class SavedHome(models.Model):
     class Meta:
         indexes = [models.Index(fields=['user', 'house'])]
         ordering = ['-saved_at']
-        unique_together = ['user', 'house']
\ No newline at end of file
+        unique_together = ['user', 'house']
+
+class HouseTombstone(models.Model):
+    # Left behind when a House row is deleted so the delta sync feed can
+    # tell clients to drop it.
+    house_id = models.UUIDField(primary_key=True)
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.house_id} deleted {self.deleted_at}"
+
+    class Meta:
+        indexes = [models.Index(fields=['deleted_at', 'house_id'])]
+        ordering = ['deleted_at']
+
+
+class HouseCard(models.Model):
+    # The house list reads only this table. It carries the house's media and
+    # the start of its description; the detail endpoint has the full text.
+    DESCRIPTION_EXCERPT_LENGTH = 300
+    house = models.OneToOneField('House', on_delete=models.CASCADE, primary_key=True, related_name='card')
+    house_name = models.CharField(max_length=50)
+    room_type = models.CharField(max_length=20, choices=House.ROOM_TYPES)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    lat = models.FloatField()
+    lng = models.FloatField()
+    cover_url = models.URLField(max_length=500, blank=True, default='')
+    media = JSONField(default=list, blank=True)
+    description = models.CharField(max_length=DESCRIPTION_EXCERPT_LENGTH, null=True, blank=True)
+    is_reserved = models.BooleanField(default=False)
+    saved_count = models.PositiveIntegerField(default=0)
+    remove = models.BooleanField(default=False)
+    date_added = models.DateTimeField()
+
+    def __str__(self):
+        return self.house_name
+
+    @staticmethod
+    def cover_url_for(house):
+        for item in house.media or []:
+            if item.get('media_type') == 'image' and item.get('file_url'):
+                return item['file_url']
+        return ''
+
+    @classmethod
+    def description_excerpt_for(cls, house):
+        description = house.description
+        if description is None or len(description) <= cls.DESCRIPTION_EXCERPT_LENGTH:
+            return description
+        return description[:cls.DESCRIPTION_EXCERPT_LENGTH - 1].rstrip() + '\u2026'
+
+    @staticmethod
+    def reserved_flag_for(house):
+        return house.is_reserved or Reservation.objects.filter(house_id=house.pk, is_active=True).exists()
+
+    @classmethod
+    def values_for(cls, house, is_reserved=None):
+        return {
+            'house_name': house.house_name,
+            'room_type': house.room_type,
+            'price': house.price,
+            'lat': house.lat,
+            'lng': house.lng,
+            'cover_url': cls.cover_url_for(house),
+            'media': house.media or [],
+            'description': cls.description_excerpt_for(house),
+            'is_reserved': cls.reserved_flag_for(house) if is_reserved is None else is_reserved,
+            'remove': house.remove,
+            'date_added': house.date_added,
+        }
+
+    @classmethod
+    def build_for_new(cls, house):
+        return cls(house=house, **cls.values_for(house, is_reserved=house.is_reserved))
+
+    @classmethod
+    def refresh(cls, house):
+        card, created = cls.objects.update_or_create(house=house, defaults=cls.values_for(house))
+        if created:
+            card.saved_count = SavedHome.objects.filter(house_id=house.pk).count()
+            card.save(update_fields=['saved_count'])
+        return card
+
+    @classmethod
+    def refresh_reserved(cls, house_id):
+        house = House.objects.filter(house_id=house_id).only('house_id', 'is_reserved').first()
+        if house is not None:
+            cls.objects.filter(house_id=house_id).update(is_reserved=cls.reserved_flag_for(house))
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['remove', 'room_type', 'date_added']),
+            models.Index(fields=['remove', '-saved_count', 'date_added']),
+            models.Index(fields=['lat', 'lng']),
+        ]
+        ordering = ['date_added']
+
+class HouseSaveCounter(models.Model):
+    # Sharded saved-home counter. Writers bump a random shard so saves of a
+    # popular house don't queue on one row lock, and fold the shards into
+    # HouseCard.saved_count once they commit. reconcile_save_counts repairs
+    # drifted counts.
+    house = models.ForeignKey('House', on_delete=models.CASCADE, related_name='save_counters')
+    shard = models.PositiveSmallIntegerField()
+    count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.house_id}[{self.shard}] = {self.count}"
+
+    @classmethod
+    def increment(cls, house_id, delta=1):
+        shard = random.randrange(settings.SAVE_COUNTER_SHARDS)
+        if not cls.objects.filter(house_id=house_id, shard=shard).update(count=F('count') + delta):
+            try:
+                with transaction.atomic():
+                    cls.objects.create(house_id=house_id, shard=shard, count=delta)
+            except IntegrityError:
+                cls.objects.filter(house_id=house_id, shard=shard).update(count=F('count') + delta)
+        transaction.on_commit(lambda: cls.fold(house_id))
+
+    @classmethod
+    def fold(cls, house_id, max_rounds=10):
+        # Copies the shard total into the house's card. A writer that finds
+        # the card locked skips it rather than queueing behind the other
+        # savers of a popular house: its increment committed before it
+        # tried, so the holder's re-read after commit sees it and folds
+        # again.
+        for _ in range(max_rounds):
+            with transaction.atomic():
+                if not HouseCard.objects.select_for_update(skip_locked=True).filter(house_id=house_id).exists():
+                    return
+                written = max(cls.totals([house_id]).get(house_id, 0), 0)
+                HouseCard.objects.filter(house_id=house_id).update(saved_count=written)
+            if max(cls.totals([house_id]).get(house_id, 0), 0) == written:
+                return
+
+    @classmethod
+    def totals(cls, house_ids=None):
+        counters = cls.objects.all() if house_ids is None else cls.objects.filter(house_id__in=house_ids)
+        return dict(counters.values('house_id').annotate(total=Sum('count')).values_list('house_id', 'total'))
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['house', 'shard'], name='unique_save_counter_shard'),
+        ]
+
+class SimilarHouse(models.Model):
+    house = models.ForeignKey('House', on_delete=models.CASCADE, related_name='similar_houses')
+    neighbour = models.ForeignKey('House', on_delete=models.CASCADE, related_name='neighbour_of')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    def __str__(self):
+        return f"{self.house_id} #{self.rank}: {self.neighbour_id}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['house', 'rank'], name='unique_similar_house_rank'),
+        ]
+        ordering = ['house', 'rank']
+
+class PendingMediaUpload(models.Model):
+    STATUSES = (
+        ('PENDING', 'Pending'),
+        ('UPLOADING', 'Uploading'),
+        ('UPLOADED', 'Uploaded'),
+        ('FAILED', 'Failed'),
+    )
+    MEDIA_TYPES = (
+        ('image', 'Image'),
+        ('3d_model', '3D Model'),
+    )
+    upload_id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
+    house = models.ForeignKey('House', on_delete=models.CASCADE, related_name='pending_media')
+    source = models.CharField(max_length=500)
+    media_type = models.CharField(max_length=20, choices=MEDIA_TYPES)
+    caption = models.CharField(max_length=255, blank=True, default='')
+    status = models.CharField(max_length=20, choices=STATUSES, default='PENDING')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    uploaded_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.media_type} for {self.house_id}: {self.source}"
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'created_at'])]
+        ordering = ['created_at']
+
+
+class ImportCheckpoint(models.Model):
+    # Last source line committed by import_houses for one import. It is
+    # written in the same transaction as the batch it covers, so a resumed
+    # import never inserts a committed batch twice.
+    name = models.CharField(max_length=500, primary_key=True)
+    line = models.PositiveIntegerField(default=0)
+    saved_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: line {self.line}"
+
+
+class WebhookEvent(models.Model):
+    # Inbox of payment webhooks. The webhook view only inserts here; the
+    # process_webhooks worker applies events in arrival order per reference.
+    STATES = (
+        ('PENDING', 'Pending'),
+        ('PROCESSED', 'Processed'),
+        ('FAILED', 'Failed'),
+    )
+    event_id = models.BigAutoField(primary_key=True)
+    reference = models.CharField(max_length=100)
+    status = models.CharField(max_length=20)
+    payload = models.JSONField(default=dict)
+    state = models.CharField(max_length=20, choices=STATES, default='PENDING')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    received_at = models.DateTimeField(auto_now_add=True)
+    available_at = models.DateTimeField(default=timezone.now)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.reference} {self.status} ({self.state})"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['reference', 'status'], name='unique_webhook_reference_status'),
+        ]
+        indexes = [models.Index(fields=['state', 'event_id'])]
+        ordering = ['event_id']
+
+
+class MapCluster(models.Model):
+    # Per-cell marker aggregates for the coarse map zoom levels, kept up to
+    # date by clusters.fold_changes. Cells are the clusters.cell_for grid.
+    zoom = models.PositiveSmallIntegerField()
+    cell_x = models.IntegerField()
+    cell_y = models.IntegerField()
+    count = models.PositiveIntegerField(default=0)
+    lat_sum = models.FloatField(default=0)
+    lng_sum = models.FloatField(default=0)
+    min_price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    def __str__(self):
+        return f"z{self.zoom} ({self.cell_x}, {self.cell_y}): {self.count}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['zoom', 'cell_x', 'cell_y'], name='unique_map_cluster_cell'),
+        ]
+
+
+class MapClusterChange(models.Model):
+    # A house point entering (sign 1) or leaving (sign -1) the map, queued by
+    # the house signals until clusters.fold_changes applies it to MapCluster.
+    change_id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
+    lat = models.FloatField()
+    lng = models.FloatField()
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    sign = models.SmallIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{'+' if self.sign > 0 else '-'}({self.lat}, {self.lng}) {self.price}"
+
+
+class SavedSearch(models.Model):
+    # A student's standing query. Every criterion is optional; the radius
+    # filter needs lat, lng and radius_km together.
+    search_id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
+    user = models.ForeignKey('User', on_delete=models.CASCADE, related_name='saved_searches')
+    name = models.CharField(max_length=100, blank=True, default='')
+    room_type = models.CharField(max_length=20, choices=House.ROOM_TYPES, null=True, blank=True)
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    lat = models.FloatField(null=True, blank=True, validators=[MinValueValidator(-90), MaxValueValidator(90)])
+    lng = models.FloatField(null=True, blank=True, validators=[MinValueValidator(-180), MaxValueValidator(180)])
+    radius_km = models.FloatField(null=True, blank=True, validators=[MinValueValidator(0.1)])
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.user} - {self.name or self.search_id}"
+
+    class Meta:
+        ordering = ['created_at']
+
+
+class SavedSearchIndex(models.Model):
+    # Inverted index over saved searches: one row per (room type, price
+    # bucket, geo cell) key a search covers, '*' / -1 meaning any. Rebuilt
+    # by alerts.index_search whenever a search is saved.
+    search = models.ForeignKey('SavedSearch', on_delete=models.CASCADE, related_name='index_entries')
+    room_type = models.CharField(max_length=20)
+    price_bucket = models.SmallIntegerField()
+    geo_cell = models.CharField(max_length=20)
+
+    class Meta:
+        indexes = [models.Index(fields=['room_type', 'price_bucket', 'geo_cell'])]
+
+
+class SearchAlert(models.Model):
+    # Notification queue: a new house that matched a saved search, waiting
+    # for send_search_alerts. claimed_at is set while a sender is emailing
+    # it.
+    alert_id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
+    search = models.ForeignKey('SavedSearch', on_delete=models.CASCADE, related_name='alerts')
+    house = models.ForeignKey('House', on_delete=models.CASCADE, related_name='search_alerts')
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['search', 'house'], name='unique_search_alert'),
+        ]
+        indexes = [models.Index(fields=['sent_at', 'created_at'])]
+        ordering = ['created_at']
+
+
+class MediaAsset(models.Model):
+    # Content-addressed index of uploaded media: the sha256 of the bytes and
+    # resource type map to the remote URL so identical files are uploaded
+    # once. hit_count counts uploads that reused the URL.
+    asset_id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
+    sha256 = models.CharField(max_length=64)
+    resource_type = models.CharField(max_length=20)
+    url = models.URLField(max_length=500)
+    size = models.PositiveBigIntegerField(default=0)
+    hit_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.sha256[:12]} {self.url}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['sha256', 'resource_type'], name='unique_media_asset_content'),
+        ]
+
+
+class ModelUpload(models.Model):
+    # A resumable 3D model upload. Chunks are appended to a staging file at
+    # `offset`; once `size` bytes have arrived the model is validated, sent to
+    # the media store and added to the house's media. RECEIVING marks a chunk
+    # being written.
+    STATES = (
+        ('UPLOADING', 'Uploading'),
+        ('RECEIVING', 'Receiving a chunk'),
+        ('PROCESSING', 'Processing'),
+        ('COMPLETE', 'Complete'),
+        ('FAILED', 'Failed'),
+    )
+    upload_id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
+    house = models.ForeignKey('House', on_delete=models.CASCADE, related_name='model_uploads')
+    user = models.ForeignKey('User', on_delete=models.SET_NULL, null=True, blank=True, related_name='model_uploads')
+    filename = models.CharField(max_length=255)
+    caption = models.CharField(max_length=255, blank=True, default='')
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    state = models.CharField(max_length=20, choices=STATES, default='UPLOADING')
+    error = models.TextField(blank=True, default='')
+    file_url = models.URLField(max_length=500, blank=True, default='')
+    metadata = JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.filename} for {self.house_id}: {self.offset}/{self.size}"
+
+    class Meta:
+        indexes = [models.Index(fields=['state', 'updated_at'])]
+        ordering = ['created_at']
+
+
+class HistoryArchive(models.Model):
+    # Manifest of a gzip NDJSON file written by archive_history: the rows of
+    # one kind from one month that were moved out of the database.
+    KINDS = (
+        ('transaction', 'Transactions'),
+        ('reservation', 'Reservations'),
+    )
+    archive_id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
+    kind = models.CharField(max_length=20, choices=KINDS)
+    period_start = models.DateTimeField()
+    period_end = models.DateTimeField()
+    path = models.CharField(max_length=500)
+    rows = models.PositiveIntegerField()
+    size = models.PositiveBigIntegerField()
+    sha256 = models.CharField(max_length=64)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.kind} {self.period_start:%Y-%m}: {self.rows} rows"
+
+    class Meta:
+        indexes = [models.Index(fields=['kind', 'period_start'])]
+        ordering = ['period_start']
+
+
+class DailyRevenue(models.Model):
+    # Revenue rollup: settled payments per day of payment_date (in
+    # TIME_ZONE) and transaction type, kept up to date by
+    # apply_payment_status. The admin analytics page reads only the rollup
+    # tables; rebuild_rollups recounts them from the source rows.
+    day = models.DateField()
+    transaction_type = models.CharField(max_length=25, choices=Transaction.TRANSACTION_TYPES)
+    amount = models.DecimalField(max_digits=16, decimal_places=2, default=Decimal('0'))
+    payments = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.day} {self.transaction_type}: {self.amount}"
+
+    @classmethod
+    def record(cls, day, transaction_type, amount, payments=1):
+        # Same upsert as HouseSaveCounter.increment. A negative amount and
+        # payments take a payment back out.
+        changes = {'amount': F('amount') + amount, 'payments': F('payments') + payments}
+        if cls.objects.filter(day=day, transaction_type=transaction_type).update(**changes):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(day=day, transaction_type=transaction_type, amount=amount, payments=payments)
+        except IntegrityError:
+            cls.objects.filter(day=day, transaction_type=transaction_type).update(**changes)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['transaction_type', 'day'], name='unique_daily_revenue'),
+        ]
+        ordering = ['day', 'transaction_type']
+
+
+class DailyOccupancy(models.Model):
+    # Reservation rollup per day (in TIME_ZONE) and room type: reservations
+    # started and expired that day, and the active reservations and listed
+    # houses as of the day's last change. Days without changes have no row;
+    # readers carry active and listed forward from the previous row.
+    day = models.DateField()
+    room_type = models.CharField(max_length=20, choices=House.ROOM_TYPES)
+    started = models.IntegerField(default=0)
+    expired = models.IntegerField(default=0)
+    active = models.IntegerField(default=0)
+    listed = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.day} {self.room_type}: {self.active}/{self.listed}"
+
+    @classmethod
+    def record(cls, room_type, started=0, expired=0, ended=0, listed=0):
+        # Same upsert as HouseSaveCounter.increment. active moves by
+        # started - expired - ended (ended: deactivated or deleted other than
+        # by expiry) and listed by the given delta. A day's first row starts
+        # the gauges from the previous row, read with a lock so a writer
+        # still updating that row is waited for.
+        day = timezone.localdate()
+        active = started - expired - ended
+        changes = {
+            'started': F('started') + started,
+            'expired': F('expired') + expired,
+            'active': F('active') + active,
+            'listed': F('listed') + listed,
+        }
+        if cls.objects.filter(day=day, room_type=room_type).update(**changes):
+            return
+        try:
+            with transaction.atomic():
+                previous = (
+                    cls.objects.select_for_update().filter(room_type=room_type, day__lt=day)
+                    .order_by('-day').values_list('active', 'listed').first()
+                ) or (0, 0)
+                cls.objects.create(
+                    day=day, room_type=room_type, started=started, expired=expired,
+                    active=previous[0] + active, listed=previous[1] + listed,
+                )
+        except IntegrityError:
+            cls.objects.filter(day=day, room_type=room_type).update(**changes)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['room_type', 'day'], name='unique_daily_occupancy'),
+        ]
+        ordering = ['day', 'room_type']
@@ -0,0 +1,89 @@
+import csv
+import time
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from .hashing import hash_passwords
+from .models import User
+from .serializers import RosterUserSerializer
+
+ROSTER_FIELDS = ('username', 'email', 'phone_number', 'password')
+
+
+def read_roster_csv(stream):
+    return [
+        {field: (row.get(field) or '').strip() for field in ROSTER_FIELDS}
+        for row in csv.DictReader(stream)
+    ]
+
+
+def _insert(users, results):
+    try:
+        with transaction.atomic():
+            User.objects.bulk_create([user for _, user in users])
+        for index, user in users:
+            results[index].update(status='created', user_id=str(user.user_id))
+        return
+    except IntegrityError:
+        pass
+    # Someone registered one of these usernames or emails since the check;
+    # retry row by row so only the conflicting rows fail.
+    for index, user in users:
+        try:
+            with transaction.atomic():
+                user.save(force_insert=True)
+            results[index].update(status='created', user_id=str(user.user_id))
+        except IntegrityError:
+            results[index].update(status='error', errors={'non_field_errors': ['Username or email already exists']})
+
+
+def onboard_users(rows, batch_size=500):
+    started = time.perf_counter()
+    results = [{'row': index, 'username': row.get('username'), 'status': None} for index, row in enumerate(rows)]
+    valid = []
+    for index, row in enumerate(rows):
+        serializer = RosterUserSerializer(data=row)
+        if serializer.is_valid():
+            data = serializer.validated_data
+            data['username'] = User.normalize_username(data['username'])
+            data['email'] = User.objects.normalize_email(data['email'])
+            valid.append((index, data))
+        else:
+            results[index].update(status='error', errors=serializer.errors)
+
+    usernames = {data['username'] for _, data in valid}
+    emails = {data['email'] for _, data in valid}
+    taken_usernames, taken_emails = set(), set()
+    for username, email in User.objects.filter(Q(username__in=usernames) | Q(email__in=emails)).values_list('username', 'email'):
+        taken_usernames.add(username)
+        taken_emails.add(email)
+
+    accepted = []
+    for index, data in valid:
+        errors = {}
+        if data['username'] in taken_usernames:
+            errors['username'] = ['Username already exists']
+        if data['email'] in taken_emails:
+            errors['email'] = ['Email already exists']
+        if errors:
+            results[index].update(status='error', errors=errors)
+            continue
+        # Later rows with the same username or email as an earlier one fail.
+        taken_usernames.add(data['username'])
+        taken_emails.add(data['email'])
+        accepted.append((index, data))
+
+    hashes = hash_passwords(data['password'] for _, data in accepted)
+    users = []
+    for (index, data), password in zip(accepted, hashes):
+        data = {key: value for key, value in data.items() if key != 'password'}
+        users.append((index, User(password=password, **data)))
+    for start in range(0, len(users), batch_size):
+        _insert(users[start:start + batch_size], results)
+
+    created = sum(1 for result in results if result['status'] == 'created')
+    return {
+        'created': created,
+        'failed': len(results) - created,
+        'elapsed_seconds': round(time.perf_counter() - started, 3),
+        'results': results,
+    }
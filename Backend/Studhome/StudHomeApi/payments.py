@@ -0,0 +1,93 @@
+import logging
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db import transaction as db_transaction
+from django.utils import timezone
+from .models import DailyRevenue, Reservation, Transaction
+
+logger = logging.getLogger(__name__)
+
+
+def send_reservation_approved(transaction, reservation):
+    send_mail(
+        subject="Payment Approved for Your Reservation",
+        message=(
+            f"Dear {transaction.user.username},\n\n"
+            f"Your payment of {transaction.amount_paid} XAF for reservation {reservation.reservation_id} "
+            f"(House: {transaction.house.house_name}) has been approved.\n\n"
+            f"Thank you for booking with StudHome!\n\nBest regards,\nStudHome Team"
+        ),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        recipient_list=[transaction.user.email],
+        fail_silently=False,
+    )
+
+
+def send_tour_approved(transaction):
+    send_mail(
+        subject="Payment Approved for Your Tour",
+        message=(
+            f"Dear {transaction.user.username},\n\n"
+            f"Your payment of {transaction.amount_paid} XAF for booking a tour "
+            f"of house '{transaction.house.house_name}' has been approved.\n\n"
+            f"Thank you for using StudHome!\n\nBest regards,\nStudHome Team"
+        ),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        recipient_list=[transaction.user.email],
+        fail_silently=False,
+    )
+
+
+def record_revenue(transaction, previous, payment_status):
+    # Payments count on the day they were initiated, so rebuild_rollups gets
+    # the same numbers from payment_date. A successful payment that is later
+    # reversed is taken back out.
+    day = timezone.localdate(transaction.payment_date)
+    if payment_status == 'SUCCESSFUL':
+        DailyRevenue.record(day, transaction.transaction_type, transaction.amount_paid)
+    elif previous == 'SUCCESSFUL':
+        DailyRevenue.record(day, transaction.transaction_type, -transaction.amount_paid, payments=-1)
+
+
+def send_approval_once(transaction, send):
+    # The transaction is marked before sending so that concurrent callers
+    # (verification and the webhook worker) don't both send, and unmarked
+    # again if sending fails so the next status update retries it.
+    if not Transaction.objects.filter(pk=transaction.pk, approval_sent_at__isnull=True).update(approval_sent_at=timezone.now()):
+        return
+    try:
+        send()
+    except Exception:
+        Transaction.objects.filter(pk=transaction.pk).update(approval_sent_at=None)
+        raise
+
+
+def apply_payment_status(transaction, payment_status):
+    # Shared by payment verification and the webhook worker. The status is
+    # read under a row lock and written in the same database transaction as
+    # the revenue rollup, so only the call that moves the transaction to a
+    # new status counts it. The reservation claim is idempotent and is made
+    # before the approval email, which goes out once and is retried by a
+    # repeated call if sending failed. Returns False when a successful
+    # reserve payment lost its house to another user; the transaction is
+    # then flagged needs_refund.
+    with db_transaction.atomic():
+        previous = Transaction.objects.select_for_update().filter(pk=transaction.pk).values_list('payment_status', flat=True).first()
+        changed = previous is not None and previous != payment_status
+        if changed:
+            Transaction.objects.filter(pk=transaction.pk).update(payment_status=payment_status)
+            record_revenue(transaction, previous, payment_status)
+    transaction.payment_status = payment_status
+    if payment_status != 'SUCCESSFUL':
+        return True
+    if transaction.transaction_type == 'reserve':
+        reservation, _ = Reservation.objects.claim(transaction.user, transaction.house)
+        if reservation is None:
+            logger.warning(f"Payment {transaction.payment_reference} succeeded but house {transaction.house_id} is reserved by another user")
+            Transaction.objects.filter(pk=transaction.pk).update(needs_refund=True)
+            transaction.needs_refund = True
+            return False
+        send_approval_once(transaction, lambda: send_reservation_approved(transaction, reservation))
+    elif transaction.transaction_type == 'tour':
+        send_approval_once(transaction, lambda: send_tour_approved(transaction))
+    return True
@@ -0,0 +1,146 @@
+import math
+import time
+
+# Feature weights. A unit of feature distance is roughly one doubling of
+# price, a different room type, or LOCATION_SCALE_KM kilometres.
+PRICE_WEIGHT = 1.0
+ROOM_TYPE_WEIGHT = 1.5
+LOCATION_SCALE_KM = 3.0
+COSAVE_WEIGHT = 2.0
+MAX_SAVES_PER_USER = 200
+
+
+def feature_matrix(np, prices, room_types, lats, lngs, room_choices):
+    log_price = np.log(np.maximum(prices.astype(np.float64), 1.0)) / math.log(2)
+    price = (log_price - log_price.mean()) * PRICE_WEIGHT
+    rooms = np.zeros((len(room_types), len(room_choices)))
+    index = {room: i for i, room in enumerate(room_choices)}
+    rooms[np.arange(len(room_types)), [index.get(room, 0) for room in room_types]] = ROOM_TYPE_WEIGHT / math.sqrt(2)
+    mean_lat = math.radians(float(lats.mean())) if len(lats) else 0.0
+    x = lngs * 111.32 * math.cos(mean_lat) / LOCATION_SCALE_KM
+    y = lats * 110.57 / LOCATION_SCALE_KM
+    features = np.column_stack([price, rooms, x - x.mean(), y - y.mean()])
+    return features.astype(np.float32)
+
+
+def cosave_similarity(np, user_idx, house_idx, n):
+    # Item-item cosine similarity over saves. Returns (rows, cols, values)
+    # sorted by row.
+    if len(house_idx) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros(0, dtype=np.float32)
+    order = np.lexsort((house_idx, user_idx))
+    users, items = user_idx[order], house_idx[order]
+    starts = np.flatnonzero(np.r_[True, users[1:] != users[:-1]])
+    sizes = np.diff(np.r_[starts, len(users)])
+    keep = np.repeat(sizes <= MAX_SAVES_PER_USER, sizes)
+    users, items = users[keep], items[keep]
+    starts = np.flatnonzero(np.r_[True, users[1:] != users[:-1]]) if len(users) else np.zeros(0, dtype=np.int64)
+    sizes = np.diff(np.r_[starts, len(users)])
+    per_item = np.repeat(sizes, sizes)
+    rows = np.repeat(items, per_item)
+    first = np.repeat(np.repeat(starts, sizes), per_item)
+    offsets = np.arange(len(rows)) - np.repeat(np.cumsum(per_item) - per_item, per_item)
+    cols = items[first + offsets]
+    mask = rows != cols
+    keys, counts = np.unique(rows[mask].astype(np.int64) * n + cols[mask], return_counts=True)
+    rows, cols = np.divmod(keys, n)
+    degree = np.bincount(items, minlength=n).astype(np.float64)
+    values = counts / np.sqrt(degree[rows] * degree[cols])
+    return rows, cols, values.astype(np.float32)
+
+
+def block_top_k(np, block, k, chunk=1024):
+    # Exact top-k per row without a full argpartition. The k-th largest of
+    # the per-chunk maxima is a lower bound for each row's k-th best score,
+    # so only the few values above it need sorting.
+    m, n = block.shape
+    if n < chunk * k:
+        cols = np.argpartition(-block, k - 1, axis=1)[:, :k]
+        values = np.take_along_axis(block, cols, axis=1)
+        order = np.argsort(-values, axis=1)
+        return np.take_along_axis(cols, order, axis=1), np.take_along_axis(values, order, axis=1)
+    whole = n - n % chunk
+    maxima = block[:, :whole].reshape(m, -1, chunk).max(axis=2) if whole else np.empty((m, 0), block.dtype)
+    if whole < n:
+        maxima = np.concatenate([maxima, block[:, whole:].max(axis=1, keepdims=True)], axis=1)
+    threshold = np.partition(maxima, maxima.shape[1] - k, axis=1)[:, maxima.shape[1] - k]
+    rows, cols = np.nonzero(block >= threshold[:, None])
+    values = block[rows, cols]
+    order = np.lexsort((-values, rows))
+    rows, cols, values = rows[order], cols[order], values[order]
+    picks = np.searchsorted(rows, np.arange(m))[:, None] + np.arange(k)[None, :]
+    return cols[picks], values[picks]
+
+
+def top_k_neighbours(np, features, groups, cosave, k, block_size=512):
+    # Content neighbours are searched within each room type, block by block,
+    # ranking by -squared feature distance. |f_i|^2 is constant per row, so
+    # it is only added back to the kept scores. Co-saved pairs of any room
+    # type are then merged in with a COSAVE_WEIGHT bonus.
+    n = len(features)
+    neighbours = np.full((n, k), -1, dtype=np.int64)
+    scores = np.full((n, k), -np.inf, dtype=np.float32)
+    sq = (features * features).sum(axis=1)
+    for group in np.unique(groups):
+        members = np.flatnonzero(groups == group)
+        kk = min(k, len(members) - 1)
+        if kk <= 0:
+            continue
+        doubled = 2 * features[members]
+        group_features = features[members].T.copy()
+        group_sq = sq[members]
+        buffer = np.empty((min(block_size, len(members)), len(members)), dtype=np.float32)
+        for start in range(0, len(members), block_size):
+            stop = min(start + block_size, len(members))
+            block = buffer[:stop - start]
+            np.matmul(doubled[start:stop], group_features, out=block)
+            block -= group_sq
+            block[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+            cols, values = block_top_k(np, block, kk)
+            neighbours[members[start:stop], :kk] = members[cols]
+            scores[members[start:stop], :kk] = values - group_sq[start:stop, None]
+    rows, cols, values = cosave
+    if len(rows) == 0:
+        return neighbours, scores
+    diff = features[rows] - features[cols]
+    pair_scores = -(diff * diff).sum(axis=1) + COSAVE_WEIGHT * values
+    keep = neighbours.ravel() >= 0
+    all_rows = np.concatenate([np.repeat(np.arange(n), k)[keep], rows])
+    all_cols = np.concatenate([neighbours.ravel()[keep], cols])
+    all_scores = np.concatenate([scores.ravel()[keep], pair_scores.astype(np.float32)])
+    # Keep the best score per (row, col), then the k best cols per row.
+    order = np.lexsort((-all_scores, all_cols, all_rows))
+    all_rows, all_cols, all_scores = all_rows[order], all_cols[order], all_scores[order]
+    first = np.r_[True, (all_rows[1:] != all_rows[:-1]) | (all_cols[1:] != all_cols[:-1])]
+    all_rows, all_cols, all_scores = all_rows[first], all_cols[first], all_scores[first]
+    order = np.lexsort((-all_scores, all_rows))
+    all_rows, all_cols, all_scores = all_rows[order], all_cols[order], all_scores[order]
+    rank = np.arange(len(all_rows)) - np.searchsorted(all_rows, all_rows)
+    top = rank < k
+    neighbours.fill(-1)
+    scores.fill(-np.inf)
+    neighbours[all_rows[top], rank[top]] = all_cols[top]
+    scores[all_rows[top], rank[top]] = all_scores[top]
+    return neighbours, scores
+
+
+def build_neighbours(np, houses, saves, room_choices, k, block_size=512):
+    started = time.perf_counter()
+    house_ids = [house_id for house_id, *_ in houses]
+    position = {house_id: i for i, house_id in enumerate(house_ids)}
+    prices = np.array([float(price) for _, price, _, _, _ in houses])
+    room_types = [room_type for _, _, room_type, _, _ in houses]
+    lats = np.array([lat for *_, lat, _ in houses], dtype=np.float64)
+    lngs = np.array([lng for *_, lng in houses], dtype=np.float64)
+    features = feature_matrix(np, prices, room_types, lats, lngs, room_choices)
+    user_position = {}
+    user_idx, house_idx = [], []
+    for user_id, house_id in saves:
+        if house_id in position:
+            user_idx.append(user_position.setdefault(user_id, len(user_position)))
+            house_idx.append(position[house_id])
+    cosave = cosave_similarity(np, np.array(user_idx, dtype=np.int64), np.array(house_idx, dtype=np.int64), len(houses))
+    groups = np.array([room_choices.index(room) if room in room_choices else 0 for room in room_types])
+    neighbours, scores = top_k_neighbours(np, features, groups, cosave, k, block_size)
+    return house_ids, neighbours, scores, time.perf_counter() - started
@@ -0,0 +1,36 @@
+import decimal
+from django.utils.encoding import force_str
+from django.utils.functional import Promise
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _orjson_default(obj):
+    if isinstance(obj, decimal.Decimal):
+        return str(obj) if api_settings.COERCE_DECIMAL_TO_STRING else float(obj)
+    if isinstance(obj, Promise):
+        return force_str(obj)
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    raise TypeError
+
+
+class FastJSONRenderer(JSONRenderer):
+    # Uses orjson when it is installed and falls back to DRF's encoder for
+    # anything orjson can't handle (indented output, exotic types).
+    options = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS if orjson else 0
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type or '', renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            return orjson.dumps(data, default=_orjson_default, option=self.options)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
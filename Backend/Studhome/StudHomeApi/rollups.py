@@ -0,0 +1,171 @@
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .models import DailyOccupancy, DailyRevenue, HistoryArchive, House, HouseCard, Reservation, Transaction
+
+# Daily rollups behind the admin analytics page. DailyRevenue and
+# DailyOccupancy are maintained by apply_payment_status and the reservation
+# manager; the dashboard reads nothing else, so its cost depends on the
+# window, not on the size of the history. rebuild_rollups recounts them from
+# the source rows, which archive_history eventually deletes.
+
+DASHBOARD_WINDOWS = (7, 30, 90, 365)
+
+TRANSACTION_TYPES = [value for value, _ in Transaction.TRANSACTION_TYPES]
+ROOM_TYPES = [value for value, _ in House.ROOM_TYPES]
+
+
+def day_range(start, end):
+    # Aware datetimes bounding the days start..end inclusive.
+    tz = timezone.get_current_timezone()
+    return (
+        datetime.datetime.combine(start, datetime.time.min, tzinfo=tz),
+        datetime.datetime.combine(end + datetime.timedelta(days=1), datetime.time.min, tzinfo=tz),
+    )
+
+
+def rebuild_floor(kind):
+    # First day whose source rows haven't been archived, or None if nothing
+    # of that kind was archived yet. Earlier rollups can't be recounted.
+    end = HistoryArchive.objects.filter(kind=kind).order_by('-period_end').values_list('period_end', flat=True).first()
+    return timezone.localdate(end) if end else None
+
+
+def rebuild_revenue(start, end):
+    since, until = day_range(start, end)
+    with transaction.atomic():
+        DailyRevenue.objects.filter(day__gte=start, day__lte=end).delete()
+        totals = (
+            Transaction.objects.filter(payment_status='SUCCESSFUL', payment_date__gte=since, payment_date__lt=until)
+            .annotate(day=TruncDate('payment_date'))
+            .values('day', 'transaction_type')
+            .annotate(amount=Sum('amount_paid'), payments=Count('pk'))
+            .order_by()
+        )
+        rows = DailyRevenue.objects.bulk_create([
+            DailyRevenue(day=total['day'], transaction_type=total['transaction_type'], amount=total['amount'], payments=total['payments'])
+            for total in totals
+        ])
+    return len(rows)
+
+
+def rebuild_occupancy(start, end):
+    # Release times aren't stored, so a released reservation counts as
+    # active until the day its expiry_date falls on and as expired that day.
+    # Historical listed counts aren't known either: rows recorded live keep
+    # theirs, others get today's count.
+    since, until = day_range(start, end)
+    now = timezone.now()
+    started = defaultdict(int)
+    expired = defaultdict(int)
+    active = defaultdict(int)
+    reservations = (
+        Reservation.objects.filter(reservation_date__lt=until)
+        .filter(Q(is_active=True) | Q(expiry_date__gte=since))
+        .values_list('house__room_type', 'reservation_date', 'expiry_date', 'is_active')
+    )
+    for room_type, reserved_at, expires_at, is_active in reservations.iterator(chunk_size=2000):
+        first = timezone.localdate(reserved_at)
+        if first >= start:
+            started[room_type, first] += 1
+        if is_active:
+            last = end
+        else:
+            ended = timezone.localdate(min(expires_at, now))
+            if expires_at <= now and start <= ended <= end:
+                expired[room_type, ended] += 1
+            last = ended - datetime.timedelta(days=1)
+        day = max(first, start)
+        while day <= min(last, end):
+            active[room_type, day] += 1
+            day += datetime.timedelta(days=1)
+
+    listed_now = dict(
+        HouseCard.objects.filter(remove=False).values('room_type').annotate(total=Count('pk')).values_list('room_type', 'total')
+    )
+    with transaction.atomic():
+        existing = DailyOccupancy.objects.filter(day__gte=start, day__lte=end)
+        listed = {(row.room_type, row.day): row.listed for row in existing}
+        existing.delete()
+        rows = []
+        day = start
+        while day <= end:
+            for room_type in ROOM_TYPES:
+                rows.append(DailyOccupancy(
+                    day=day,
+                    room_type=room_type,
+                    started=started[room_type, day],
+                    expired=expired[room_type, day],
+                    active=active[room_type, day],
+                    listed=listed.get((room_type, day), listed_now.get(room_type, 0)),
+                ))
+            day += datetime.timedelta(days=1)
+        DailyOccupancy.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def dashboard(days):
+    # Everything the analytics page shows for the last `days` days, newest
+    # first, read from the rollup tables only.
+    end = timezone.localdate()
+    start = end - datetime.timedelta(days=days - 1)
+    revenue = defaultdict(lambda: {'amount': Decimal('0'), 'payments': 0})
+    for row in DailyRevenue.objects.filter(day__gte=start, day__lte=end):
+        revenue[row.day, row.transaction_type] = {'amount': row.amount, 'payments': row.payments}
+    occupancy = {(row.room_type, row.day): row for row in DailyOccupancy.objects.filter(day__gte=start, day__lte=end)}
+    # Gauges carried into the window from the last row before it.
+    gauges = {}
+    for room_type in ROOM_TYPES:
+        previous = DailyOccupancy.objects.filter(room_type=room_type, day__lt=start).order_by('-day').first()
+        gauges[room_type] = (previous.active, previous.listed) if previous else (0, 0)
+
+    rows = []
+    day = start
+    while day <= end:
+        row = {'day': day, 'revenue': [], 'total': Decimal('0'), 'payments': 0, 'started': 0, 'expired': 0, 'active': 0, 'listed': 0}
+        for transaction_type in TRANSACTION_TYPES:
+            amount = revenue[day, transaction_type]['amount']
+            row['revenue'].append(amount)
+            row['total'] += amount
+            row['payments'] += revenue[day, transaction_type]['payments']
+        for room_type in ROOM_TYPES:
+            stats = occupancy.get((room_type, day))
+            if stats is not None:
+                row['started'] += stats.started
+                row['expired'] += stats.expired
+                gauges[room_type] = (stats.active, stats.listed)
+            row['active'] += gauges[room_type][0]
+            row['listed'] += gauges[room_type][1]
+        row['occupancy'] = occupancy_rate(row['active'], row['listed'])
+        rows.append(row)
+        day += datetime.timedelta(days=1)
+
+    peak = max((row['total'] for row in rows), default=0)
+    for row in rows:
+        row['bar'] = int(row['total'] * 100 / peak) if peak else 0
+    rows.reverse()
+    return {
+        'start': start,
+        'end': end,
+        'days': rows,
+        'revenue': [
+            (label, sum((revenue[row['day'], value]['amount'] for row in rows), Decimal('0')))
+            for value, label in Transaction.TRANSACTION_TYPES
+        ],
+        'total': sum((row['total'] for row in rows), Decimal('0')),
+        'payments': sum(row['payments'] for row in rows),
+        'started': sum(row['started'] for row in rows),
+        'expired': sum(row['expired'] for row in rows),
+        'rooms': [
+            (label, gauges[value][0], gauges[value][1], occupancy_rate(*gauges[value]))
+            for value, label in House.ROOM_TYPES
+        ],
+    }
+
+
+def occupancy_rate(active, listed):
+    return round(active * 100 / listed, 1) if listed else None
@@ -1,5 +1,6 @@
+from django.conf import settings
 from rest_framework import serializers
-from .models import House, Transaction, Reservation, User, SavedHome
+from .models import House, ModelUpload, Transaction, Reservation, User, SavedHome, SavedSearch
 from django.db.models import Q
 
 class HouseSerializer(serializers.ModelSerializer):
@@ -35,16 +36,128 @@ class ReservationSerializer(serializers.ModelSerializer):
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
-        fields = ['user_id', 'username', 'email', 'phone_number']
+        fields = ['user_id', 'username', 'email', 'phone_number', 'password']
         extra_kwargs = {'password': {'write_only': True}}
 
     def create(self, validated_data):
-        user = User.objects.create_user(**validated_data)
+        password = validated_data.pop('password')
+        user = User(**validated_data)
+        user.username = User.normalize_username(user.username)
+        user.email = User.objects.normalize_email(user.email)
+        user.set_password(password)
+        user.save()
         return user
 
+class RosterUserSerializer(UserSerializer):
+    # Field validation only. Roster onboarding checks uniqueness for the
+    # whole roster in one query and lets the database settle races.
+    class Meta(UserSerializer.Meta):
+        extra_kwargs = {
+            'password': {'write_only': True},
+            'username': {'validators': []},
+            'email': {'validators': []},
+        }
+
+class HouseIdListSerializer(serializers.Serializer):
+    house_ids = serializers.ListField(
+        child=serializers.UUIDField(),
+        allow_empty=False,
+        max_length=settings.SAVED_HOMES_BULK_LIMIT,
+    )
+
 class SavedHomeSerializer(serializers.ModelSerializer):
     house = HouseSerializer(read_only=True)
 
     class Meta:
         model = SavedHome
-        fields = ['house']
\ No newline at end of file
+        fields = ['house']
+
+class ModelUploadSerializer(serializers.ModelSerializer):
+    max_chunk_size = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ModelUpload
+        fields = ['upload_id', 'house', 'filename', 'caption', 'size', 'offset', 'state', 'error', 'file_url', 'metadata', 'max_chunk_size', 'created_at']
+        read_only_fields = fields
+
+    def get_max_chunk_size(self, obj):
+        return settings.MODEL_UPLOAD_MAX_CHUNK_SIZE
+
+class SavedSearchSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SavedSearch
+        fields = ['search_id', 'name', 'room_type', 'min_price', 'max_price', 'lat', 'lng', 'radius_km', 'created_at']
+
+    def validate(self, data):
+        location = [data.get(field, getattr(self.instance, field, None)) for field in ('lat', 'lng', 'radius_km')]
+        if any(value is not None for value in location) and any(value is None for value in location):
+            raise serializers.ValidationError('lat, lng and radius_km must be given together')
+        radius = location[2]
+        if radius is not None and radius > settings.SAVED_SEARCH_MAX_RADIUS_KM:
+            raise serializers.ValidationError(f'radius_km can be at most {settings.SAVED_SEARCH_MAX_RADIUS_KM}')
+        min_price = data.get('min_price', getattr(self.instance, 'min_price', None))
+        max_price = data.get('max_price', getattr(self.instance, 'max_price', None))
+        if min_price is not None and max_price is not None and min_price > max_price:
+            raise serializers.ValidationError('min_price cannot be greater than max_price')
+        return data
+
+# Read-only fast path: builds the same payloads as the serializers above
+# straight from .values() rows, without instantiating model objects.
+
+HOUSE_CARD_FIELDS = ('house_id', 'house_name', 'room_type', 'lat', 'lng', 'price', 'cover_url', 'is_reserved', 'saved_count')
+HOUSE_FIELDS = ('house_id', 'house_name', 'room_type', 'lat', 'lng', 'media', 'is_reserved', 'price', 'description')
+TRANSACTION_FIELDS = ('transaction_id', 'transaction_type', 'amount_paid', 'payment_date', 'payment_status', 'payment_reference')
+
+def active_reservation_holders(house_ids):
+    holders = {}
+    reservations = Reservation.objects.filter(house_id__in=house_ids, is_active=True).order_by('house_id', '-reservation_date')
+    for house_id, user_id in reservations.values_list('house_id', 'user_id'):
+        holders.setdefault(house_id, user_id)
+    return holders
+
+def house_card_rows(queryset, user=None, full=False):
+    # full adds the HouseSerializer fields, media, description (cut to an
+    # excerpt) and reservation_status, so /api/houses/ keeps its original
+    # shape. Everything but the reservation holders comes from the card.
+    rows = list(queryset.values(*HOUSE_CARD_FIELDS, *(('media', 'description') if full else ())))
+    authenticated = user is not None and user.is_authenticated
+    house_ids = [row['house_id'] for row in rows]
+    saved = set()
+    if authenticated and rows:
+        saved = set(SavedHome.objects.filter(user=user, house_id__in=house_ids).values_list('house_id', flat=True))
+    holders = active_reservation_holders(house_ids) if full and rows else {}
+    for row in rows:
+        row['price'] = str(row['price'])
+        row['is_saved'] = row['house_id'] in saved
+        if full:
+            holder = holders.get(row['house_id'])
+            row['reservation_status'] = {
+                'is_reserved': holder is not None,
+                'reserved_by_user': holder is not None and authenticated and holder == user.pk,
+            }
+    return rows
+
+def transaction_rows(queryset, user=None):
+    rows = queryset.values(*TRANSACTION_FIELDS, *('house__' + field for field in HOUSE_FIELDS))
+    rows = list(rows)
+    holders = active_reservation_holders({row['house__house_id'] for row in rows})
+    user_id = user.pk if user is not None and user.is_authenticated else None
+    result = []
+    for row in rows:
+        house = {field: row['house__' + field] for field in HOUSE_FIELDS}
+        house['price'] = str(house['price'])
+        holder = holders.get(house['house_id'])
+        house['reservation_status'] = {
+            'is_reserved': holder is not None,
+            'reserved_by_user': holder is not None and user_id is not None and holder == user_id,
+        }
+        result.append({
+            'transaction_id': row['transaction_id'],
+            'house': house,
+            'transaction_type': row['transaction_type'],
+            'amount_paid': str(row['amount_paid']),
+            'payment_date': row['payment_date'],
+            'payment_status': row['payment_status'],
+            'payment_reference': row['payment_reference'],
+        })
+    return result
@@ -0,0 +1,93 @@
+from collections import Counter
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+from django.db import transaction
+from . import alerts, clusters
+from .models import DailyOccupancy, House, HouseCard, HouseSaveCounter, HouseTombstone, Reservation, SavedHome
+
+
+def record_listings(deltas):
+    # {room_type: change in listed houses} for the occupancy rollup.
+    for room_type, delta in sorted(deltas.items()):
+        if delta:
+            DailyOccupancy.record(room_type, listed=delta)
+
+
+def sync_bulk_created_houses(houses):
+    # bulk_create() doesn't send post_save, so bulk writers call this instead.
+    houses = list(houses)
+    HouseCard.objects.bulk_create([HouseCard.build_for_new(house) for house in houses])
+    clusters.queue_changes(added=[clusters.card_point(house.lat, house.lng, house.price, house.remove) for house in houses])
+    record_listings(Counter(house.room_type for house in houses if not house.remove))
+    transaction.on_commit(lambda: alerts.match_houses(houses))
+
+
+@receiver(post_save, sender=House)
+def house_saved(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        transaction.on_commit(lambda: alerts.match_houses([instance]))
+    old = HouseCard.objects.filter(house_id=instance.pk).values_list('lat', 'lng', 'price', 'remove', 'room_type').first()
+    card = HouseCard.refresh(instance)
+    old_point = clusters.card_point(*old[:4]) if old else None
+    new_point = clusters.card_point(card.lat, card.lng, card.price, card.remove)
+    if old_point != new_point:
+        clusters.queue_changes(removed=[old_point], added=[new_point])
+    listings = Counter()
+    if old and not old[3]:
+        listings[old[4]] -= 1
+    if not card.remove:
+        listings[card.room_type] += 1
+    record_listings(listings)
+
+
+@receiver(post_delete, sender=House)
+def house_deleted(sender, instance, **kwargs):
+    HouseTombstone.objects.bulk_create([HouseTombstone(house_id=instance.house_id)], ignore_conflicts=True)
+    clusters.queue_changes(removed=[clusters.card_point(instance.lat, instance.lng, instance.price, instance.remove)])
+    if not instance.remove:
+        record_listings({instance.room_type: -1})
+
+
+@receiver(pre_save, sender=Reservation)
+def reservation_saving(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        return
+    instance._was_active = Reservation.objects.filter(pk=instance.pk).values_list('is_active', flat=True).first()
+
+
+@receiver(post_save, sender=Reservation)
+@receiver(post_delete, sender=Reservation)
+def reservation_changed(sender, instance, raw=False, signal=None, **kwargs):
+    if raw:
+        return
+    if signal is post_delete:
+        was_active, is_active = instance.is_active, False
+    else:
+        was_active, is_active = getattr(instance, '_was_active', False), instance.is_active
+    # Deactivating or deleting the last active reservation, e.g. in the
+    # admin, frees the house.
+    if not is_active:
+        Reservation.objects.free_houses([instance.house_id])
+    HouseCard.refresh_reserved(instance.house_id)
+    # release_expired updates in bulk and counts expiries itself.
+    if bool(was_active) != is_active:
+        room_type = House.objects.filter(house_id=instance.house_id).values_list('room_type', flat=True).first()
+        if room_type is not None:
+            DailyOccupancy.record(room_type, started=int(is_active), ended=int(bool(was_active)))
+
+
+@receiver(post_save, sender=SavedHome)
+def saved_home_created(sender, instance, created, raw=False, **kwargs):
+    if raw or not created:
+        return
+    HouseSaveCounter.increment(instance.house_id, 1)
+
+
+@receiver(post_delete, sender=SavedHome)
+def saved_home_deleted(sender, instance, origin=None, **kwargs):
+    # When the house itself is being deleted its counters go with it.
+    if isinstance(origin, House) or getattr(origin, 'model', None) is House:
+        return
+    HouseSaveCounter.increment(instance.house_id, -1)
@@ -0,0 +1,83 @@
+import base64
+import binascii
+import uuid
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from .models import House, HouseTombstone
+from .serializers import HOUSE_FIELDS
+
+# Delta sync for the mobile app's offline catalogue. A sync token is an
+# opaque (timestamp, house_id) cursor over House.updated_at and
+# HouseTombstone.deleted_at; both feeds are paged in that key order.
+
+LAST_ID = uuid.UUID(int=(1 << 128) - 1)
+
+
+class SyncTokenError(ValueError):
+    pass
+
+
+class SyncTokenExpired(Exception):
+    pass
+
+
+def encode_token(moment, house_id):
+    raw = f'{moment.isoformat()}|{house_id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_token(token):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        moment, house_id = raw.split('|')
+        moment = datetime.fromisoformat(moment)
+        house_id = uuid.UUID(house_id)
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        raise SyncTokenError('Invalid sync token')
+    if timezone.is_naive(moment):
+        raise SyncTokenError('Invalid sync token')
+    return moment, house_id
+
+
+def house_changes(token=None, limit=None):
+    limit = limit or settings.HOUSE_SYNC_PAGE_SIZE
+    now = timezone.now()
+    # Rows whose timestamp is this recent may still belong to transactions
+    # that haven't committed; leave them for the next sync.
+    horizon = now - timedelta(seconds=settings.HOUSE_SYNC_LAG_SECONDS)
+    houses = House.objects.filter(updated_at__lte=horizon)
+    if token is None:
+        houses = houses.filter(remove=False)
+        tombstones = HouseTombstone.objects.none()
+    else:
+        moment, house_id = decode_token(token)
+        if moment < now - timedelta(days=settings.HOUSE_TOMBSTONE_RETENTION_DAYS):
+            raise SyncTokenExpired()
+        houses = houses.filter(Q(updated_at__gt=moment) | Q(updated_at=moment, house_id__gt=house_id))
+        tombstones = HouseTombstone.objects.filter(deleted_at__lte=horizon).filter(
+            Q(deleted_at__gt=moment) | Q(deleted_at=moment, house_id__gt=house_id)
+        )
+
+    house_rows = houses.order_by('updated_at', 'house_id').values(*HOUSE_FIELDS, 'remove', 'updated_at')[:limit + 1]
+    tombstone_rows = tombstones.order_by('deleted_at', 'house_id').values_list('deleted_at', 'house_id')[:limit + 1]
+    entries = sorted(
+        [((row['updated_at'], row['house_id']), row) for row in house_rows]
+        + [((deleted_at, house_id), None) for deleted_at, house_id in tombstone_rows],
+        key=lambda entry: entry[0],
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    changes = []
+    for (moment, house_id), row in entries:
+        if row is None or row['remove']:
+            changes.append({'house_id': house_id, 'removed': True, 'updated_at': moment})
+            continue
+        del row['remove']
+        row['price'] = str(row['price'])
+        row['removed'] = False
+        changes.append(row)
+    next_token = encode_token(*entries[-1][0]) if has_more else encode_token(horizon, LAST_ID)
+    return {'changes': changes, 'next': next_token, 'has_more': has_more}
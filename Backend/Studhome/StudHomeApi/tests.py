@@ -1,3 +1,1425 @@
-from django.test import TestCase
+import csv
+import hashlib
+import io
+import itertools
+import json
+import os
+import shutil
+import stat
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, connections, transaction
+from django.db.models import Q
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from . import alerts, clusters, hashing, history, ids, importer, loadtest, onboarding, payments, recommendations, rollups
+from .admin import EstimatedCountPaginator
+from .backends import BackendError, BaseMediaStore, BasePaymentGateway, CamPayGateway, FakeEmailBackend, FakeMediaStore, FakePaymentGateway
+from .clients import get_media_store, get_payment_gateway
+from .exports import ExportFilterError, parse_export_bound
+from .management.commands.bench_startup import Command as BenchStartupCommand
+from .media import media_stats, upload_deduplicated
+from .model_lods import OptimizerUnavailable, find_tool
+from .model_uploads import ModelUploadError, gltf_metadata, write_chunk
+from .models import (
+    DailyOccupancy, DailyRevenue, HistoryArchive, House, HouseCard, HouseSaveCounter, ImportCheckpoint, MapCluster, MapClusterChange, MediaAsset, ModelUpload, PendingMediaUpload, Reservation, SavedHome,
+    SavedSearch, SearchAlert, Transaction, User, WebhookEvent,
+)
+from .renderers import FastJSONRenderer
+from .serializers import TransactionSerializer, transaction_rows
+from .sync import encode_token, house_changes
+from .throttling import BaseStore, CoalescingTimeout, InMemoryStore, LockTimeout, TokenBucket, run_once
+from .webhooks import WebhookProcessor, process_event, record_webhook, sign_webhook_payload, verify_webhook_signature
 
-# Create your tests here.
+FAKE_BACKENDS = {
+    'PAYMENT_GATEWAY': 'StudHomeApi.backends.FakePaymentGateway',
+    'MEDIA_STORE': 'StudHomeApi.backends.FakeMediaStore',
+    'EMAIL_BACKEND': 'django.core.mail.backends.locmem.EmailBackend',
+    'FAKE_PAYMENT_WEBHOOK_DELAY': -1,
+    'FAKE_PAYMENT_SETTLE_AFTER': 0,
+    'FAKE_BACKEND_LATENCY': 0,
+    'FAKE_BACKEND_ERROR_RATE': 0,
+}
+
+
+_phone_numbers = itertools.count(650000001)
+
+
+def make_user(name, **extra):
+    return User.objects.create_user(name, f'{name}@example.com', 'Secret-pass-1', phone_number=f'+237{next(_phone_numbers)}', **extra)
+
+
+def make_house(name, **extra):
+    values = dict(house_name=name, room_type='single', price=Decimal('50000.00'), lat=4.05, lng=9.7)
+    values.update(extra)
+    return House.objects.create(**values)
+
+
+def occupancy(room_type='single'):
+    return DailyOccupancy.objects.get(day=timezone.localdate(), room_type=room_type)
+
+
+def image(name):
+    return {'media_type': 'image', 'file_url': f'https://media.example.com/{name}.jpg', 'caption': ''}
+
+
+class FakeBackendsMixin:
+    def setUp(self):
+        super().setUp()
+        overrides = override_settings(**FAKE_BACKENDS)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        for client in (get_payment_gateway, get_media_store):
+            client.cache_clear()
+            self.addCleanup(client.cache_clear)
+        cache.clear()
+
+
+class HouseCardTests(TestCase):
+    def test_card_follows_the_house(self):
+        house = make_house('carded', media=[image('front')], description='Near campus')
+        card = HouseCard.objects.get(pk=house.pk)
+        self.assertEqual((card.house_name, card.cover_url, card.media, card.description), ('carded', image('front')['file_url'], [image('front')], 'Near campus'))
+        house.price = Decimal('60000.00')
+        house.media = [image('back'), image('front')]
+        house.description = 'x' * 1000
+        house.save()
+        card.refresh_from_db()
+        self.assertEqual((card.price, card.cover_url, len(card.media)), (Decimal('60000.00'), image('back')['file_url'], 2))
+        self.assertEqual(len(card.description), HouseCard.DESCRIPTION_EXCERPT_LENGTH)
+        self.assertTrue(card.description.startswith('x' * 100))
+
+    def test_default_list_reads_only_the_card_table(self):
+        house = make_house('listed', media=[image('front')], description='Quiet street')
+        make_house('hidden', remove=True)
+        client = APIClient()
+        client.force_authenticate(make_user('alice'))
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(reverse('house_list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['house_id'] for row in response.data], [house.pk])
+        row = response.data[0]
+        self.assertEqual((row['media'], row['description'], row['is_saved']), ([image('front')], 'Quiet street', False))
+        self.assertEqual(row['reservation_status'], {'is_reserved': False, 'reserved_by_user': False})
+        self.assertFalse(any('"StudHomeApi_house"' in query['sql'] for query in queries.captured_queries))
+        card = client.get(reverse('house_list'), {'view': 'card'}).data[0]
+        self.assertNotIn('media', card)
+        self.assertNotIn('description', card)
+
+    def test_rebuild_repairs_cards_and_save_counters(self):
+        house = make_house('drifted')
+        SavedHome.objects.create(user=make_user('alice'), house=house)
+        HouseCard.objects.filter(pk=house.pk).update(house_name='stale', saved_count=7)
+        HouseSaveCounter.objects.filter(house=house).update(count=5)
+        call_command('rebuild_house_cards', stdout=io.StringIO())
+        card = HouseCard.objects.get(pk=house.pk)
+        self.assertEqual((card.house_name, card.saved_count), ('drifted', 1))
+        self.assertEqual(HouseSaveCounter.totals(), {house.pk: 1})
+
+
+class RowBuilderTests(TestCase):
+    def test_transaction_rows_match_the_serializer(self):
+        alice = make_user('alice')
+        houses = [make_house('first', media=[image('first')], description='One'), make_house('second')]
+        Reservation.objects.claim(alice, houses[1])
+        for i, house in enumerate(houses):
+            Transaction.objects.create(user=alice, house=house, amount_paid=Decimal('1500.50'), transaction_type='tour', payment_reference=f'row-{i}')
+        transactions = Transaction.objects.filter(user=alice)
+        expected = json.loads(JSONRenderer().render(TransactionSerializer(transactions, many=True).data))
+        self.assertEqual(json.loads(FastJSONRenderer().render(transaction_rows(transactions))), expected)
+        self.assertEqual([row['house']['reservation_status']['is_reserved'] for row in expected], [True, False])
+
+    def test_fast_renderer_falls_back_for_indented_output(self):
+        data = {'price': Decimal('10.50'), 'tags': ('a', 'b')}
+        self.assertEqual(json.loads(FastJSONRenderer().render(data)), {'price': '10.50', 'tags': ['a', 'b']})
+        indented = FastJSONRenderer().render(data, 'application/json; indent=2')
+        self.assertIn(b'\n  ', indented)
+
+
+class TransactionExportTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice')
+        self.house = make_house('exported')
+        self.client = APIClient()
+        self.client.force_authenticate(make_user('admin', is_staff=True))
+        for i, payment_status in enumerate(['SUCCESSFUL', 'FAILED', 'SUCCESSFUL']):
+            Transaction.objects.create(
+                user=self.alice, house=self.house, amount_paid=Decimal('100.00'), transaction_type='tour',
+                payment_reference=f'export-{i}', payment_status=payment_status,
+            )
+        Transaction.objects.filter(payment_reference='export-0').update(payment_date=timezone.now() - timedelta(days=10))
+
+    def export(self, **params):
+        response = self.client.get(reverse('transaction_export'), params)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_ndjson_export_is_filtered_and_ordered(self):
+        response, body = self.export(status='SUCCESSFUL')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row['payment_reference'] for row in rows], ['export-0', 'export-2'])
+        self.assertEqual((rows[0]['username'], rows[0]['house_name'], rows[0]['amount_paid']), ('alice', 'exported', '100.00'))
+        since = (timezone.now() - timedelta(days=1)).date().isoformat()
+        _, body = self.export(start=since)
+        self.assertEqual(len(body.splitlines()), 2)
+
+    def test_csv_export_has_a_header(self):
+        response, body = self.export(file_format='csv')
+        rows = list(csv.reader(io.StringIO(body)))
+        self.assertEqual(rows[0][:3], ['transaction_id', 'payment_date', 'payment_status'])
+        self.assertEqual(len(rows), 4)
+        self.assertIn('attachment;', response['Content-Disposition'])
+
+    def test_bad_filters_are_refused(self):
+        self.assertEqual(self.client.get(reverse('transaction_export'), {'file_format': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('transaction_export'), {'start': 'yesterday'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('transaction_export'), {'end': '2024-02-30'}).status_code, 400)
+        with self.assertRaises(ExportFilterError):
+            parse_export_bound('2024-13-01')
+        self.assertEqual(parse_export_bound('2024-03-01', end=True).isoformat(), '2024-03-02T00:00:00+00:00')
+
+
+class HouseImportTests(FakeBackendsMixin, TestCase):
+    HEADER = 'house_name,room_type,price,lat,lng,description,availability,media\n'
+
+    def rows(self, count, media=''):
+        return self.HEADER + ''.join(f'Imported {i},single,30000,4.05,9.7,Row {i},yes,{media}\n' for i in range(count))
+
+    def test_rows_are_imported_in_batches_with_queued_media(self):
+        csv_data = self.rows(3, 'https://example.com/a.jpg|https://example.com/room.glb')
+        csv_data += 'Broken,castle,-5,4.05,9.7,,yes,\n'
+        report = importer.import_houses(io.StringIO(csv_data), batch_size=2, checkpoint='rows')
+        self.assertEqual((report.created, report.queued_media, report.last_line), (3, 6, 5))
+        self.assertEqual([line for line, _ in report.errors], [5])
+        self.assertEqual(HouseCard.objects.filter(house_name__startswith='Imported').count(), 3)
+        self.assertEqual(set(PendingMediaUpload.objects.values_list('media_type', flat=True)), {'3d_model', 'image'})
+        self.assertEqual(ImportCheckpoint.objects.get(name='rows').line, 5)
+
+    def test_resume_after_a_crash_does_not_insert_twice(self):
+        csv_data = self.rows(10)
+        sync = importer.sync_bulk_created_houses
+        batches = itertools.count(1)
+
+        def crash_on_second_batch(houses):
+            if next(batches) == 2:
+                raise RuntimeError('worker killed')
+            sync(houses)
+
+        with mock.patch.object(importer, 'sync_bulk_created_houses', crash_on_second_batch):
+            with self.assertRaises(RuntimeError):
+                importer.import_houses(io.StringIO(csv_data), batch_size=4, checkpoint='crash')
+        # The checkpoint rolled back with the failed batch.
+        self.assertEqual((House.objects.count(), ImportCheckpoint.objects.get(name='crash').line), (4, 5))
+        report = importer.import_houses(io.StringIO(csv_data), batch_size=4, checkpoint='crash', resume=True)
+        self.assertEqual((report.skipped, report.created), (4, 6))
+        self.assertEqual(House.objects.count(), 10)
+
+    def test_media_sources_outside_the_import_dir_are_refused(self):
+        import_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, import_dir, ignore_errors=True)
+        with override_settings(MEDIA_IMPORT_DIR=import_dir):
+            self.assertEqual(importer.resolve_source('photos/a.jpg'), os.path.join(os.path.realpath(import_dir), 'photos', 'a.jpg'))
+            for source in ('/etc/passwd.jpg', '../outside.jpg', 'photos/../../outside.jpg'):
+                with self.assertRaises(ValidationError):
+                    importer.resolve_source(source)
+        with self.assertRaises(ValidationError):
+            importer.resolve_source('photos/a.jpg')
+        with self.assertRaises(ValidationError):
+            importer.build_house(['not', 'an', 'object'])
+
+    def test_pending_media_is_uploaded_once(self):
+        house = make_house('queued')
+        PendingMediaUpload.objects.create(house=house, source='https://example.com/front.jpg', media_type='image')
+        call_command('process_media_uploads', stdout=io.StringIO())
+        call_command('process_media_uploads', stdout=io.StringIO())
+        house.refresh_from_db()
+        self.assertEqual(len(house.media), 1)
+        self.assertEqual(PendingMediaUpload.objects.get().status, 'UPLOADED')
+        self.assertEqual(HouseCard.objects.get(pk=house.pk).cover_url, house.media[0]['file_url'])
+
+    def test_stale_claims_are_retried(self):
+        house = make_house('stale')
+        pending = PendingMediaUpload.objects.create(house=house, source='https://example.com/a.jpg', media_type='image', status='UPLOADING', claimed_at=timezone.now())
+        self.assertEqual(importer.upload_pending_media([pending.pk]), (0, 0))
+        PendingMediaUpload.objects.filter(pk=pending.pk).update(claimed_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(importer.upload_pending_media([pending.pk]), (1, 0))
+
+
+class AdminChangelistTests(TestCase):
+    def setUp(self):
+        self.admin = make_user('admin', is_staff=True, is_superuser=True)
+        self.client.force_login(self.admin)
+
+    def changelist_queries(self, model):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(f'admin:StudHomeApi_{model}_changelist'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def add_rows(self, count):
+        for _ in range(count):
+            house = make_house('listed')
+            user = make_user(f'renter-{House.objects.count()}')
+            Reservation.objects.claim(user, house)
+            Transaction.objects.create(user=user, house=house, amount_paid=Decimal('100.00'), transaction_type='tour')
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        self.add_rows(2)
+        before = {model: self.changelist_queries(model) for model in ('house', 'reservation', 'transaction')}
+        self.add_rows(8)
+        self.assertEqual({model: self.changelist_queries(model) for model in before}, before)
+
+    def test_estimate_is_only_used_for_big_unfiltered_lists(self):
+        self.add_rows(3)
+        with mock.patch.object(EstimatedCountPaginator, 'estimated_count', return_value=250000):
+            self.assertEqual(EstimatedCountPaginator(House.objects.all(), 100).count, 250000)
+            self.assertEqual(EstimatedCountPaginator(House.objects.filter(room_type='single'), 100).count, 3)
+        with mock.patch.object(EstimatedCountPaginator, 'estimated_count', return_value=50):
+            self.assertEqual(EstimatedCountPaginator(House.objects.all(), 100).count, 3)
+        estimate = EstimatedCountPaginator(Transaction.objects.all(), 100).estimated_count()
+        if connection.vendor == 'postgresql':
+            self.assertGreaterEqual(estimate, 0)
+        else:
+            self.assertIsNone(estimate)
+
+
+class ReservationClaimTests(TestCase):
+    def setUp(self):
+        self.house = make_house('claimed')
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+
+    def test_claim_is_exclusive_and_idempotent(self):
+        reservation, created = Reservation.objects.claim(self.alice, self.house)
+        self.assertTrue(created)
+        self.assertTrue(House.objects.get(pk=self.house.pk).is_reserved)
+        self.assertTrue(HouseCard.objects.get(pk=self.house.pk).is_reserved)
+        self.assertEqual(Reservation.objects.claim(self.bob, self.house), (None, False))
+        self.assertEqual(Reservation.objects.claim(self.alice, self.house), (reservation, False))
+
+    def test_release_expired_frees_the_house(self):
+        reservation, _ = Reservation.objects.claim(self.alice, self.house)
+        Reservation.objects.filter(pk=reservation.pk).update(expiry_date=timezone.now() - timedelta(seconds=1))
+        call_command('expire_reservations', stdout=io.StringIO())
+        self.assertFalse(House.objects.get(pk=self.house.pk).is_reserved)
+        self.assertFalse(HouseCard.objects.get(pk=self.house.pk).is_reserved)
+        _, created = Reservation.objects.claim(self.bob, self.house)
+        self.assertTrue(created)
+
+    def test_stale_reserved_flag_does_not_block_claims(self):
+        House.objects.filter(pk=self.house.pk).update(is_reserved=True)
+        _, created = Reservation.objects.claim(self.alice, self.house)
+        self.assertTrue(created)
+
+    def test_database_allows_one_active_reservation_per_house(self):
+        Reservation.objects.claim(self.alice, self.house)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Reservation.objects.create(user=self.bob, house=self.house, is_active=True)
+        Reservation.objects.create(user=self.bob, house=self.house, is_active=False)
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'needs row locks')
+class ConcurrentClaimTests(TransactionTestCase):
+    def test_one_of_many_concurrent_claims_wins(self):
+        house = make_house('contested')
+        users = [make_user(f'student-{i}') for i in range(8)]
+        results = []
+        barrier = threading.Barrier(len(users))
+
+        def claim(user):
+            try:
+                barrier.wait()
+                results.append(Reservation.objects.claim(user, house)[1])
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=claim, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(results), [False] * 7 + [True])
+        self.assertEqual(Reservation.objects.filter(house=house, is_active=True).count(), 1)
+
+
+class RunOnceTests(SimpleTestCase):
+    def test_result_is_replayed(self):
+        store = InMemoryStore()
+        calls = []
+        fn = lambda: calls.append(1) or len(calls)
+        self.assertEqual(run_once('key', fn, 60, store=store), (1, False))
+        self.assertEqual(run_once('key', fn, 60, store=store), (1, True))
+        self.assertEqual(len(calls), 1)
+
+    def test_results_not_kept_are_not_replayed(self):
+        store = InMemoryStore()
+        calls = []
+        fn = lambda: calls.append(1) or len(calls)
+        self.assertEqual(run_once('key', fn, 60, store=store, keep=lambda result: False), (1, False))
+        self.assertEqual(run_once('key', fn, 60, store=store, keep=lambda result: False), (2, False))
+
+    def test_concurrent_callers_wait_for_the_running_call(self):
+        store = InMemoryStore()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def slow():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return 'done'
+
+        first = threading.Thread(target=run_once, args=('key', slow, 60), kwargs={'store': store})
+        first.start()
+        started.wait(5)
+        # The marker outlives the waiter's timeout, so a caller that gives up
+        # doesn't start a second call.
+        with self.assertRaises(CoalescingTimeout):
+            run_once('key', slow, 60, wait_timeout=0.05, store=store, inflight_ttl=60)
+        release.set()
+        first.join()
+        self.assertEqual(run_once('key', slow, 60, store=store), ('done', True))
+        self.assertEqual(len(calls), 1)
+
+    def test_store_interface_is_abstract(self):
+        with self.assertRaises(TypeError):
+            BaseStore()
+
+    def test_token_bucket_and_lock(self):
+        store = InMemoryStore()
+        bucket = TokenBucket(store, capacity=2, refill_seconds=60)
+        self.assertEqual([bucket.consume('user') for _ in range(2)], [0, 0])
+        self.assertGreater(bucket.consume('user'), 0)
+        with store.lock('busy'):
+            with self.assertRaises(LockTimeout), store.lock('busy', timeout=0.01):
+                pass
+        with store.lock('busy', timeout=0.01):
+            pass
+
+
+class IdempotentPaymentInitiationTests(FakeBackendsMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.house = make_house('idempotent')
+        self.client = APIClient()
+        self.client.force_authenticate(make_user('alice'))
+        self.url = reverse('initiate_payment', args=[self.house.pk])
+        self.body = {'amount': 100, 'phone_number': '+237650000000', 'transaction_type': 'tour'}
+
+    def initiate(self, key=None, body=None):
+        headers = {'HTTP_IDEMPOTENCY_KEY': key} if key else {}
+        return self.client.post(self.url, body or self.body, format='json', **headers)
+
+    def test_retry_with_the_same_key_is_replayed(self):
+        first = self.initiate('k1')
+        self.assertEqual(first.status_code, 201)
+        # More retries than the throttle's burst: replays aren't throttled.
+        for _ in range(5):
+            retry = self.initiate('k1')
+            self.assertEqual(retry.status_code, 201)
+            self.assertEqual(retry['Idempotent-Replayed'], 'true')
+            self.assertEqual(retry.data, first.data)
+        self.assertEqual(len(get_payment_gateway().collections), 1)
+        self.assertEqual(Transaction.objects.count(), 1)
+
+    def test_key_reused_for_another_request_is_refused(self):
+        self.initiate('k2')
+        response = self.initiate('k2', dict(self.body, phone_number='+237651111111'))
+        self.assertEqual(response.status_code, 422)
+
+    def test_failed_initiation_is_not_replayed(self):
+        with mock.patch.object(get_payment_gateway(), 'init_collect', side_effect=RuntimeError('gateway down')):
+            self.assertEqual(self.initiate('k3').status_code, 400)
+        response = self.initiate('k3')
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+
+    def test_double_taps_without_a_key_are_coalesced_then_throttled(self):
+        first = self.initiate()
+        self.assertEqual(self.initiate()['Idempotent-Replayed'], 'true')
+        self.assertEqual(len(get_payment_gateway().collections), 1)
+        responses = [self.initiate(body=dict(self.body, phone_number=f'+23765000000{i}')) for i in range(1, 4)]
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(responses[-1].status_code, 429)
+
+
+class SaveCounterTests(TestCase):
+    def setUp(self):
+        self.house = make_house('popular')
+
+    def save_house(self, user, shard):
+        client = APIClient()
+        client.force_authenticate(user)
+        with mock.patch('random.randrange', return_value=shard), self.captureOnCommitCallbacks(execute=True):
+            response = client.post(reverse('save_house', args=[self.house.pk]))
+        self.assertEqual(response.status_code, 201)
+        return client
+
+    def saved_count(self):
+        return HouseCard.objects.get(pk=self.house.pk).saved_count
+
+    def test_saves_spread_over_shards_and_fold_into_the_card(self):
+        clients = [self.save_house(make_user(f'fan-{i}'), shard=i % 3) for i in range(5)]
+        self.assertEqual(HouseSaveCounter.objects.filter(house=self.house).count(), 3)
+        self.assertEqual(self.saved_count(), 5)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(clients[0].delete(reverse('unsave_house', args=[self.house.pk])).status_code, 204)
+        self.assertEqual(self.saved_count(), 4)
+        self.assertEqual(HouseSaveCounter.totals([self.house.pk]), {self.house.pk: 4})
+
+    def test_reconcile_repairs_drifted_counters(self):
+        self.save_house(make_user('fan'), shard=0)
+        HouseSaveCounter.objects.filter(house=self.house).update(count=9)
+        call_command('reconcile_save_counts', stdout=io.StringIO())
+        self.assertEqual(self.saved_count(), 9)
+        call_command('reconcile_save_counts', '--full', stdout=io.StringIO())
+        self.assertEqual(self.saved_count(), 1)
+        self.assertEqual(HouseSaveCounter.totals(), {self.house.pk: 1})
+
+    def test_deleting_the_house_skips_the_counters(self):
+        self.save_house(make_user('fan'), shard=0)
+        self.house.delete()
+        self.assertFalse(HouseSaveCounter.objects.exists())
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'needs row locks')
+class ConcurrentSaveTests(TransactionTestCase):
+    def test_concurrent_saves_are_all_counted(self):
+        house = make_house('contested')
+        users = [make_user(f'fan-{i}') for i in range(12)]
+        barrier = threading.Barrier(len(users))
+
+        def save(user):
+            try:
+                barrier.wait()
+                SavedHome.objects.create(user=user, house=house)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=save, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(HouseSaveCounter.totals([house.pk]), {house.pk: 12})
+        self.assertEqual(HouseCard.objects.get(pk=house.pk).saved_count, 12)
+
+
+class BulkSavedHomesTests(TestCase):
+    def setUp(self):
+        self.houses = [make_house(f'bulk-{i}') for i in range(3)]
+        self.alice = make_user('alice')
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+        self.url = reverse('bulk_saved_homes')
+
+    def ids(self, houses):
+        return [str(house.pk) for house in houses]
+
+    def test_bulk_save_reports_each_id(self):
+        missing = str(uuid.uuid4())
+        with self.captureOnCommitCallbacks(execute=True):
+            SavedHome.objects.create(user=self.alice, house=self.houses[0])
+            response = self.client.post(self.url, {'house_ids': self.ids(self.houses) + [missing]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {
+            'saved': sorted(self.ids(self.houses[1:])),
+            'already_saved': self.ids(self.houses[:1]),
+            'not_found': [missing],
+        })
+        self.assertEqual(SavedHome.objects.filter(user=self.alice).count(), 3)
+        self.assertEqual(sorted(HouseCard.objects.values_list('saved_count', flat=True)), [1, 1, 1])
+
+    def test_bulk_unsave_and_lookup(self):
+        for house in self.houses[:2]:
+            SavedHome.objects.create(user=self.alice, house=house)
+        lookup = self.client.get(reverse('saved_homes_lookup'), {'house_ids': ','.join(self.ids(self.houses))})
+        self.assertEqual(lookup.data, {str(house.pk): i < 2 for i, house in enumerate(self.houses)})
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f"{self.url}?house_ids={','.join(self.ids(self.houses))}")
+        self.assertEqual(response.data, {'removed': 2})
+        self.assertEqual(HouseSaveCounter.totals(), {house.pk: 0 for house in self.houses[:2]})
+
+    def test_house_list_marks_saved_houses(self):
+        SavedHome.objects.create(user=self.alice, house=self.houses[1])
+        rows = self.client.get(reverse('house_list'), {'view': 'card'}).data
+        self.assertEqual({row['house_id']: row['is_saved'] for row in rows}, {house.pk: i == 1 for i, house in enumerate(self.houses)})
+
+    def test_invalid_id_lists_are_refused(self):
+        self.assertEqual(self.client.post(self.url, {'house_ids': []}, format='json').status_code, 400)
+        self.assertEqual(self.client.post(self.url, {'house_ids': ['not-a-uuid']}, format='json').status_code, 400)
+
+
+class SimilarHousesTests(TestCase):
+    def test_block_top_k_matches_a_full_sort(self):
+        block = np.random.default_rng(7).random((20, 50), dtype=np.float32)
+        expected = np.argsort(-block, axis=1)[:, :3]
+        for chunk in (1024, 4):
+            cols, values = recommendations.block_top_k(np, block, 3, chunk=chunk)
+            np.testing.assert_array_equal(cols, expected)
+            np.testing.assert_array_equal(values, np.take_along_axis(block, expected, axis=1))
+
+    def test_content_neighbours_share_a_room_type_unless_co_saved(self):
+        houses = [
+            ('a', 30000, 'single', 4.05, 9.70), ('b', 31000, 'single', 4.05, 9.71),
+            ('c', 90000, 'single', 4.30, 9.90), ('d', 30000, 'apartment', 4.05, 9.70),
+        ]
+        house_ids, neighbours, _, _ = recommendations.build_neighbours(np, houses, [], ['single', 'double', 'apartment'], k=2)
+        named = {house_ids[i]: [house_ids[j] for j in row if j >= 0] for i, row in enumerate(neighbours)}
+        self.assertEqual(named['a'], ['b', 'c'])
+        self.assertEqual(named['d'], [])
+        saves = [('u1', 'a'), ('u1', 'd'), ('u2', 'a'), ('u2', 'd')]
+        house_ids, neighbours, _, _ = recommendations.build_neighbours(np, houses, saves, ['single', 'double', 'apartment'], k=2)
+        named = {house_ids[i]: [house_ids[j] for j in row if j >= 0] for i, row in enumerate(neighbours)}
+        self.assertEqual(named['d'], ['a'])
+        self.assertIn('d', named['a'])
+
+    def test_similar_endpoint_serves_the_stored_neighbours(self):
+        house = make_house('origin', price=Decimal('30000.00'))
+        near = make_house('near', price=Decimal('31000.00'), lng=9.701)
+        far = make_house('far', price=Decimal('90000.00'), lat=4.3)
+        make_house('hidden', price=Decimal('30000.00'), remove=True)
+        call_command('build_similar_houses', '--k', '5', stdout=io.StringIO())
+        client = APIClient()
+        client.force_authenticate(make_user('alice'))
+        rows = client.get(reverse('similar_houses', args=[house.pk])).data
+        self.assertEqual([row['house_id'] for row in rows], [near.pk, far.pk])
+
+
+class PasswordHashingTests(TransactionTestCase):
+    def test_new_passwords_use_the_tuned_argon2_hasher(self):
+        alice = make_user('alice')
+        self.assertTrue(alice.password.startswith('argon2$argon2id$v=19$m=19456,t=2,p=1$'))
+        client = APIClient()
+        client.force_authenticate(alice)
+        response = client.put(reverse('change_password'), {'old_password': 'Secret-pass-1', 'new_password': 'Another-pass-2'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        alice.refresh_from_db()
+        self.assertTrue(alice.check_password('Another-pass-2'))
+        self.assertTrue(alice.password.startswith('argon2$'))
+
+    def test_legacy_hash_is_upgraded_after_login(self):
+        alice = make_user('alice')
+        User.objects.filter(pk=alice.pk).update(password=make_password('Secret-pass-1', hasher='pbkdf2_sha1'))
+        alice.refresh_from_db()
+        futures = []
+        schedule_rehash = hashing.schedule_rehash
+        with mock.patch.object(hashing, 'schedule_rehash', side_effect=lambda *args: futures.append(schedule_rehash(*args))):
+            self.assertTrue(alice.check_password('Secret-pass-1'))
+        self.assertEqual(len(futures), 1)
+        futures[0].result(timeout=30)
+        alice.refresh_from_db()
+        self.assertTrue(alice.password.startswith('argon2$'))
+        self.assertTrue(alice.check_password('Secret-pass-1'))
+
+    def test_rehash_loses_to_a_concurrent_password_change(self):
+        alice = make_user('alice')
+        old_hash = alice.password
+        alice.set_password('Changed-pass-3')
+        alice.save()
+        hashing._rehash(User, alice.pk, old_hash, 'Secret-pass-1')
+        alice.refresh_from_db()
+        self.assertTrue(alice.check_password('Changed-pass-3'))
+
+    def test_bulk_hashing_inline(self):
+        with override_settings(PASSWORD_HASHING_WORKERS=0):
+            hashes = hashing.hash_passwords(['one-password', 'two-password'])
+        self.assertTrue(check_password('one-password', hashes[0]))
+        self.assertTrue(check_password('two-password', hashes[1]))
+
+
+@override_settings(PASSWORD_HASHING_WORKERS=0)
+class RosterOnboardingTests(TestCase):
+    def row(self, name, **extra):
+        values = {'username': name, 'email': f'{name}@example.com', 'phone_number': f'+237{next(_phone_numbers)}', 'password': 'Roster-pass-1'}
+        values.update(extra)
+        return values
+
+    def test_valid_rows_are_created_and_the_rest_reported(self):
+        make_user('taken')
+        rows = [
+            self.row('fresh'),
+            self.row('taken'),
+            self.row('dupe', email='fresh@example.com'),
+            self.row('broken', email='not-an-email'),
+            self.row('second'),
+        ]
+        report = onboarding.onboard_users(rows, batch_size=1)
+        self.assertEqual((report['created'], report['failed']), (2, 3))
+        self.assertEqual([result['status'] for result in report['results']], ['created', 'error', 'error', 'error', 'created'])
+        self.assertIn('username', report['results'][1]['errors'])
+        self.assertIn('email', report['results'][2]['errors'])
+        self.assertTrue(User.objects.get(username='fresh').check_password('Roster-pass-1'))
+
+    def test_conflicts_appearing_after_the_check_only_fail_their_rows(self):
+        rows = [self.row('early'), self.row('racer')]
+        real_insert = onboarding._insert
+
+        def register_racer_first(users, results):
+            make_user('racer')
+            real_insert(users, results)
+
+        with mock.patch.object(onboarding, '_insert', register_racer_first):
+            report = onboarding.onboard_users(rows)
+        self.assertEqual([result['status'] for result in report['results']], ['created', 'error'])
+
+    def test_admin_uploads_a_csv_roster(self):
+        client = APIClient()
+        client.force_authenticate(make_user('admin', is_staff=True))
+        roster = 'username,email,phone_number,password\n' + ''.join(
+            f"{row['username']},{row['email']},{row['phone_number']},{row['password']}\n" for row in (self.row('csv-1'), self.row('csv-2'))
+        )
+        response = client.post(reverse('user_bulk_register'), {'file': SimpleUploadedFile('roster.csv', roster.encode())}, format='multipart')
+        self.assertEqual((response.status_code, response.data['created']), (200, 2))
+        self.assertEqual(client.post(reverse('user_bulk_register'), {'users': []}, format='json').status_code, 400)
+
+    def test_username_clash_on_profile_update_is_refused(self):
+        make_user('taken')
+        alice = make_user('alice')
+        client = APIClient()
+        client.force_authenticate(alice)
+        response = client.put(reverse('user_profile'), {'username': 'taken'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        alice.refresh_from_db()
+        self.assertEqual(alice.username, 'alice')
+
+
+class LazyClientTests(SimpleTestCase):
+    def test_booting_with_the_urlconf_does_not_import_the_payment_sdk(self):
+        code = (
+            'import sys, Studhome.wsgi; from django.urls import get_resolver; get_resolver().url_patterns; '
+            'import StudHomeApi.importer; print("campay" in sys.modules)'
+        )
+        proc = subprocess.run([sys.executable, '-c', code], cwd=settings.BASE_DIR, capture_output=True, text=True)
+        self.assertEqual(proc.returncode, 0, proc.stderr)
+        self.assertEqual(proc.stdout.strip(), 'False')
+
+    @override_settings(PAYMENT_GATEWAY='StudHomeApi.backends.FakePaymentGateway', MEDIA_STORE='StudHomeApi.backends.FakeMediaStore')
+    def test_clients_are_built_once_per_process(self):
+        for client in (get_payment_gateway, get_media_store):
+            client.cache_clear()
+            self.addCleanup(client.cache_clear)
+        self.assertIsInstance(get_payment_gateway(), FakePaymentGateway)
+        self.assertIs(get_payment_gateway(), get_payment_gateway())
+        self.assertIsInstance(get_media_store(), FakeMediaStore)
+        self.assertIs(get_media_store(), get_media_store())
+
+    @override_settings(CAMPAY_USERNAME='', CAMPAY_PASSWORD='')
+    def test_campay_without_credentials_fails_on_first_use(self):
+        with self.assertRaises(ImproperlyConfigured):
+            CamPayGateway()
+
+    def test_bench_startup_sums_top_level_imports(self):
+        output = (
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       100 |        100 |   json.decoder\n'
+            'import time:       200 |        300 | json\n'
+            'import time:        50 |         50 | csv\n'
+        )
+        total, per_module = BenchStartupCommand().parse(output)
+        self.assertEqual(total, 350)
+        self.assertEqual(per_module['json.decoder'], (100, 100))
+
+
+class FakeBackendTests(SimpleTestCase):
+    def test_collections_settle_to_the_configured_outcome(self):
+        gateway = FakePaymentGateway(latency=0, error_rate=0, outcome='FAILED', settle_after=60, webhook_delay=-1)
+        reference = gateway.init_collect(1000, '+237650000000', 'Rent', 'ref-1')['reference']
+        self.assertEqual(gateway.get_transaction_status(reference)['status'], 'PENDING')
+        gateway.settle_after = 0
+        self.assertEqual(gateway.get_transaction_status(reference), {'reference': reference, 'status': 'FAILED', 'amount': '1000'})
+        with self.assertRaises(BackendError):
+            gateway.get_transaction_status('unknown')
+
+    def test_injected_failures_raise_backend_errors(self):
+        with self.assertRaises(BackendError):
+            FakePaymentGateway(latency=0, error_rate=1, webhook_delay=-1).init_collect(1000, '+237650000000', 'Rent', 'ref-1')
+        with self.assertRaises(BackendError):
+            FakeMediaStore(latency=0, error_rate=1).upload('https://example.com/a.jpg')
+
+    def test_media_uploads_are_measured_but_not_kept(self):
+        store = FakeMediaStore(latency=0, error_rate=0, base_url='https://media.invalid/')
+        result = store.upload(SimpleUploadedFile('Room.JPG', b'x' * 1000))
+        self.assertEqual(result['bytes'], 1000)
+        self.assertEqual(result['secure_url'], f"https://media.invalid/image/upload/{result['public_id']}.jpg")
+        self.assertEqual(store.upload_large('https://example.com/plan.pdf', resource_type='raw')['original_filename'], 'plan.pdf')
+        self.assertEqual(len(store.uploads), 2)
+
+    @override_settings(FAKE_BACKEND_ERROR_RATE=1)
+    def test_fake_email_backend_honours_fail_silently(self):
+        message = mock.Mock()
+        self.assertEqual(FakeEmailBackend(fail_silently=True).send_messages([message]), 0)
+        with self.assertRaises(BackendError):
+            FakeEmailBackend().send_messages([message])
+
+    def test_backends_must_implement_every_operation(self):
+        class HalfGateway(BasePaymentGateway):
+            def init_collect(self, amount, phone_number, description, external_reference, currency='XAF'):
+                return {'reference': 'ref'}
+
+        for base in (HalfGateway, BaseMediaStore):
+            with self.assertRaises(TypeError):
+                base()
+
+
+@override_settings(CAMPAY_WEBHOOK_KEY='loadtest-key')
+class LoadTestFunnelTests(FakeBackendsMixin, TestCase):
+    def test_one_student_completes_the_funnel(self):
+        run_tag = loadtest.new_run_tag()
+        funnel = loadtest.Funnel(loadtest.InProcessClient, loadtest.seed_houses(3, run_tag), reserve_ratio=1, webhook_key='loadtest-key', run_tag=run_tag)
+        # Closing connections between users would drop the test transaction.
+        with mock.patch.object(loadtest, 'close_old_connections'), self.captureOnCommitCallbacks(execute=True):
+            funnel.run_user(0)
+        failed = {step: stats.statuses for step, stats in funnel.stats.items() if stats.errors}
+        self.assertEqual((funnel.completed, failed), (1, {}))
+        self.assertTrue(User.objects.filter(username=f'{loadtest.dataset_prefix(run_tag)}0').exists())
+
+    def test_cleanup_only_removes_its_own_run(self):
+        ours, theirs = loadtest.new_run_tag(), loadtest.new_run_tag()
+        loadtest.seed_houses(3, ours, batch_size=2)
+        loadtest.seed_houses(2, theirs)
+        make_user(f'{loadtest.dataset_prefix(ours)}0')
+        make_user(f'{loadtest.dataset_prefix(theirs)}0')
+        self.assertEqual(loadtest.delete_dataset(ours), (1, 3))
+        self.assertEqual(House.objects.filter(house_name__startswith=loadtest.DATASET_PREFIX).count(), 2)
+        self.assertEqual(User.objects.filter(username__startswith=loadtest.DATASET_PREFIX).count(), 1)
+
+    def test_percentiles_use_the_nearest_rank(self):
+        stats = loadtest.StepStats()
+        self.assertEqual(stats.percentile(95), 0.0)
+        for elapsed in (0.4, 0.1, 0.3, 0.2):
+            stats.record(elapsed, 200, True)
+        stats.record(1.0, 500, False)
+        self.assertEqual((stats.percentile(50), stats.percentile(99)), (0.3, 1.0))
+        self.assertEqual((stats.statuses, stats.errors), ({200: 4, 500: 1}, 1))
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class PaymentStatusTests(TestCase):
+    def setUp(self):
+        self.house = make_house('paid')
+        self.alice = make_user('alice')
+
+    def pay(self, transaction_type, user=None, status='PENDING'):
+        return Transaction.objects.create(
+            user=user or self.alice, house=self.house, amount_paid=Decimal('100.00'),
+            transaction_type=transaction_type, payment_reference=f'ref-{Transaction.objects.count()}', payment_status=status,
+        )
+
+    def test_failed_approval_email_is_sent_on_retry(self):
+        transaction = self.pay('reserve')
+        with mock.patch.object(payments, 'send_mail', side_effect=OSError('mail server down')):
+            with self.assertRaises(OSError):
+                payments.apply_payment_status(transaction, 'SUCCESSFUL')
+        self.assertTrue(Reservation.objects.filter(house=self.house, user=self.alice, is_active=True).exists())
+        self.assertIsNone(Transaction.objects.get(pk=transaction.pk).approval_sent_at)
+        self.assertTrue(payments.apply_payment_status(transaction, 'SUCCESSFUL'))
+        self.assertTrue(payments.apply_payment_status(transaction, 'SUCCESSFUL'))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIsNotNone(Transaction.objects.get(pk=transaction.pk).approval_sent_at)
+
+    def test_payment_for_a_lost_house_is_flagged(self):
+        Reservation.objects.claim(make_user('bob'), self.house)
+        transaction = self.pay('reserve')
+        with self.assertLogs('StudHomeApi.payments', 'WARNING'):
+            self.assertFalse(payments.apply_payment_status(transaction, 'SUCCESSFUL'))
+        self.assertTrue(Transaction.objects.get(pk=transaction.pk).needs_refund)
+        self.assertEqual(len(mail.outbox), 0)
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', WEBHOOK_RETRY_DELAY=0)
+class WebhookInboxTests(TestCase):
+    def setUp(self):
+        self.house = make_house('hooked')
+        self.alice = make_user('alice')
+
+    def test_repeated_webhooks_are_stored_once(self):
+        record_webhook('ref-1', 'SUCCESSFUL', {})
+        record_webhook('ref-1', 'SUCCESSFUL', {})
+        record_webhook('ref-1', 'FAILED', {})
+        self.assertEqual(WebhookEvent.objects.filter(reference='ref-1').count(), 2)
+
+    def test_event_is_retried_until_its_transaction_exists(self):
+        record_webhook('early', 'SUCCESSFUL', {})
+        event = WebhookEvent.objects.get(reference='early')
+        self.assertFalse(process_event(event))
+        self.assertEqual((event.state, event.attempts), ('PENDING', 1))
+        Transaction.objects.create(user=self.alice, house=self.house, amount_paid=Decimal('100.00'), transaction_type='tour', payment_reference='early')
+        self.assertTrue(process_event(event))
+        self.assertEqual(event.state, 'PROCESSED')
+        self.assertEqual(Transaction.objects.get(payment_reference='early').payment_status, 'SUCCESSFUL')
+
+    @override_settings(WEBHOOK_MAX_ATTEMPTS=2)
+    def test_event_fails_after_its_last_attempt(self):
+        record_webhook('orphan', 'SUCCESSFUL', {})
+        event = WebhookEvent.objects.get(reference='orphan')
+        self.assertFalse(process_event(event))
+        with self.assertLogs('StudHomeApi.webhooks', 'WARNING'):
+            self.assertTrue(process_event(event))
+        self.assertEqual((event.state, event.error), ('FAILED', 'Transaction not found'))
+
+    def test_lost_house_event_fails_for_an_admin(self):
+        Reservation.objects.claim(make_user('bob'), self.house)
+        Transaction.objects.create(user=self.alice, house=self.house, amount_paid=Decimal('100.00'), transaction_type='reserve', payment_reference='late')
+        record_webhook('late', 'SUCCESSFUL', {})
+        event = WebhookEvent.objects.get(reference='late')
+        with self.assertLogs('StudHomeApi.payments', 'WARNING'):
+            self.assertTrue(process_event(event))
+        self.assertEqual(event.state, 'FAILED')
+        self.assertTrue(Transaction.objects.get(payment_reference='late').needs_refund)
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class WebhookProcessorTests(TransactionTestCase):
+    def test_events_for_a_reference_apply_in_arrival_order(self):
+        transaction = Transaction.objects.create(
+            user=make_user('alice'), house=make_house('ordered'), amount_paid=Decimal('100.00'),
+            transaction_type='tour', payment_reference='ordered',
+        )
+        record_webhook('ordered', 'PENDING', {})
+        record_webhook('ordered', 'SUCCESSFUL', {})
+        processor = WebhookProcessor(workers=1)
+        self.assertEqual(processor.run_once(), 2)
+        self.assertEqual(Transaction.objects.get(pk=transaction.pk).payment_status, 'SUCCESSFUL')
+        self.assertFalse(WebhookEvent.objects.filter(state='PENDING').exists())
+
+
+@override_settings(DEBUG=False, OFFLINE_BACKENDS=False, CAMPAY_WEBHOOK_KEY='')
+class WebhookSignatureTests(TestCase):
+    payload = {'reference': 'ref-1', 'status': 'SUCCESSFUL', 'amount': '100'}
+
+    def test_signed_claims_must_match_the_payload(self):
+        signed = sign_webhook_payload(self.payload, key='webhook-key')
+        self.assertTrue(verify_webhook_signature(signed, key='webhook-key'))
+        self.assertFalse(verify_webhook_signature(signed, key='other-key'))
+        self.assertFalse(verify_webhook_signature(dict(signed, status='FAILED'), key='webhook-key'))
+        self.assertFalse(verify_webhook_signature(self.payload, key='webhook-key'))
+
+    def test_unsigned_webhooks_need_a_development_setting(self):
+        self.assertFalse(verify_webhook_signature(self.payload))
+        with self.settings(OFFLINE_BACKENDS=True):
+            self.assertTrue(verify_webhook_signature(self.payload))
+        with self.settings(DEBUG=True):
+            self.assertTrue(verify_webhook_signature(self.payload))
+
+    @override_settings(CAMPAY_WEBHOOK_KEY='webhook-key')
+    def test_webhooks_are_stored_without_being_applied(self):
+        client = APIClient()
+        url = reverse('payment_webhook')
+        self.assertEqual(client.post(url, self.payload, format='json').status_code, 403)
+        self.assertEqual(client.post(url, {'status': 'SUCCESSFUL'}, format='json').status_code, 400)
+        response = client.post(url, sign_webhook_payload(self.payload), format='multipart')
+        self.assertEqual(response.status_code, 200)
+        event = WebhookEvent.objects.get()
+        self.assertEqual((event.reference, event.status, event.state, event.payload['amount']), ('ref-1', 'SUCCESSFUL', 'PENDING', '100'))
+
+
+@override_settings(HOUSE_SYNC_LAG_SECONDS=0)
+class HouseSyncTests(TestCase):
+    def sync_all(self, token=None, limit=2):
+        changes = []
+        while True:
+            page = house_changes(token, limit)
+            changes += page['changes']
+            token = page['next']
+            if not page['has_more']:
+                return changes, token
+
+    def test_cursor_pages_through_changes_and_deletions(self):
+        houses = [make_house(f'synced-{i}') for i in range(5)]
+        changes, token = self.sync_all()
+        self.assertEqual(sorted(change['house_id'] for change in changes), sorted(house.pk for house in houses))
+        self.assertEqual(self.sync_all(token)[0], [])
+
+        houses[0].price = Decimal('60000.00')
+        houses[0].save()
+        deleted = houses[1].pk
+        houses[1].delete()
+        changes, token = self.sync_all(token)
+        self.assertEqual({change['house_id']: change['removed'] for change in changes}, {houses[0].pk: False, deleted: True})
+        self.assertEqual(next(change for change in changes if not change['removed'])['price'], '60000.00')
+        self.assertEqual(self.sync_all(token)[0], [])
+
+    def test_bad_and_expired_tokens_are_reported(self):
+        client = APIClient()
+        client.force_authenticate(make_user('alice'))
+        url = reverse('house_changes')
+        self.assertEqual(client.get(url, {'since': 'not-a-token'}).status_code, 400)
+        expired = encode_token(timezone.now() - timedelta(days=settings.HOUSE_TOMBSTONE_RETENTION_DAYS + 1), uuid.uuid4())
+        response = client.get(url, {'since': expired})
+        self.assertEqual((response.status_code, response.data['reset']), (410, True))
+
+
+class MapClusterTests(TestCase):
+    def cells(self):
+        return sorted(
+            (zoom, x, y, count, round(lat_sum, 6), round(lng_sum, 6), min_price)
+            for zoom, x, y, count, lat_sum, lng_sum, min_price in MapCluster.objects.values_list(
+                'zoom', 'cell_x', 'cell_y', 'count', 'lat_sum', 'lng_sum', 'min_price',
+            )
+        )
+
+    def test_folded_changes_match_a_rebuild(self):
+        houses = [make_house(f'mapped-{i}', lat=4 + i * 0.01, lng=9 + i * 0.02, price=Decimal(1000 * (i % 4 + 1))) for i in range(12)]
+        self.assertFalse(MapCluster.objects.exists())
+        self.assertEqual(clusters.fold_changes(), 12)
+        houses[0].price = Decimal('500.00')
+        houses[0].save()
+        houses[1].lat += 1
+        houses[1].save()
+        houses[2].delete()
+        houses[3].remove = True
+        houses[3].save()
+        while clusters.fold_changes(batch_size=3):
+            pass
+        self.assertFalse(MapClusterChange.objects.exists())
+        folded = self.cells()
+        clusters.rebuild()
+        self.assertEqual(folded, self.cells())
+
+    def test_viewport_is_served_from_cells_or_cards_by_zoom(self):
+        make_house('east', lat=4.05, lng=179.5, price=Decimal('2000.00'))
+        make_house('west', lat=4.05, lng=-179.5, price=Decimal('1000.00'))
+        make_house('elsewhere', lat=4.05, lng=9.7)
+        clusters.fold_changes()
+        client = APIClient()
+        client.force_authenticate(make_user('alice'))
+        url = reverse('house_clusters')
+        # The box crosses the antimeridian.
+        coarse = client.get(url, {'zoom': 0, 'bbox': '170,0,-170,10'}).data['clusters']
+        self.assertEqual(sorted((cluster['min_price'], cluster['count']) for cluster in coarse), [('1000.00', 1), ('2000.00', 1)])
+        fine = client.get(url, {'zoom': settings.MAP_CLUSTER_MAX_PRECOMPUTED_ZOOM + 1, 'bbox': '170,0,-170,10'}).data['clusters']
+        self.assertEqual(sorted(cluster['min_price'] for cluster in fine), ['1000.00', '2000.00'])
+        self.assertTrue(all('house_id' in cluster for cluster in fine))
+        self.assertEqual(client.get(url, {'zoom': 0, 'bbox': '1,2,3'}).status_code, 400)
+        self.assertEqual(client.get(url, {'zoom': settings.MAP_CLUSTER_MAX_ZOOM + 1, 'bbox': '170,0,-170,10'}).status_code, 400)
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class SearchAlertTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+        self.searches = [
+            SavedSearch(user=self.alice, name='cheap singles', room_type='single', max_price=Decimal('60000.00')),
+            SavedSearch(user=self.alice, name='near campus', lat=4.05, lng=9.7, radius_km=2),
+            SavedSearch(user=self.bob, name='anything', min_price=Decimal('1.00')),
+            SavedSearch(user=self.bob, name='far away', lat=-33.9, lng=18.4, radius_km=5),
+        ]
+        for search in self.searches:
+            search.save()
+            alerts.index_search(search)
+
+    def add_houses(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return [
+                make_house('campus single', price=Decimal('50000.00')),
+                make_house('campus double', room_type='double', price=Decimal('90000.00')),
+                make_house('suburb single', price=Decimal('40000.00'), lat=4.2, lng=9.9),
+                make_house('hidden', remove=True),
+            ]
+
+    def test_index_finds_the_same_matches_as_a_scan(self):
+        houses = self.add_houses()
+        expected = {
+            (search.pk, house.pk) for search in self.searches for house in houses
+            if not house.remove and alerts.search_matches(search, house)
+        }
+        self.assertEqual(set(SearchAlert.objects.values_list('search_id', 'house_id')), expected)
+        self.assertEqual(len(expected), 7)
+        self.assertEqual(alerts.match_houses(houses), 0)
+
+    def test_alerts_are_sent_once_per_user(self):
+        self.add_houses()
+        self.assertEqual(alerts.send_pending_alerts(), (7, 2))
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ['alice@example.com', 'bob@example.com'])
+        self.assertEqual(alerts.send_pending_alerts(), (0, 0))
+
+    def test_failed_send_releases_the_claim(self):
+        self.add_houses()
+        with mock.patch.object(alerts, 'get_connection', side_effect=OSError('mail server down')):
+            with self.assertRaises(OSError):
+                alerts.send_pending_alerts()
+        self.assertFalse(SearchAlert.objects.filter(Q(claimed_at__isnull=False) | Q(sent_at__isnull=False)).exists())
+        self.assertEqual(alerts.send_pending_alerts(batch_size=3)[0], 3)
+
+    def test_stale_claims_are_taken_over(self):
+        self.add_houses()
+        SearchAlert.objects.update(claimed_at=timezone.now())
+        self.assertEqual(alerts.send_pending_alerts(), (0, 0))
+        SearchAlert.objects.update(claimed_at=timezone.now() - timedelta(minutes=settings.SEARCH_ALERT_CLAIM_MINUTES + 1))
+        self.assertEqual(alerts.send_pending_alerts(), (7, 2))
+
+
+class MediaDeduplicationTests(FakeBackendsMixin, TestCase):
+    def test_identical_bytes_are_uploaded_once_per_resource_type(self):
+        url, reused = upload_deduplicated(SimpleUploadedFile('a.jpg', b'same bytes'))
+        self.assertEqual(upload_deduplicated(SimpleUploadedFile('b.jpg', b'same bytes')), (url, True))
+        self.assertEqual(upload_deduplicated(io.BytesIO(b'same bytes')), (url, True))
+        self.assertFalse(reused)
+        self.assertNotEqual(upload_deduplicated(SimpleUploadedFile('a.bin', b'same bytes'), resource_type='raw')[0], url)
+        self.assertEqual(len(get_media_store().uploads), 2)
+        self.assertEqual(MediaAsset.objects.get(resource_type='image').hit_count, 2)
+        self.assertEqual(media_stats(), {'assets': 2, 'hits': 2, 'misses': 2, 'hit_rate': 0.5, 'stored_bytes': 20, 'saved_bytes': 20})
+
+    def test_only_remote_urls_are_passed_through(self):
+        url, reused = upload_deduplicated('https://example.com/room.jpg')
+        self.assertFalse(reused)
+        self.assertTrue(url.endswith('.jpg'))
+        self.assertFalse(MediaAsset.objects.exists())
+        for source in ('/etc/passwd', 'file:///etc/passwd', 'room.jpg'):
+            with self.assertRaises(ValueError):
+                upload_deduplicated(source)
+
+    def test_stats_are_for_admins(self):
+        client = APIClient()
+        client.force_authenticate(make_user('alice'))
+        self.assertEqual(client.get(reverse('media_stats')).status_code, 403)
+        client.force_authenticate(make_user('admin', is_staff=True))
+        self.assertEqual(client.get(reverse('media_stats')).data['hit_rate'], 0.0)
+
+
+class ModelUploadTests(FakeBackendsMixin, TestCase):
+    MODEL = json.dumps({'asset': {'version': '2.0'}, 'meshes': []}).encode()
+
+    def setUp(self):
+        super().setUp()
+        upload_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, upload_dir, ignore_errors=True)
+        overrides = override_settings(MODEL_UPLOAD_DIR=upload_dir)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.house = make_house('modelled')
+        self.client = APIClient()
+        self.client.force_authenticate(make_user('admin', is_staff=True))
+        response = self.client.post(
+            reverse('model_upload_create', args=[self.house.pk]), {'filename': 'room.gltf', 'size': len(self.MODEL)}, format='json',
+        )
+        self.assertEqual(response.status_code, 201)
+        self.upload_id = response.data['upload_id']
+        self.url = reverse('model_upload', args=[self.upload_id])
+
+    def patch(self, offset, data):
+        return self.client.generic('PATCH', self.url, data, content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET=str(offset))
+
+    def test_upload_resumes_from_the_stored_offset(self):
+        self.assertEqual(self.patch(0, self.MODEL[:10]).status_code, 200)
+        conflict = self.patch(0, self.MODEL[:10])
+        self.assertEqual((conflict.status_code, conflict['Upload-Offset']), (409, '10'))
+        # A client that drops mid-chunk keeps what arrived.
+        upload = write_chunk(self.upload_id, 10, io.BytesIO(self.MODEL[10:15]), len(self.MODEL) - 10)
+        self.assertEqual(upload.offset, 15)
+        self.assertEqual(self.client.get(self.url)['Upload-Offset'], '15')
+        response = self.patch(15, self.MODEL[15:])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['state'], 'COMPLETE')
+        self.assertEqual([item['media_type'] for item in House.objects.get(pk=self.house.pk).media], ['3d_model'])
+
+    def test_chunk_in_progress_blocks_another(self):
+        ModelUpload.objects.filter(pk=self.upload_id).update(state='RECEIVING', updated_at=timezone.now())
+        self.assertEqual(self.patch(0, self.MODEL).status_code, 423)
+        ModelUpload.objects.filter(pk=self.upload_id).update(updated_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(self.patch(0, self.MODEL[:10]).status_code, 200)
+
+    def test_chunk_past_the_declared_size_is_refused(self):
+        self.assertEqual(self.patch(0, self.MODEL + b' ').status_code, 400)
+        self.assertEqual(ModelUpload.objects.get(pk=self.upload_id).offset, 0)
+
+
+class GltfMetadataTests(SimpleTestCase):
+    def metadata(self, gltf):
+        data = json.dumps(gltf).encode()
+        return gltf_metadata(io.BytesIO(data), len(data), 'gltf')
+
+    def test_counts_and_bounds_follow_the_scene_graph(self):
+        gltf = {
+            'asset': {'version': '2.0'},
+            'scene': 0,
+            'scenes': [{'nodes': [0]}],
+            'nodes': [
+                {'translation': [10, 0, 0], 'scale': [2, 2, 2], 'children': [1, 2]},
+                {'mesh': 0},
+                {'mesh': 0, 'translation': [0, 5, 0]},
+            ],
+            'meshes': [{'primitives': [{'attributes': {'POSITION': 0}, 'indices': 1}]}],
+            'accessors': [
+                {'count': 4, 'min': [-1, -1, -1], 'max': [1, 1, 1]},
+                {'count': 6},
+            ],
+        }
+        metadata = self.metadata(gltf)
+        self.assertEqual((metadata['triangles'], metadata['vertices'], metadata['meshes']), (4, 8, 1))
+        self.assertEqual(metadata['bbox'], {'min': [8.0, -2.0, -2.0], 'max': [12.0, 12.0, 2.0]})
+
+    def test_unsupported_models_are_refused(self):
+        for gltf in (
+            {'asset': {'version': '1.0'}},
+            {'asset': {'version': '2.0'}, 'buffers': [{'uri': 'scene.bin'}]},
+            {'asset': {'version': '2.0'}, 'scenes': [{'nodes': [0]}], 'nodes': [{'children': [0]}]},
+            {'asset': {'version': '2.0'}, 'scenes': [{'nodes': [0]}], 'nodes': [{'mesh': 3}]},
+        ):
+            with self.assertRaises(ModelUploadError):
+                self.metadata(gltf)
+
+
+def glb(triangles):
+    gltf = json.dumps({
+        'asset': {'version': '2.0'},
+        'meshes': [{'primitives': [{'attributes': {'POSITION': 0}, 'indices': 1}]}],
+        'accessors': [{'count': triangles * 3}, {'count': triangles * 3}],
+    }).encode()
+    gltf += b' ' * (-len(gltf) % 4)
+    return struct.pack('<4sIIII', b'glTF', 2, 20 + len(gltf), len(gltf), 0x4E4F534A) + gltf
+
+
+# Stands in for gltfpack: copies the model with its triangle count scaled by
+# the -si ratio.
+FAKE_GLTFPACK = """import json, struct, sys
+args = {name: sys.argv[i + 1] for i, name in enumerate(sys.argv[:-1]) if name in ('-i', '-o', '-si')}
+with open(args['-i'], 'rb') as source:
+    _, _, _, json_length, _ = struct.unpack('<4sIIII', source.read(20))
+    gltf = json.loads(source.read(json_length))
+for accessor in gltf['accessors']:
+    accessor['count'] = int(accessor['count'] // 3 * float(args.get('-si', 1))) * 3
+data = json.dumps(gltf).encode()
+data += b' ' * (-len(data) % 4)
+with open(args['-o'], 'wb') as target:
+    target.write(struct.pack('<4sIIII', b'glTF', 2, 20 + len(data), len(data), 0x4E4F534A) + data)
+"""
+
+
+class ModelLodTests(FakeBackendsMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, workdir, ignore_errors=True)
+        tool = os.path.join(workdir, 'gltfpack')
+        with open(tool, 'w') as script:
+            script.write(f'#!{sys.executable}\n' + FAKE_GLTFPACK)
+        os.chmod(tool, os.stat(tool).st_mode | stat.S_IEXEC)
+        model = os.path.join(workdir, 'model.glb')
+        with open(model, 'wb') as output:
+            output.write(glb(1000))
+        overrides = override_settings(
+            MODEL_OPTIMIZER_TOOL='gltfpack', GLTFPACK_BIN=tool,
+            MODEL_LODS=[('medium', 0.5, 1024), ('low', 0.15, 512), ('copy', 1, 2048)],
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.model_url = f'file://{model}'
+        self.house = make_house('modelled', media=[image('front'), {'media_type': '3d_model', 'file_url': self.model_url, 'caption': ''}])
+
+    def model_entry(self):
+        return next(item for item in House.objects.get(pk=self.house.pk).media if item['media_type'] == '3d_model')
+
+    def test_variants_are_recorded_coarsest_first(self):
+        call_command('optimize_3d_models', stdout=io.StringIO(), stderr=io.StringIO())
+        entry = self.model_entry()
+        self.assertEqual((entry['optimized_with'], entry['metadata']['triangles']), ('gltfpack', 1000))
+        # A variant no smaller than the original is dropped.
+        self.assertEqual([(variant['lod'], variant['metadata']['triangles']) for variant in entry['variants']], [('low', 150), ('medium', 500)])
+        out = io.StringIO()
+        call_command('optimize_3d_models', stdout=out)
+        self.assertIn('Optimized 0 models, 0 failed.', out.getvalue())
+
+    def test_failed_models_are_reported_and_skipped(self):
+        with open(self.model_url[len('file://'):], 'wb') as output:
+            output.write(b'not a model')
+        out, err = io.StringIO(), io.StringIO()
+        call_command('optimize_3d_models', stdout=out, stderr=err)
+        self.assertIn('Optimized 0 models, 1 failed.', out.getvalue())
+        self.assertIn(str(self.house.pk), err.getvalue())
+        self.assertNotIn('variants', self.model_entry())
+
+    @override_settings(GLTFPACK_BIN='no-such-gltfpack', GLTF_TRANSFORM_BIN='no-such-gltf-transform')
+    def test_missing_optimizer_is_reported(self):
+        for tool in ('auto', 'gltfpack', 'blender'):
+            with self.assertRaises(OptimizerUnavailable):
+                find_tool(tool)
+
+
+class Uuid7Tests(SimpleTestCase):
+    def test_ids_carry_their_creation_time(self):
+        before = int(timezone.now().timestamp() * 1000)
+        value = ids.uuid7()
+        self.assertEqual((value.version, value.variant), (7, uuid.RFC_4122))
+        self.assertLessEqual(before, value.int >> 80)
+        self.assertLessEqual(value.int >> 80, int(timezone.now().timestamp() * 1000) + 1)
+
+    @mock.patch.object(ids, '_counter', 0)
+    @mock.patch.object(ids, '_last_ms', 0)
+    def test_ids_increase_within_a_millisecond_and_when_the_clock_goes_back(self):
+        now_ns = 1_700_000_000_000 * 1_000_000
+        with mock.patch.object(ids.time, 'time_ns', return_value=now_ns):
+            generated = [ids.uuid7() for _ in range(5000)]
+        # 5000 ids can't fit in one millisecond's 4096 counter values.
+        self.assertGreater(generated[-1].int >> 80, 1_700_000_000_000)
+        with mock.patch.object(ids.time, 'time_ns', return_value=now_ns - 60 * 10 ** 9):
+            generated.append(ids.uuid7())
+        self.assertEqual(generated, sorted(generated))
+        self.assertEqual(len(set(generated)), len(generated))
+        self.assertTrue(all(value.version == 7 for value in generated))
+
+    def test_models_default_to_time_ordered_keys(self):
+        for model in (House, Reservation, Transaction, SearchAlert):
+            self.assertIs(model._meta.pk.default, ids.uuid7)
+
+
+class HistoryArchiveTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        overrides = override_settings(HISTORY_ARCHIVE_DIR=directory)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.house = make_house('archived')
+        self.alice = make_user('alice')
+        self.old = history.add_months(history.month_start(timezone.now()), -14) + timedelta(days=3)
+
+    def pay(self, reference, status, payment_date):
+        transaction = Transaction.objects.create(
+            user=self.alice, house=self.house, amount_paid=Decimal('100.00'), transaction_type='tour',
+            payment_reference=reference, payment_status=status,
+        )
+        Transaction.objects.filter(pk=transaction.pk).update(payment_date=payment_date)
+        return transaction
+
+    def test_settled_history_is_moved_to_files(self):
+        settled = [self.pay(f'old-{i}', 'SUCCESSFUL', self.old + timedelta(hours=i)) for i in range(3)]
+        self.pay('old-pending', 'PENDING', self.old)
+        self.pay('recent', 'SUCCESSFUL', timezone.now())
+        out = io.StringIO()
+        call_command('archive_history', '--dry-run', stdout=out)
+        self.assertEqual(out.getvalue().strip(), f'transaction {self.old:%Y-%m}: 3 rows')
+
+        archives, dropped = history.archive_history()
+        self.assertEqual(([(archive.kind, archive.rows) for archive in archives], dropped), ([('transaction', 3)], []))
+        archive = HistoryArchive.objects.get()
+        with open(archive.path, 'rb') as archived:
+            self.assertEqual(hashlib.sha256(archived.read()).hexdigest(), archive.sha256)
+        self.assertEqual([row['transaction_id'] for row in history.read_archive(archive)], [str(transaction.pk) for transaction in settled])
+        self.assertEqual(set(Transaction.objects.values_list('payment_reference', flat=True)), {'old-pending', 'recent'})
+        self.assertEqual(history.archive_history(), ([], []))
+
+    def test_failed_manifest_removes_the_file(self):
+        self.pay('old', 'FAILED', self.old)
+        with mock.patch.object(HistoryArchive.objects, 'create', side_effect=IntegrityError('manifest')):
+            with self.assertRaises(IntegrityError):
+                history.archive_month('transaction', history.month_start(self.old))
+        self.assertEqual(os.listdir(settings.HISTORY_ARCHIVE_DIR), [])
+        self.assertTrue(Transaction.objects.filter(payment_reference='old').exists())
+
+    def test_months_wrap_around_years(self):
+        month = history.month_start(timezone.now().replace(year=2024, month=11, day=20))
+        self.assertEqual(history.add_months(month, 2).date().isoformat(), '2025-01-01')
+        self.assertEqual(history.add_months(month, -11).date().isoformat(), '2023-12-01')
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'needs table partitioning')
+class TransactionPartitionTests(TransactionTestCase):
+    def test_partitions_are_added_and_dropped_around_the_data(self):
+        house = make_house('partitioned')
+        alice = make_user('alice')
+        now = timezone.now()
+        old_month = history.add_months(history.month_start(now), -2)
+        far_month = history.add_months(history.month_start(now), 6)
+        for reference, payment_date in (('old', old_month + timedelta(days=1)), ('far', far_month + timedelta(days=1))):
+            transaction = Transaction.objects.create(
+                user=alice, house=house, amount_paid=Decimal('100.00'), transaction_type='tour',
+                payment_reference=reference, payment_status='SUCCESSFUL',
+            )
+            Transaction.objects.filter(pk=transaction.pk).update(payment_date=payment_date)
+
+        history.partition_transaction_table(months_ahead=1)
+        self.addCleanup(history.unpartition_transaction_table)
+        self.assertTrue(history.is_partitioned())
+        self.assertEqual(sorted(history.transaction_partitions()), [history.add_months(old_month, offset) for offset in range(4)])
+        # The far future row waits in the default partition until its month
+        # is created.
+        self.assertTrue(history.create_partition(far_month))
+        self.assertFalse(history.create_partition(far_month))
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT payment_reference FROM "{history.partition_name(far_month)}"')
+            self.assertEqual(cursor.fetchall(), [('far',)])
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        archives, dropped = history.archive_history(before=history.add_months(old_month, 1), directory=directory)
+        self.assertEqual(([archive.rows for archive in archives], dropped), ([1], [history.partition_name(old_month)]))
+        self.assertEqual(list(Transaction.objects.values_list('payment_reference', flat=True)), ['far'])
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class RollupTests(TestCase):
+    def setUp(self):
+        self.house = make_house('rolled')
+        self.alice = make_user('alice')
+
+    def pay(self, reference, transaction_type='tour'):
+        return Transaction.objects.create(
+            user=self.alice, house=self.house, amount_paid=Decimal('100.00'), transaction_type=transaction_type, payment_reference=reference,
+        )
+
+    def revenue(self):
+        row = DailyRevenue.objects.filter(day=timezone.localdate(), transaction_type='tour').first()
+        return (row.amount, row.payments) if row else (Decimal('0'), 0)
+
+    def test_status_changes_are_counted_once(self):
+        transaction = self.pay('tour')
+        self.assertTrue(payments.apply_payment_status(transaction, 'SUCCESSFUL'))
+        self.assertTrue(payments.apply_payment_status(transaction, 'SUCCESSFUL'))
+        self.assertEqual(self.revenue(), (Decimal('100.00'), 1))
+        self.assertEqual(len(mail.outbox), 1)
+        payments.apply_payment_status(transaction, 'FAILED')
+        self.assertEqual(self.revenue(), (Decimal('0.00'), 0))
+
+    def test_occupancy_gauges_follow_claims_and_expiry(self):
+        self.assertEqual(occupancy().listed, 1)
+        reservation, _ = Reservation.objects.claim(self.alice, self.house)
+        self.assertEqual((occupancy().started, occupancy().active), (1, 1))
+        Reservation.objects.filter(pk=reservation.pk).update(expiry_date=timezone.now() - timedelta(seconds=1))
+        Reservation.objects.release_expired()
+        self.assertEqual((occupancy().expired, occupancy().active), (1, 0))
+        self.house.delete()
+        self.assertEqual(occupancy().listed, 0)
+
+    def test_rebuild_matches_the_live_rollups(self):
+        for i, outcome in enumerate(['SUCCESSFUL', 'SUCCESSFUL', 'FAILED']):
+            payments.apply_payment_status(self.pay(f'r{i}', ['tour', 'reserve'][i % 2]), outcome)
+        live = sorted(DailyRevenue.objects.values_list('day', 'transaction_type', 'amount', 'payments'))
+        active = occupancy().active
+        call_command('rebuild_rollups', stdout=io.StringIO())
+        self.assertEqual(sorted(DailyRevenue.objects.values_list('day', 'transaction_type', 'amount', 'payments')), live)
+        self.assertEqual(occupancy().active, active)
+        self.assertEqual(active, 1)
+
+    def test_analytics_page_reads_the_rollups(self):
+        payments.apply_payment_status(self.pay('r0', 'reserve'), 'SUCCESSFUL')
+        stats = rollups.dashboard(7)
+        self.assertEqual((len(stats['days']), stats['days'][0]['day']), (7, timezone.localdate()))
+        self.assertEqual((stats['total'], stats['payments'], stats['days'][0]['occupancy']), (Decimal('100.00'), 1, 100.0))
+        self.client.force_login(make_user('admin', is_staff=True, is_superuser=True))
+        response = self.client.get(reverse('admin:StudHomeApi_analytics'), {'days': 'many'})
+        self.assertEqual((response.status_code, response.context['window']), (200, 30))
@@ -0,0 +1,212 @@
+import functools
+import secrets
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from rest_framework.throttling import BaseThrottle
+
+
+class LockTimeout(Exception):
+    pass
+
+
+class BaseStore(ABC):
+    # Minimal key/value interface shared by the throttles and the request
+    # coalescer. add() must be atomic: it only sets the key if it is absent.
+    @abstractmethod
+    def get(self, key, default=None):
+        pass
+
+    @abstractmethod
+    def set(self, key, value, timeout):
+        pass
+
+    @abstractmethod
+    def add(self, key, value, timeout):
+        pass
+
+    @abstractmethod
+    def delete(self, key):
+        pass
+
+    def delete_if(self, key, value):
+        # Deletes key only while it still holds value. Not atomic here; the
+        # lock's ttl keeps the gap from mattering unless a holder overruns
+        # it. Stores that can compare-and-delete atomically override it.
+        if self.get(key) == value:
+            self.delete(key)
+
+    @contextmanager
+    def lock(self, key, timeout=2.0, poll=0.005, ttl=5.0):
+        # Raises LockTimeout if the lock isn't free within timeout. The
+        # token makes sure only the holder releases it, even after its ttl
+        # ran out and someone else took it.
+        lock_key = f'{key}:lock'
+        token = secrets.token_hex(8)
+        deadline = time.monotonic() + timeout
+        while not self.add(lock_key, token, ttl):
+            if time.monotonic() >= deadline:
+                raise LockTimeout(key)
+            time.sleep(poll)
+        try:
+            yield
+        finally:
+            self.delete_if(lock_key, token)
+
+
+class InMemoryStore(BaseStore):
+    def __init__(self):
+        self._data = {}
+        self._mutex = threading.Lock()
+
+    def _live(self, key):
+        item = self._data.get(key)
+        if item is not None and item[1] is not None and item[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        return item
+
+    def get(self, key, default=None):
+        with self._mutex:
+            item = self._live(key)
+            return default if item is None else item[0]
+
+    def set(self, key, value, timeout):
+        with self._mutex:
+            self._data[key] = (value, time.monotonic() + timeout if timeout else None)
+
+    def add(self, key, value, timeout):
+        with self._mutex:
+            if self._live(key) is not None:
+                return False
+            self._data[key] = (value, time.monotonic() + timeout if timeout else None)
+            return True
+
+    def delete(self, key):
+        with self._mutex:
+            self._data.pop(key, None)
+
+    def delete_if(self, key, value):
+        with self._mutex:
+            item = self._live(key)
+            if item is not None and item[0] == value:
+                del self._data[key]
+
+    def clear(self):
+        with self._mutex:
+            self._data.clear()
+
+
+class CacheStore(BaseStore):
+    # Shares state between workers when the cache backend is shared (Redis,
+    # Memcached). With the default LocMemCache it is per process.
+    def __init__(self, alias='default'):
+        self.cache = caches[alias]
+
+    def get(self, key, default=None):
+        return self.cache.get(key, default)
+
+    def set(self, key, value, timeout):
+        self.cache.set(key, value, timeout)
+
+    def add(self, key, value, timeout):
+        return self.cache.add(key, value, timeout)
+
+    def delete(self, key):
+        self.cache.delete(key)
+
+
+@functools.lru_cache(maxsize=None)
+def get_store():
+    return import_string(settings.PAYMENT_STATE_STORE)()
+
+
+class TokenBucket:
+    def __init__(self, store, capacity, refill_seconds):
+        self.store = store
+        self.capacity = capacity
+        self.refill_seconds = refill_seconds
+
+    def consume(self, key):
+        # Returns 0 when a token was taken, otherwise the seconds until one
+        # becomes available.
+        with self.store.lock(key):
+            now = time.time()
+            tokens, updated = self.store.get(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - updated) / self.refill_seconds)
+            if tokens >= 1:
+                self.store.set(key, (tokens - 1, now), self.capacity * self.refill_seconds)
+                return 0
+            self.store.set(key, (tokens, now), self.capacity * self.refill_seconds)
+            return (1 - tokens) * self.refill_seconds
+
+
+class PaymentInitiationThrottle(BaseThrottle):
+    # Token bucket per user and house, so double taps and retry storms on a
+    # bad network don't each reach the payment gateway.
+    def __init__(self):
+        self.wait_seconds = None
+
+    def allow_request(self, request, view):
+        if not request.user or not request.user.is_authenticated:
+            return True
+        bucket = TokenBucket(get_store(), settings.PAYMENT_INITIATION_BURST, settings.PAYMENT_INITIATION_REFILL_SECONDS)
+        key = f"throttle:initiate-payment:{request.user.pk}:{view.kwargs.get('house_id')}"
+        try:
+            self.wait_seconds = bucket.consume(key)
+        except LockTimeout:
+            # Only a burst of requests for the same user and house keeps the
+            # bucket locked that long.
+            self.wait_seconds = 1
+        return self.wait_seconds == 0
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class CoalescingTimeout(Exception):
+    pass
+
+
+def stored_result(key, store=None):
+    # The result run_once is replaying for key, or None.
+    return (store or get_store()).get(f'{key}:result')
+
+
+def run_once(key, fn, result_ttl, wait_timeout=30.0, poll=0.05, store=None, keep=None, inflight_ttl=None):
+    # Collapses concurrent calls sharing `key` into one execution of fn().
+    # The first caller runs it and the rest wait for its stored result.
+    # Results are replayed for result_ttl seconds; with keep, only results
+    # for which keep(result) is true are stored, and waiters on a result
+    # that wasn't kept get CoalescingTimeout. The in-flight marker lives for
+    # inflight_ttl seconds (default wait_timeout) and must outlast the
+    # slowest fn(), or a second caller would run it concurrently. It is only
+    # left to expire when the running worker dies. Returns (result, replayed).
+    store = store or get_store()
+    inflight_ttl = inflight_ttl or wait_timeout
+    result_key = f'{key}:result'
+    inflight_key = f'{key}:inflight'
+    result = store.get(result_key)
+    if result is not None:
+        return result, True
+    if store.add(inflight_key, 1, inflight_ttl):
+        try:
+            result = fn()
+            if keep is None or keep(result):
+                store.set(result_key, result, result_ttl)
+            return result, False
+        finally:
+            store.delete(inflight_key)
+    deadline = time.monotonic() + wait_timeout
+    while time.monotonic() < deadline:
+        time.sleep(poll)
+        result = store.get(result_key)
+        if result is not None:
+            return result, True
+        if store.get(inflight_key) is None:
+            break
+    raise CoalescingTimeout(key)
@@ -9,17 +9,27 @@ urlpatterns = [
 
    
     path('user/register/', views.UserRegisterAPIView.as_view(), name='user_register'),
+    path('user/bulk-register/', views.BulkUserRegisterAPIView.as_view(), name='user_bulk_register'),
     path('user/profile/', views.UserProfileAPIView.as_view(), name='user_profile'),
     path('user/reservations/', views.UserReservationsAPIView.as_view(), name='user_reservations'),
     path('user/transactions/', views.UserTransactionsAPIView.as_view(), name='user_transactions'),
     path('user/saved-homes/', views.UserSavedHomesAPIView.as_view(), name='user_saved_homes'),
+    path('user/saved-homes/bulk/', views.BulkSavedHomesAPIView.as_view(), name='bulk_saved_homes'),
+    path('user/saved-homes/lookup/', views.SavedHomesLookupAPIView.as_view(), name='saved_homes_lookup'),
+    path('user/saved-searches/', views.UserSavedSearchesAPIView.as_view(), name='user_saved_searches'),
+    path('user/saved-searches/<uuid:search_id>/', views.SavedSearchDetailAPIView.as_view(), name='saved_search_detail'),
  path('user/change-password/', views.ChangePasswordAPIView.as_view(), name='change_password'),
 
     path('houses/', views.HouseListAPIView.as_view(), name='house_list'),
+    path('houses/changes/', views.HouseChangesAPIView.as_view(), name='house_changes'),
+    path('houses/clusters/', views.HouseClustersAPIView.as_view(), name='house_clusters'),
     path('house/create/', views.HouseCreateAPIView.as_view(), name='house_create'),
     path('house/<uuid:house_id>/', views.HouseDetailAPIView.as_view(), name='house_detail'),
+    path('house/<uuid:house_id>/similar/', views.SimilarHousesAPIView.as_view(), name='similar_houses'),
     path('house/<uuid:house_id>/update/', views.HouseUpdateDeleteAPIView.as_view(), name='house_update_delete'),
     path('house/<uuid:house_id>/media/', views.HouseMediaUploadAPIView.as_view(), name='house_media_upload'),
+    path('house/<uuid:house_id>/model-uploads/', views.ModelUploadCreateAPIView.as_view(), name='model_upload_create'),
+    path('model-uploads/<uuid:upload_id>/', views.ModelUploadAPIView.as_view(), name='model_upload'),
     path('house/<uuid:house_id>/reserve/', views.ReserveHouseAPIView.as_view(), name='reserve_house'),
     path('house/<uuid:house_id>/tour/', views.BookTourAPIView.as_view(), name='book_tour'),
     path('house/<uuid:house_id>/save/', views.SaveHouseAPIView.as_view(), name='save_house'),
@@ -27,6 +37,8 @@ urlpatterns = [
 
  
     path('transaction/create/', views.TransactionCreateAPIView.as_view(), name='transaction_create'),
+    path('transactions/export/', views.TransactionExportAPIView.as_view(), name='transaction_export'),
+    path('media/stats/', views.MediaStatsAPIView.as_view(), name='media_stats'),
     path('house/<uuid:house_id>/initiate-payment/', views.InitiatePaymentAPIView.as_view(), name='initiate_payment'),
     path('payment/verify/<str:reference>/', views.VerifyPaymentAPIView.as_view(), name='verify_payment'),
 
@@ -1,28 +1,33 @@
-from datetime import timedelta
-import requests
+import hashlib
+import io
 from django.conf import settings
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from django.utils import timezone
-from django.core.mail import send_mail
-import cloudinary.uploader
-from campay.sdk import Client as CamPayClient
-from .models import House, Transaction, Reservation, User, SavedHome
-from .serializers import HouseSerializer, TransactionSerializer, ReservationSerializer, UserSerializer, SavedHomeSerializer
+from django.db import IntegrityError, transaction as db_transaction
+from django.http import QueryDict, StreamingHttpResponse
+from .models import House, HouseCard, HouseSaveCounter, ModelUpload, Transaction, Reservation, User, SavedHome, SavedSearch
+from .serializers import HouseSerializer, ModelUploadSerializer, TransactionSerializer, ReservationSerializer, UserSerializer, SavedHomeSerializer, HouseIdListSerializer, SavedSearchSerializer, house_card_rows, transaction_rows
+from .alerts import index_search
+from .clients import get_payment_gateway
+from .clusters import ViewportError, clusters_in_view, parse_bbox
+from .media import media_stats, upload_deduplicated
+from .model_uploads import ModelUploadError, UploadBusy, UploadOffsetMismatch, cancel_upload, finish_upload, gltf_metadata, start_upload, store_model, write_chunk
+from .onboarding import onboard_users, read_roster_csv
+from .payments import apply_payment_status
+from .throttling import CoalescingTimeout, PaymentInitiationThrottle, run_once, stored_result
+from .exports import EXPORT_FORMATS, ExportFilterError, parse_export_bound, stream_transactions
+from .sync import SyncTokenError, SyncTokenExpired, house_changes
+from .webhooks import record_webhook, verify_webhook_signature
 from rest_framework_simplejwt.tokens import RefreshToken  # Added for token generation
 import logging
 
 logger = logging.getLogger(__name__)
 
-campay = CamPayClient({
-    "app_username": settings.CAMPAY_USERNAME,
-    "app_password": settings.CAMPAY_PASSWORD,
-    "environment": "DEV"
-})
-
 class UserRegisterAPIView(APIView):
     permission_classes = [AllowAny]
 
@@ -40,6 +45,23 @@ class UserRegisterAPIView(APIView):
         logger.error(f"Registration errors: {serializer.errors}")
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+class BulkUserRegisterAPIView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        if 'file' in request.FILES:
+            stream = io.TextIOWrapper(request.FILES['file'].file, encoding='utf-8-sig', newline='')
+            rows = read_roster_csv(stream)
+        else:
+            rows = request.data.get('users')
+        if not isinstance(rows, list) or not rows:
+            return Response({'error': "Provide a non-empty 'users' list or a CSV 'file'"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > settings.ONBOARDING_MAX_ROWS:
+            return Response({'error': f'At most {settings.ONBOARDING_MAX_ROWS} users per request'}, status=status.HTTP_400_BAD_REQUEST)
+        if not all(isinstance(row, dict) for row in rows):
+            return Response({'error': 'Each user must be an object'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(onboard_users(rows), status=status.HTTP_200_OK)
+
 class UserProfileAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -55,17 +77,18 @@ class UserProfileAPIView(APIView):
         if not username or not username.strip():
             return Response({'error': 'Username is required'}, status=status.HTTP_400_BAD_REQUEST)
         
-        if User.objects.filter(username=username).exclude(user_id=user.user_id).exists():
-            return Response({'error': 'Username already exists'}, status=status.HTTP_400_BAD_REQUEST)
-        
         user.username = username.strip()
         if phone_number:
             user.phone_number = phone_number.strip()
         
         try:
-            user.save()
+            with db_transaction.atomic():
+                user.save(update_fields=['username', 'phone_number'])
             serializer = UserSerializer(user)
             return Response(serializer.data, status=status.HTTP_200_OK)
+        except IntegrityError:
+            user.refresh_from_db(fields=['username', 'phone_number'])
+            return Response({'error': 'Username already exists'}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({'error': 'Failed to update profile'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -94,11 +117,63 @@ class BookTourAPIView(APIView):
 class HouseListAPIView(APIView):
     def get(self, request):
         room_type = request.query_params.get('room_type')
-        houses = House.objects.filter(remove=False)
+        houses = HouseCard.objects.filter(remove=False)
         if room_type and room_type in ['single', 'double', 'apartment']:
             houses = houses.filter(room_type=room_type)
-        serializer = HouseSerializer(houses, many=True, context={'request': request})
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        if request.query_params.get('sort') == 'popular':
+            houses = houses.order_by('-saved_count', 'date_added')
+        try:
+            offset = max(int(request.query_params.get('offset', 0)), 0)
+            limit = request.query_params.get('limit')
+            if limit is not None:
+                houses = houses[offset:offset + min(max(int(limit), 1), 500)]
+            elif offset:
+                houses = houses[offset:]
+        except ValueError:
+            return Response({'error': 'limit and offset must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        # ?view=card drops media, the description excerpt and
+        # reservation_status for clients that only draw list cards.
+        full = request.query_params.get('view') != 'card'
+        return Response(house_card_rows(houses, request.user, full=full), status=status.HTTP_200_OK)
+
+class HouseChangesAPIView(APIView):
+    def get(self, request):
+        try:
+            limit = min(max(int(request.query_params.get('limit', settings.HOUSE_SYNC_PAGE_SIZE)), 1), settings.HOUSE_SYNC_MAX_PAGE_SIZE)
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            data = house_changes(request.query_params.get('since') or None, limit)
+        except SyncTokenError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except SyncTokenExpired:
+            return Response({'error': 'Sync token expired, download the full catalogue again', 'reset': True}, status=status.HTTP_410_GONE)
+        return Response(data, status=status.HTTP_200_OK)
+
+class HouseClustersAPIView(APIView):
+    def get(self, request):
+        try:
+            zoom = int(request.query_params.get('zoom', ''))
+        except ValueError:
+            return Response({'error': 'zoom must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        if not 0 <= zoom <= settings.MAP_CLUSTER_MAX_ZOOM:
+            return Response({'error': f'zoom must be between 0 and {settings.MAP_CLUSTER_MAX_ZOOM}'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            bbox = parse_bbox(request.query_params.get('bbox'))
+        except ViewportError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'zoom': zoom, 'clusters': clusters_in_view(bbox, zoom)}, status=status.HTTP_200_OK)
+
+class MediaStatsAPIView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(media_stats(), status=status.HTTP_200_OK)
+
+class SimilarHousesAPIView(APIView):
+    def get(self, request, house_id):
+        houses = HouseCard.objects.filter(house__neighbour_of__house_id=house_id, remove=False).order_by('house__neighbour_of__rank')
+        return Response(house_card_rows(houses, request.user), status=status.HTTP_200_OK)
 
 class HouseCreateAPIView(APIView):
     permission_classes = [IsAdminUser]
@@ -124,15 +199,25 @@ class HouseCreateAPIView(APIView):
             return Response({"error": "Maximum of 6 images allowed per house."}, status=status.HTTP_400_BAD_REQUEST)
         if model_count + new_model_count > 1:
             return Response({"error": "Only one 3D model allowed per house."}, status=status.HTTP_400_BAD_REQUEST)
+        model_metadata = {}
+        for file in files:
+            ext = file.name.split('.')[-1].lower()
+            if ext in ['glb', 'gltf']:
+                try:
+                    model_metadata[file.name] = gltf_metadata(file, file.size, ext)
+                except ModelUploadError as e:
+                    return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         for idx, file in enumerate(files):
             ext = file.name.split('.')[-1].lower()
-            resource_type = 'raw' if ext in ['glb', 'gltf'] else 'image'
-            media_type = '3d_model' if ext in ['glb', 'gltf'] else 'image'
-            upload_result = cloudinary.uploader.upload(file, resource_type=resource_type)
+            caption = captions[idx] if idx < len(captions) else ''
+            if ext in ['glb', 'gltf']:
+                media_list.append(store_model(file, caption, model_metadata[file.name]))
+                continue
+            file_url, _ = upload_deduplicated(file, resource_type='image')
             media_list.append({
-                'media_type': media_type,
-                'file_url': upload_result['secure_url'],
-                'caption': captions[idx] if idx < len(captions) else '',
+                'media_type': 'image',
+                'file_url': file_url,
+                'caption': caption,
                 'uploaded_at': timezone.now().isoformat()
             })
         house.media = media_list
@@ -164,6 +249,86 @@ class HouseMediaUploadAPIView(APIView):
         house = get_object_or_404(House, house_id=house_id)
         return HouseCreateAPIView().handle_media_upload(request, house)
 
+class ModelUploadCreateAPIView(APIView):
+    # Starts a resumable 3D model upload, see model_uploads.py.
+    permission_classes = [IsAdminUser]
+
+    def post(self, request, house_id):
+        house = get_object_or_404(House, house_id=house_id)
+        filename = str(request.data.get('filename', ''))
+        try:
+            size = int(request.data.get('size'))
+        except (TypeError, ValueError):
+            return Response({"error": "size must be the model size in bytes"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            upload = start_upload(house, request.user, filename, size, str(request.data.get('caption', ''))[:255])
+        except ModelUploadError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        response = Response(ModelUploadSerializer(upload).data, status=status.HTTP_201_CREATED)
+        response['Location'] = reverse('model_upload', args=[upload.upload_id])
+        response['Upload-Offset'] = upload.offset
+        response['Upload-Length'] = upload.size
+        return response
+
+class ModelUploadAPIView(APIView):
+    # GET/HEAD report the offset to resume from. PATCH appends the raw
+    # request body at Upload-Offset; the chunk that completes the file also
+    # publishes it, and an empty PATCH at the final offset retries that.
+    permission_classes = [IsAdminUser]
+    CHUNK_CONTENT_TYPES = ('application/offset+octet-stream', 'application/octet-stream')
+
+    def upload_response(self, upload, status_code=status.HTTP_200_OK):
+        response = Response(ModelUploadSerializer(upload).data, status=status_code)
+        response['Upload-Offset'] = upload.offset
+        response['Upload-Length'] = upload.size
+        response['Cache-Control'] = 'no-store'
+        return response
+
+    def get(self, request, upload_id):
+        return self.upload_response(get_object_or_404(ModelUpload, upload_id=upload_id))
+
+    def patch(self, request, upload_id):
+        if request.content_type.split(';')[0].strip() not in self.CHUNK_CONTENT_TYPES:
+            return Response({"error": "Chunks must be sent as application/offset+octet-stream"}, status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except (KeyError, ValueError):
+            return Response({"error": "Upload-Offset and Content-Length headers are required"}, status=status.HTTP_400_BAD_REQUEST)
+        if length > settings.MODEL_UPLOAD_MAX_CHUNK_SIZE:
+            return Response({"error": f"Chunks may be at most {settings.MODEL_UPLOAD_MAX_CHUNK_SIZE} bytes"}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        try:
+            # Read from the WSGI input directly so the body is never buffered.
+            upload = write_chunk(upload_id, offset, request._request, length)
+        except ModelUpload.DoesNotExist:
+            return Response({"error": "Upload not found"}, status=status.HTTP_404_NOT_FOUND)
+        except UploadOffsetMismatch as e:
+            response = Response({"error": str(e), "offset": e.offset}, status=status.HTTP_409_CONFLICT)
+            response['Upload-Offset'] = e.offset
+            return response
+        except UploadBusy as e:
+            return Response({"error": str(e)}, status=status.HTTP_423_LOCKED)
+        except ModelUploadError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if upload.offset < upload.size:
+            return self.upload_response(upload)
+        try:
+            upload = finish_upload(upload_id)
+        except ModelUploadError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response({"error": f"Storing the model failed, retry with an empty PATCH: {e}"}, status=status.HTTP_502_BAD_GATEWAY)
+        if upload.state == 'COMPLETE':
+            return self.upload_response(upload, status.HTTP_201_CREATED)
+        return self.upload_response(upload, status.HTTP_202_ACCEPTED)
+
+    def delete(self, request, upload_id):
+        upload = get_object_or_404(ModelUpload, upload_id=upload_id)
+        if upload.state in ('PROCESSING', 'COMPLETE'):
+            return Response({"error": f"Upload is {upload.get_state_display().lower()}"}, status=status.HTTP_409_CONFLICT)
+        cancel_upload(upload)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
 class ReserveHouseAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -215,8 +380,30 @@ class UserTransactionsAPIView(APIView):
 
     def get(self, request):
         transactions = Transaction.objects.filter(user=request.user)
-        serializer = TransactionSerializer(transactions, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        # No user, like the TransactionSerializer this replaced, which had no
+        # request context: reserved_by_user stays false.
+        return Response(transaction_rows(transactions), status=status.HTTP_200_OK)
+
+class TransactionExportAPIView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        file_format = request.query_params.get('file_format', 'ndjson')
+        if file_format not in EXPORT_FORMATS:
+            return Response({'error': f"file_format must be one of {', '.join(sorted(EXPORT_FORMATS))}"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            start = parse_export_bound(request.query_params.get('start'))
+            end = parse_export_bound(request.query_params.get('end'), end=True)
+        except ExportFilterError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        statuses = [value for value in request.query_params.get('status', '').split(',') if value]
+        response = StreamingHttpResponse(
+            stream_transactions(file_format, start, end, statuses),
+            content_type=EXPORT_FORMATS[file_format],
+        )
+        filename = f"transactions-{timezone.now():%Y%m%d%H%M%S}.{file_format}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
 
 class SaveHouseAPIView(APIView):
     permission_classes = [IsAuthenticated]
@@ -249,8 +436,111 @@ class UserSavedHomesAPIView(APIView):
         serializer = SavedHomeSerializer(saved_homes, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+class UserSavedSearchesAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        searches = SavedSearch.objects.filter(user=request.user)
+        return Response(SavedSearchSerializer(searches, many=True).data, status=status.HTTP_200_OK)
+
+    def post(self, request):
+        if SavedSearch.objects.filter(user=request.user).count() >= settings.SAVED_SEARCHES_PER_USER:
+            return Response({'error': f'At most {settings.SAVED_SEARCHES_PER_USER} saved searches allowed'}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = SavedSearchSerializer(data=request.data)
+        if serializer.is_valid():
+            with db_transaction.atomic():
+                search = serializer.save(user=request.user)
+                index_search(search)
+            return Response(SavedSearchSerializer(search).data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+class SavedSearchDetailAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def put(self, request, search_id):
+        search = get_object_or_404(SavedSearch, search_id=search_id, user=request.user)
+        serializer = SavedSearchSerializer(search, data=request.data, partial=True)
+        if serializer.is_valid():
+            with db_transaction.atomic():
+                search = serializer.save()
+                index_search(search)
+            return Response(SavedSearchSerializer(search).data, status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    def delete(self, request, search_id):
+        search = get_object_or_404(SavedSearch, search_id=search_id, user=request.user)
+        search.delete()
+        return Response({'message': 'Saved search deleted'}, status=status.HTTP_200_OK)
+
+class BulkSavedHomesAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def house_ids(self, request):
+        data = request.data
+        if not data and request.query_params.get('house_ids'):
+            data = {'house_ids': request.query_params['house_ids'].split(',')}
+        serializer = HouseIdListSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        return set(serializer.validated_data['house_ids'])
+
+    def post(self, request):
+        house_ids = self.house_ids(request)
+        found = set(House.objects.filter(house_id__in=house_ids).values_list('house_id', flat=True))
+        already_saved = set(
+            SavedHome.objects.filter(user=request.user, house_id__in=found).values_list('house_id', flat=True)
+        )
+        saved_homes = [SavedHome(user=request.user, house_id=house_id) for house_id in found - already_saved]
+        with db_transaction.atomic():
+            SavedHome.objects.bulk_create(saved_homes, ignore_conflicts=True)
+            # Rows a concurrent request inserted first were skipped; only the
+            # ids generated here tell which rows this request wrote.
+            new_ids = set(
+                SavedHome.objects.filter(saved_home_id__in=[saved_home.saved_home_id for saved_home in saved_homes])
+                .values_list('house_id', flat=True)
+            )
+            # bulk_create() skips the SavedHome signals, so bump the counters here.
+            for house_id in new_ids:
+                HouseSaveCounter.increment(house_id, 1)
+        already_saved = found - new_ids
+        return Response({
+            'saved': sorted(str(house_id) for house_id in new_ids),
+            'already_saved': sorted(str(house_id) for house_id in already_saved),
+            'not_found': sorted(str(house_id) for house_id in house_ids - found),
+        }, status=status.HTTP_200_OK)
+
+    def delete(self, request):
+        house_ids = self.house_ids(request)
+        removed, _ = SavedHome.objects.filter(user=request.user, house_id__in=house_ids).delete()
+        return Response({'removed': removed}, status=status.HTTP_200_OK)
+
+class SavedHomesLookupAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        raw_ids = [value for value in request.query_params.get('house_ids', '').split(',') if value]
+        serializer = HouseIdListSerializer(data={'house_ids': raw_ids})
+        serializer.is_valid(raise_exception=True)
+        house_ids = serializer.validated_data['house_ids']
+        saved = set(
+            SavedHome.objects.filter(user=request.user, house_id__in=house_ids).values_list('house_id', flat=True)
+        )
+        return Response({str(house_id): house_id in saved for house_id in house_ids}, status=status.HTTP_200_OK)
+
 class InitiatePaymentAPIView(APIView):
     permission_classes = [IsAuthenticated]
+    throttle_classes = [PaymentInitiationThrottle]
+
+    def idempotency_cache_key(self, request):
+        idempotency_key = request.headers.get('Idempotency-Key')
+        return f"initiate-payment:{request.user.pk}:key:{idempotency_key}" if idempotency_key else None
+
+    def check_throttles(self, request):
+        # A retry with an Idempotency-Key that already has a stored result is
+        # a replay and must not spend tokens or get a 429 instead of it.
+        key = self.idempotency_cache_key(request)
+        if key and stored_result(key) is not None:
+            return
+        super().check_throttles(request)
 
     def post(self, request, house_id):
         try:
@@ -271,52 +561,81 @@ class InitiatePaymentAPIView(APIView):
                 errors.append("Transaction type must be 'reserve' or 'tour'")
             if errors:
                 return Response({'error': errors}, status=status.HTTP_400_BAD_REQUEST)
-            if transaction_type == 'tour':
-                active_reservation = Reservation.objects.filter(
-                    house=house,
-                    is_active=True,
-                    expiry_date__gt=timezone.now()
-                ).first()
-                if active_reservation and active_reservation.user != request.user:
-                    return Response({"error": "Cannot book a tour; house is reserved by another user"}, status=status.HTTP_400_BAD_REQUEST)
-            existing_transaction = Transaction.objects.filter(
-                payment_reference__isnull=False,
-                house=house,
-                user=request.user,
-                transaction_type=transaction_type,
-                payment_status='PENDING'
-            ).first()
-            if existing_transaction:
-                existing_transaction.delete()
+            # Only successful initiations are replayed, so a gateway hiccup
+            # can be retried straight away. The stored result carries a hash
+            # of the request it answered; reusing an Idempotency-Key for a
+            # different request is refused.
+            fingerprint = hashlib.sha256(f'{house.house_id}|{transaction_type}|{amount}|{phone_number}'.encode()).hexdigest()
+            key = self.idempotency_cache_key(request)
+            if key:
+                result_ttl = settings.PAYMENT_IDEMPOTENCY_TTL
+            else:
+                key = f"initiate-payment:{request.user.pk}:{house.house_id}:{transaction_type}:{amount}:{phone_number}"
+                result_ttl = settings.PAYMENT_COALESCE_WINDOW
             try:
-                payment_response = campay.initCollect({
-                    "amount": str(amount),
-                    "currency": "XAF",
-                    "from": phone_number,
-                    "description": f"Payment for {transaction_type} - {house.house_name}",
-                    "external_reference": str(house.house_id),
-                })
-            except Exception as e:
-                return Response({'error': f'Failed to initiate payment: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
-            reference = payment_response.get('reference')
-            if not reference:
-                return Response({'error': 'Failed to initiate payment: No reference returned'}, status=status.HTTP_400_BAD_REQUEST)
-            transaction = Transaction.objects.create(
-                user=request.user,
-                house=house,
-                amount_paid=amount,
-                transaction_type=transaction_type,
-                payment_reference=reference,
-                payment_status='PENDING',
-            )
-            return Response({
-                'reference': reference,
-                'transaction_id': str(transaction.transaction_id),
-                'message': 'Payment initiated. Please complete payment via mobile money.'
-            }, status=status.HTTP_201_CREATED)
+                (data, status_code, request_hash), replayed = run_once(
+                    key,
+                    lambda: (*self.initiate(request, house, amount, phone_number, transaction_type), fingerprint),
+                    result_ttl=result_ttl,
+                    keep=lambda result: status.is_success(result[1]),
+                    inflight_ttl=settings.PAYMENT_INFLIGHT_TTL,
+                )
+            except CoalescingTimeout:
+                return Response({'error': 'Payment initiation already in progress, please retry'}, status=status.HTTP_409_CONFLICT)
+            if request_hash != fingerprint:
+                return Response({'error': 'Idempotency-Key was already used for a different request'}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            response = Response(data, status=status_code)
+            if replayed:
+                response['Idempotent-Replayed'] = 'true'
+            return response
         except House.DoesNotExist:
             return Response({'error': 'House not found'}, status=status.HTTP_404_NOT_FOUND)
 
+    def initiate(self, request, house, amount, phone_number, transaction_type):
+        active_reservation = Reservation.objects.filter(
+            house=house,
+            is_active=True,
+            expiry_date__gt=timezone.now()
+        ).first()
+        if active_reservation and active_reservation.user_id != request.user.pk:
+            if transaction_type == 'tour':
+                return {"error": "Cannot book a tour; house is reserved by another user"}, status.HTTP_400_BAD_REQUEST
+            return {"error": "House is reserved by another user"}, status.HTTP_400_BAD_REQUEST
+        existing_transaction = Transaction.objects.filter(
+            payment_reference__isnull=False,
+            house=house,
+            user=request.user,
+            transaction_type=transaction_type,
+            payment_status='PENDING'
+        ).first()
+        if existing_transaction:
+            existing_transaction.delete()
+        try:
+            payment_response = get_payment_gateway().init_collect(
+                amount=amount,
+                phone_number=phone_number,
+                description=f"Payment for {transaction_type} - {house.house_name}",
+                external_reference=str(house.house_id),
+            )
+        except Exception as e:
+            return {'error': f'Failed to initiate payment: {str(e)}'}, status.HTTP_400_BAD_REQUEST
+        reference = payment_response.get('reference')
+        if not reference:
+            return {'error': 'Failed to initiate payment: No reference returned'}, status.HTTP_400_BAD_REQUEST
+        transaction = Transaction.objects.create(
+            user=request.user,
+            house=house,
+            amount_paid=amount,
+            transaction_type=transaction_type,
+            payment_reference=reference,
+            payment_status='PENDING',
+        )
+        return {
+            'reference': reference,
+            'transaction_id': str(transaction.transaction_id),
+            'message': 'Payment initiated. Please complete payment via mobile money.'
+        }, status.HTTP_201_CREATED
+
 class VerifyPaymentAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -329,58 +648,14 @@ class VerifyPaymentAPIView(APIView):
             if not transaction:
                 return Response({'error': 'Transaction not found'}, status=status.HTTP_404_NOT_FOUND)
             try:
-                payment_data = campay.get_transaction_status({
-                    "reference": reference
-                })
+                payment_data = get_payment_gateway().get_transaction_status(reference)
             except Exception as e:
                 return Response({'error': f'Failed to verify payment: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
             transaction_status = payment_data.get('status')
             if not transaction_status:
                 return Response({'error': 'Failed to verify payment: No status returned'}, status=status.HTTP_400_BAD_REQUEST)
-            transaction.payment_status = transaction_status
-            transaction.save()
-            if transaction_status == 'SUCCESSFUL':
-                if transaction.transaction_type == 'reserve':
-                    active_reservation = Reservation.objects.filter(
-                        house=transaction.house,
-                        is_active=True,
-                        expiry_date__gt=timezone.now()
-                    ).first()
-                    if active_reservation and active_reservation.user != request.user:
-                        return Response({"error": "House is reserved by another user"}, status=status.HTTP_400_BAD_REQUEST)
-                    reservation = Reservation.objects.create(
-                        user=transaction.user,
-                        house=transaction.house,
-                        is_active=True,
-                        expiry_date=timezone.now() + timedelta(days=7)
-                    )
-                    transaction.house.is_reserved = True
-                    transaction.house.save()
-                    send_mail(
-                        subject="Payment Approved for Your Reservation",
-                        message=(
-                            f"Dear {transaction.user.username},\n\n"
-                            f"Your payment of {transaction.amount_paid} XAF for reservation {reservation.reservation_id} "
-                            f"(House: {transaction.house.house_name}) has been approved.\n\n"
-                            f"Thank you for booking with StudHome!\n\nBest regards,\nStudHome Team"
-                        ),
-                        from_email=settings.DEFAULT_FROM_EMAIL,
-                        recipient_list=[transaction.user.email],
-                        fail_silently=False,
-                    )
-                elif transaction.transaction_type == 'tour':
-                    send_mail(
-                        subject="Payment Approved for Your Tour",
-                        message=(
-                            f"Dear {transaction.user.username},\n\n"
-                            f"Your payment of {transaction.amount_paid} XAF for booking a tour "
-                            f"of house '{transaction.house.house_name}' has been approved.\n\n"
-                            f"Thank you for using StudHome!\n\nBest regards,\nStudHome Team"
-                        ),
-                        from_email=settings.DEFAULT_FROM_EMAIL,
-                        recipient_list=[transaction.user.email],
-                        fail_silently=False,
-                    )
+            if not apply_payment_status(transaction, transaction_status):
+                return Response({"error": "House is reserved by another user"}, status=status.HTTP_400_BAD_REQUEST)
             return Response({
                 'status': transaction_status,
                 'transaction_id': str(transaction.transaction_id),
@@ -389,56 +664,21 @@ class VerifyPaymentAPIView(APIView):
             return Response({'error': f'Unexpected error during verification: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 class PaymentWebhookAPIView(APIView):
+    # Acknowledge as soon as the event is stored; process_webhooks applies it.
+    authentication_classes = []
     permission_classes = []
 
     def post(self, request):
-        data = request.data
+        # Form posts arrive as a QueryDict; keep one value per field.
+        data = request.data.dict() if isinstance(request.data, QueryDict) else dict(request.data)
         reference = data.get("reference")
         status_update = data.get("status")
         if not reference or not status_update:
             return Response({"error": "Invalid payload"}, status=status.HTTP_400_BAD_REQUEST)
-        try:
-            transaction = Transaction.objects.get(payment_reference=reference)
-            transaction.payment_status = status_update
-            transaction.save()
-            if status_update == 'SUCCESSFUL':
-                if transaction.transaction_type == 'reserve':
-                    reservation = Reservation.objects.create(
-                        user=transaction.user,
-                        house=transaction.house,
-                        is_active=True,
-                        expiry_date=timezone.now() + timedelta(days=7)
-                    )
-                    transaction.house.is_reserved = True
-                    transaction.house.save()
-                    send_mail(
-                        subject="Payment Approved for Your Reservation",
-                        message=(
-                            f"Dear {transaction.user.username},\n\n"
-                            f"Your payment of {transaction.amount_paid} XAF for reservation {reservation.reservation_id} "
-                            f"(House: {transaction.house.house_name}) has been approved.\n\n"
-                            f"Thank you for booking with StudHome!\n\nBest regards,\nStudHome Team"
-                        ),
-                        from_email=settings.DEFAULT_FROM_EMAIL,
-                        recipient_list=[transaction.user.email],
-                        fail_silently=False,
-                    )
-                elif transaction.transaction_type == 'tour':
-                    send_mail(
-                        subject="Payment Approved for Your Tour",
-                        message=(
-                            f"Dear {transaction.user.username},\n\n"
-                            f"Your payment of {transaction.amount_paid} XAF for booking a tour "
-                            f"of house '{transaction.house.house_name}' has been approved.\n\n"
-                            f"Thank you for using StudHome!\n\nBest regards,\nStudHome Team"
-                        ),
-                        from_email=settings.DEFAULT_FROM_EMAIL,
-                        recipient_list=[transaction.user.email],
-                        fail_silently=False,
-                    )
-            return Response({"message": "Webhook received"}, status=status.HTTP_200_OK)
-        except Transaction.DoesNotExist:
-            return Response({"error": "Transaction not found"}, status=status.HTTP_404_NOT_FOUND)
+        if not verify_webhook_signature(data):
+            return Response({"error": "Invalid signature"}, status=status.HTTP_403_FORBIDDEN)
+        record_webhook(str(reference), str(status_update), data)
+        return Response({"message": "Webhook received"}, status=status.HTTP_200_OK)
 
 class ChangePasswordAPIView(APIView):
     permission_classes = [IsAuthenticated]
@@ -466,7 +706,7 @@ class ChangePasswordAPIView(APIView):
             )
 
         request.user.set_password(new_password)
-        request.user.save()
+        request.user.save(update_fields=['password'])
 
         return Response(
             {'message': 'Password changed successfully'}, 
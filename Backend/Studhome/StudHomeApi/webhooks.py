@@ -0,0 +1,164 @@
+import logging
+import queue
+import threading
+import zlib
+from datetime import timedelta
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+from .models import Transaction, WebhookEvent
+from .payments import apply_payment_status
+
+logger = logging.getLogger(__name__)
+
+
+def sign_webhook_payload(payload, key=None):
+    # CamPay signs webhooks with a JWT in the `signature` field, HS256 with
+    # the application's webhook key. Used by the fake gateway and load tests.
+    import jwt
+    key = settings.CAMPAY_WEBHOOK_KEY if key is None else key
+    if not key:
+        return payload
+    claims = {name: value for name, value in payload.items() if name != 'signature'}
+    return dict(payload, signature=jwt.encode(claims, key, algorithm='HS256'))
+
+
+def verify_webhook_signature(payload, key=None):
+    # The signed claims must carry the payload's reference and status. With
+    # no key configured unsigned webhooks are only accepted in development
+    # (DEBUG or OFFLINE_BACKENDS); otherwise every webhook is refused.
+    key = settings.CAMPAY_WEBHOOK_KEY if key is None else key
+    if not key:
+        return settings.DEBUG or settings.OFFLINE_BACKENDS
+    import jwt
+    signature = payload.get('signature')
+    if not signature:
+        return False
+    try:
+        claims = jwt.decode(signature, key, algorithms=['HS256'])
+    except jwt.InvalidTokenError:
+        return False
+    return all(name in claims and str(claims[name]) == str(payload.get(name)) for name in ('reference', 'status'))
+
+
+def record_webhook(reference, payment_status, payload):
+    # A single INSERT; a repeated (reference, status) is dropped by the
+    # unique constraint.
+    WebhookEvent.objects.bulk_create(
+        [WebhookEvent(reference=reference, status=payment_status, payload=payload)],
+        ignore_conflicts=True,
+    )
+
+
+def process_event(event):
+    # Returns True when the event is finished (processed or failed for good)
+    # and False when it should be retried later, e.g. because the webhook
+    # arrived before the initiating request saved its Transaction.
+    event.attempts += 1
+    try:
+        transaction = (
+            Transaction.objects.select_related('user', 'house')
+            .filter(payment_reference=event.reference)
+            .order_by('-payment_date')
+            .first()
+        )
+        if transaction is None:
+            raise LookupError('Transaction not found')
+        applied = apply_payment_status(transaction, event.status)
+    except Exception as e:
+        event.error = str(e)
+        if event.attempts < settings.WEBHOOK_MAX_ATTEMPTS:
+            event.available_at = timezone.now() + timedelta(seconds=settings.WEBHOOK_RETRY_DELAY * 2 ** (event.attempts - 1))
+            event.save(update_fields=['attempts', 'error', 'available_at'])
+            return False
+        logger.warning(f"Webhook {event.reference} {event.status} failed after {event.attempts} attempts: {e}")
+        event.state = 'FAILED'
+        event.processed_at = timezone.now()
+        event.save(update_fields=['attempts', 'error', 'state', 'processed_at'])
+        return True
+    if not applied:
+        # Retrying can't give the house back; the transaction is flagged
+        # needs_refund for an admin.
+        event.state = 'FAILED'
+        event.error = 'House is reserved by another user, payment needs a refund'
+        event.processed_at = timezone.now()
+        event.save(update_fields=['attempts', 'error', 'state', 'processed_at'])
+        return True
+    event.state = 'PROCESSED'
+    event.error = ''
+    event.processed_at = timezone.now()
+    event.save(update_fields=['attempts', 'error', 'state', 'processed_at'])
+    return True
+
+
+class WebhookProcessor:
+    # Reads pending events in event_id order and hands each to the worker
+    # chosen by crc32(reference), so events for one reference are applied
+    # one at a time and in arrival order while different references run in
+    # parallel. Run a single processor per database.
+    def __init__(self, workers=None, batch_size=None):
+        self.workers = workers or settings.WEBHOOK_WORKERS
+        self.batch_size = batch_size or settings.WEBHOOK_BATCH_SIZE
+        self.processed = 0
+        self.deferred = 0
+        self._mutex = threading.Lock()
+
+    def run_once(self):
+        # Processes everything pending when called. Returns the number of
+        # events that finished in this pass.
+        before = self.processed
+        now = timezone.now()
+        queues = [queue.Queue() for _ in range(self.workers)]
+        threads = [threading.Thread(target=self.work, args=(q,), daemon=True) for q in queues]
+        for thread in threads:
+            thread.start()
+        last_id = 0
+        try:
+            while True:
+                batch = list(
+                    WebhookEvent.objects.filter(state='PENDING', event_id__gt=last_id)
+                    .order_by('event_id')[:self.batch_size]
+                )
+                if not batch:
+                    break
+                for event in batch:
+                    queues[zlib.crc32(event.reference.encode()) % self.workers].put((event, now))
+                last_id = batch[-1].event_id
+        finally:
+            for q in queues:
+                q.put(None)
+            for thread in threads:
+                thread.join()
+            close_old_connections()
+        return self.processed - before
+
+    def work(self, events):
+        # An event waiting for a retry holds back the later events of its
+        # reference for the rest of this pass so statuses never overtake it.
+        blocked = set()
+        try:
+            while True:
+                item = events.get()
+                if item is None:
+                    return
+                event, now = item
+                if event.reference in blocked:
+                    continue
+                if event.available_at > now:
+                    blocked.add(event.reference)
+                    continue
+                if process_event(event):
+                    with self._mutex:
+                        self.processed += 1
+                else:
+                    blocked.add(event.reference)
+                    with self._mutex:
+                        self.deferred += 1
+        finally:
+            close_old_connections()
+
+    def run_forever(self, poll=1.0, stop=None):
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            if not self.run_once():
+                stop.wait(poll)
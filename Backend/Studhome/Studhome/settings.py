@@ -10,16 +10,13 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import tempfile
 from pathlib import Path
 from decouple import config
-import os
-from dotenv import load_dotenv
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
-load_dotenv(BASE_DIR / '.env')
-
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
@@ -57,6 +54,10 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'StudHomeApi.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
 MIDDLEWARE = [
@@ -94,22 +95,25 @@ WSGI_APPLICATION = 'Studhome.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# DB_ENGINE=django.db.backends.sqlite3 runs without a database server.
+DB_ENGINE = config('DB_ENGINE', default='django.db.backends.postgresql')
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': os.getenv("DB_NAME"),
-        'USER': os.getenv("DB_USER"),
-        'PASSWORD': os.getenv("DB_PASSWORD"),
-        'HOST': os.getenv("DB_HOST"),
-        'PORT': os.getenv("DB_PORT"),
+        'ENGINE': DB_ENGINE,
+        'NAME': config('DB_NAME', default=str(BASE_DIR / 'db.sqlite3') if DB_ENGINE.endswith('sqlite3') else None),
+        'USER': config('DB_USER', default=None),
+        'PASSWORD': config('DB_PASSWORD', default=None),
+        'HOST': config('DB_HOST', default=None),
+        'PORT': config('DB_PORT', default=None),
     }
 }
 
 
 CLOUDINARY_STORAGE = {
-    'CLOUD_NAME': os.getenv('CLOUDINARY_CLOUD_NAME'),
-    'API_KEY': os.getenv('CLOUDINARY_API_KEY'),
-    'API_SECRET': os.getenv('CLOUDINARY_API_SECRET'),
+    'CLOUD_NAME': config('CLOUDINARY_CLOUD_NAME', default=None),
+    'API_KEY': config('CLOUDINARY_API_KEY', default=None),
+    'API_SECRET': config('CLOUDINARY_API_SECRET', default=None),
 }
 
 DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
@@ -132,6 +136,37 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing. PASSWORD_HASHER_POLICY picks the hasher for new and
+# upgraded hashes; the others stay listed so existing hashes still verify and
+# get rehashed in the background on the next login.
+PASSWORD_HASHER_POLICY = config('PASSWORD_HASHER_POLICY', default='argon2')
+
+_POLICY_HASHERS = {
+    'argon2': 'StudHomeApi.hashers.TunedArgon2PasswordHasher',
+    'scrypt': 'StudHomeApi.hashers.TunedScryptPasswordHasher',
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+}
+
+PASSWORD_HASHERS = [_POLICY_HASHERS[PASSWORD_HASHER_POLICY]] + [
+    hasher for policy, hasher in _POLICY_HASHERS.items() if policy != PASSWORD_HASHER_POLICY
+] + ['django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher']
+
+# OWASP minimums: argon2id with 19 MiB, 2 iterations, 1 lane; scrypt N=2^15.
+ARGON2_TIME_COST = config('ARGON2_TIME_COST', default=2, cast=int)
+ARGON2_MEMORY_COST = config('ARGON2_MEMORY_COST', default=19456, cast=int)
+ARGON2_PARALLELISM = config('ARGON2_PARALLELISM', default=1, cast=int)
+SCRYPT_WORK_FACTOR = config('SCRYPT_WORK_FACTOR', default=2 ** 15, cast=int)
+SCRYPT_BLOCK_SIZE = config('SCRYPT_BLOCK_SIZE', default=8, cast=int)
+SCRYPT_PARALLELISM = config('SCRYPT_PARALLELISM', default=1, cast=int)
+
+# Worker processes used by bulk hashing (roster onboarding); 0 hashes on the
+# calling thread. Single registrations and logins always hash inline.
+PASSWORD_HASHING_WORKERS = config('PASSWORD_HASHING_WORKERS', default=0, cast=int)
+PASSWORD_HASHING_START_METHOD = 'spawn'
+
+# Largest roster accepted by the bulk registration endpoint.
+ONBOARDING_MAX_ROWS = 5000
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
@@ -159,10 +194,123 @@ SIMPLE_JWT = {
     'USER_ID_FIELD': 'user_id', 
 }
 
-CAMPAY_USERNAME = config('CAMPAY_USERNAME')
-CAMPAY_PASSWORD = config('CAMPAY_PASSWORD')
-
-
-
-EMAIL_HOST_USER = os.getenv("EMAIL_HOST_USER")
-EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD")
\ No newline at end of file
+CAMPAY_USERNAME = config('CAMPAY_USERNAME', default='')
+CAMPAY_PASSWORD = config('CAMPAY_PASSWORD', default='')
+CAMPAY_ENVIRONMENT = config('CAMPAY_ENVIRONMENT', default='DEV')
+# Key CamPay signs webhook payloads with. While it is empty, unsigned
+# webhooks are accepted only with DEBUG or OFFLINE_BACKENDS and refused
+# otherwise.
+CAMPAY_WEBHOOK_KEY = config('CAMPAY_WEBHOOK_KEY', default='')
+
+# Webhook inbox processing (process_webhooks). Retries back off from
+# WEBHOOK_RETRY_DELAY seconds, doubling each attempt.
+WEBHOOK_WORKERS = config('WEBHOOK_WORKERS', default=4, cast=int)
+WEBHOOK_BATCH_SIZE = 500
+WEBHOOK_MAX_ATTEMPTS = 6
+WEBHOOK_RETRY_DELAY = 2
+
+# Payment gateway, media store and mail backends. OFFLINE_BACKENDS=True
+# swaps all three for the in-process fakes in StudHomeApi.backends.
+OFFLINE_BACKENDS = config('OFFLINE_BACKENDS', default=False, cast=bool)
+PAYMENT_GATEWAY = config('PAYMENT_GATEWAY', default='StudHomeApi.backends.FakePaymentGateway' if OFFLINE_BACKENDS else 'StudHomeApi.backends.CamPayGateway')
+MEDIA_STORE = config('MEDIA_STORE', default='StudHomeApi.backends.FakeMediaStore' if OFFLINE_BACKENDS else 'StudHomeApi.backends.CloudinaryMediaStore')
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='StudHomeApi.backends.FakeEmailBackend' if OFFLINE_BACKENDS else 'django.core.mail.backends.smtp.EmailBackend')
+
+# Fake backend behaviour. Latency is in seconds per call, the webhook delay
+# is seconds after initiation (negative disables the callback) and the
+# webhook is dispatched in process unless FAKE_PAYMENT_WEBHOOK_URL is set.
+FAKE_BACKEND_LATENCY = config('FAKE_BACKEND_LATENCY', default=0.0, cast=float)
+FAKE_BACKEND_ERROR_RATE = config('FAKE_BACKEND_ERROR_RATE', default=0.0, cast=float)
+FAKE_PAYMENT_OUTCOME = config('FAKE_PAYMENT_OUTCOME', default='SUCCESSFUL')
+FAKE_PAYMENT_SETTLE_AFTER = config('FAKE_PAYMENT_SETTLE_AFTER', default=0.0, cast=float)
+FAKE_PAYMENT_WEBHOOK_DELAY = config('FAKE_PAYMENT_WEBHOOK_DELAY', default=1.0, cast=float)
+FAKE_PAYMENT_WEBHOOK_URL = config('FAKE_PAYMENT_WEBHOOK_URL', default='')
+FAKE_MEDIA_BASE_URL = config('FAKE_MEDIA_BASE_URL', default='https://media.invalid')
+
+# Payment initiation throttling, idempotency and request coalescing.
+# Point PAYMENT_STATE_STORE at CacheStore backed by a shared cache (Redis,
+# Memcached) when running several workers.
+PAYMENT_STATE_STORE = 'StudHomeApi.throttling.CacheStore'
+PAYMENT_INITIATION_BURST = 3
+PAYMENT_INITIATION_REFILL_SECONDS = 20
+PAYMENT_IDEMPOTENCY_TTL = 24 * 60 * 60
+PAYMENT_COALESCE_WINDOW = 10
+# How long a payment initiation counts as in flight. Must outlast the
+# slowest gateway call: the CamPay SDK sends collect requests without a
+# timeout, so this is set well past any response worth waiting for.
+PAYMENT_INFLIGHT_TTL = 5 * 60
+
+# Number of rows each house's saved-home counter is spread over.
+SAVE_COUNTER_SHARDS = 8
+
+# Maximum number of house ids accepted by the bulk saved-homes endpoints.
+SAVED_HOMES_BULK_LIMIT = 100
+
+# Delta sync (houses/changes/). Changes younger than the lag are held back
+# until in-flight transactions have committed; tokens older than the
+# tombstone retention get 410 and must resync from scratch.
+HOUSE_SYNC_PAGE_SIZE = 200
+HOUSE_SYNC_MAX_PAGE_SIZE = 1000
+HOUSE_SYNC_LAG_SECONDS = 2
+HOUSE_TOMBSTONE_RETENTION_DAYS = 90
+
+# Map clustering (houses/clusters/). Each map tile is split into
+# 2**MAP_CLUSTER_CELL_BITS cells per side; zooms up to the precomputed limit
+# are read from MapCluster, finer ones are aggregated per request. House
+# changes reach MapCluster when fold_map_clusters runs.
+MAP_CLUSTER_CELL_BITS = 3
+MAP_CLUSTER_MAX_PRECOMPUTED_ZOOM = 10
+MAP_CLUSTER_MAX_ZOOM = 22
+
+# Saved-search alerts. Geo cells are the map cluster grid at this zoom
+# (about 10 km wide at the equator). Alerts claimed by a sender that died
+# are sent again after SEARCH_ALERT_CLAIM_MINUTES.
+SAVED_SEARCH_GEO_ZOOM = 9
+SAVED_SEARCH_MAX_RADIUS_KM = 50
+SAVED_SEARCHES_PER_USER = 10
+SEARCH_ALERT_BATCH_SIZE = 500
+SEARCH_ALERT_CLAIM_MINUTES = 15
+
+# Bulk house import (import_houses). Media sources must be http(s) URLs or
+# files under MEDIA_IMPORT_DIR; local files are refused while it is empty.
+# Uploads claimed by a worker that died are retried after
+# MEDIA_UPLOAD_CLAIM_MINUTES.
+MEDIA_IMPORT_DIR = config('MEDIA_IMPORT_DIR', default='')
+MEDIA_UPLOAD_CLAIM_MINUTES = 15
+
+# Resumable 3D model uploads (house/<id>/model-uploads/). Chunks are staged
+# on local disk, which must be shared by all workers; finished models go to
+# the media store in MEDIA_UPLOAD_CHUNK_SIZE requests (Cloudinary's minimum
+# is 5 MB). Unfinished uploads are pruned after MODEL_UPLOAD_EXPIRY_HOURS.
+# A chunk still being received after MODEL_UPLOAD_CHUNK_TIMEOUT seconds is
+# taken to be abandoned and the next PATCH may resume the upload.
+MODEL_UPLOAD_DIR = config('MODEL_UPLOAD_DIR', default=str(Path(tempfile.gettempdir()) / 'studhome-model-uploads'))
+MODEL_UPLOAD_MAX_SIZE = config('MODEL_UPLOAD_MAX_SIZE', default=200 * 1024 * 1024, cast=int)
+MODEL_UPLOAD_MAX_CHUNK_SIZE = 8 * 1024 * 1024
+MODEL_UPLOAD_CHUNK_TIMEOUT = 10 * 60
+MODEL_UPLOAD_EXPIRY_HOURS = 24
+MEDIA_UPLOAD_CHUNK_SIZE = 20 * 1024 * 1024
+
+# 3D model LODs (optimize_3d_models): (name, simplify ratio, max texture
+# size) per variant. MODEL_OPTIMIZER_TOOL is auto, gltf-transform or
+# gltfpack; only gltf-transform downscales textures.
+MODEL_LODS = [('medium', 0.5, 1024), ('low', 0.15, 512)]
+MODEL_OPTIMIZER_TOOL = config('MODEL_OPTIMIZER_TOOL', default='auto')
+GLTF_TRANSFORM_BIN = config('GLTF_TRANSFORM_BIN', default='gltf-transform')
+GLTFPACK_BIN = config('GLTFPACK_BIN', default='gltfpack')
+MODEL_OPTIMIZER_TIMEOUT = 600
+
+# Transaction history. On PostgreSQL partition_transactions (run once, in a
+# maintenance window) partitions transactions by month; create_partitions
+# then keeps TRANSACTION_PARTITIONS_AHEAD months ready. archive_history moves
+# settled transactions and inactive reservations older than
+# HISTORY_HOT_MONTHS to gzip NDJSON files in HISTORY_ARCHIVE_DIR, which
+# should be durable storage outside the source tree.
+TRANSACTION_PARTITIONS_AHEAD = 3
+HISTORY_HOT_MONTHS = config('HISTORY_HOT_MONTHS', default=12, cast=int)
+HISTORY_ARCHIVE_DIR = config('HISTORY_ARCHIVE_DIR', default=str(Path.home() / 'studhome-history-archive'))
+
+
+
+EMAIL_HOST_USER = config('EMAIL_HOST_USER', default=None)
+EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default=None)
\ No newline at end of file